@@ -1,21 +1,12 @@
+import importlib
+from typing import Any, TYPE_CHECKING
+
 from ._construction._cultivation_stage import (
     make_inject_and_cultivate_chunks_d3,
     make_inject_and_cultivate_chunks_d5,
     make_chunk_d3_double_cat_check,
     make_chunk_d5_double_cat_check,
 )
-from ._decoding._desaturation_sampler import DesaturationSampler
-from ._error_enumeration_report import ErrorEnumerationReport
-from ._stats_util import (
-    preprocess_intercepted_simulation_stats,
-    split_by_gap_threshold,
-    split_by_gap,
-    split_by_custom_count,
-    split_into_gap_distribution, compute_expected_injection_growth_volume, stat_to_gap_stats,
-)
-from ._decoding import (
-    sinter_samplers,
-)
 from ._construction import (
     make_color_code,
     tile_rgb_color,
@@ -33,3 +24,103 @@ from ._construction import (
     make_color_code_grown_into_surface_code_then_ablated_into_matchable_code_full_edges,
     make_surface_code_cnot,
 )
+
+if TYPE_CHECKING:
+    from ._decoding._desaturation_sampler import DesaturationSampler
+    from ._adaptive_collection import (
+        AdaptiveShotAllocator,
+        empty_task_stats,
+        gap_threshold_uncertainties,
+        merged_stats_by_strong_id,
+        sinter_task,
+        ThresholdUncertainty,
+    )
+    from ._error_enumeration_report import ErrorEnumerationReport, ErrorEnumerationSweep
+    from ._work_queue import (
+        authkey_from_env,
+        CollectionCoordinator,
+        load_samplers,
+        run_collection_worker,
+    )
+    from ._stats_cache import (
+        CachedStats,
+        read_stats_with_cache,
+    )
+    from ._stats_util import (
+        preprocess_intercepted_simulation_stats,
+        split_by_gap_threshold,
+        split_by_gap,
+        split_by_custom_count,
+        split_into_gap_distribution, compute_expected_injection_growth_volume, stat_to_gap_stats,
+        GapHistogram,
+        fault_count_distribution,
+        reweight_stratified_stat,
+        stratified_counts,
+        StratifiedEstimate,
+        estimate_splitting_stat,
+        splitting_counts,
+        SplittingEstimate,
+    )
+    from ._decoding import (
+        sinter_samplers,
+        SamplerArtifactCache,
+        PhaseTimer,
+        phase_seconds,
+        StratifiedSampler,
+        SplittingSampler,
+    )
+
+# Attributes whose modules are imported when first accessed, instead of when cultiv is
+# imported. Making circuits doesn't need them, and they pull in slow dependencies such
+# as sinter, pymatching and chromobius.
+_LAZY_ATTRIBUTES = {
+    'DesaturationSampler': '._decoding._desaturation_sampler',
+    'AdaptiveShotAllocator': '._adaptive_collection',
+    'empty_task_stats': '._adaptive_collection',
+    'gap_threshold_uncertainties': '._adaptive_collection',
+    'merged_stats_by_strong_id': '._adaptive_collection',
+    'sinter_task': '._adaptive_collection',
+    'ThresholdUncertainty': '._adaptive_collection',
+    'authkey_from_env': '._work_queue',
+    'CollectionCoordinator': '._work_queue',
+    'load_samplers': '._work_queue',
+    'run_collection_worker': '._work_queue',
+    'ErrorEnumerationReport': '._error_enumeration_report',
+    'ErrorEnumerationSweep': '._error_enumeration_report',
+    'CachedStats': '._stats_cache',
+    'read_stats_with_cache': '._stats_cache',
+    'preprocess_intercepted_simulation_stats': '._stats_util',
+    'split_by_gap_threshold': '._stats_util',
+    'split_by_gap': '._stats_util',
+    'split_by_custom_count': '._stats_util',
+    'split_into_gap_distribution': '._stats_util',
+    'compute_expected_injection_growth_volume': '._stats_util',
+    'stat_to_gap_stats': '._stats_util',
+    'GapHistogram': '._stats_util',
+    'fault_count_distribution': '._stats_util',
+    'reweight_stratified_stat': '._stats_util',
+    'stratified_counts': '._stats_util',
+    'StratifiedEstimate': '._stats_util',
+    'estimate_splitting_stat': '._stats_util',
+    'splitting_counts': '._stats_util',
+    'SplittingEstimate': '._stats_util',
+    'sinter_samplers': '._decoding',
+    'SamplerArtifactCache': '._decoding',
+    'PhaseTimer': '._decoding',
+    'phase_seconds': '._decoding',
+    'StratifiedSampler': '._decoding',
+    'SplittingSampler': '._decoding',
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *_LAZY_ATTRIBUTES})
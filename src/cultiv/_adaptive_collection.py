@@ -0,0 +1,303 @@
+import dataclasses
+import math
+import pathlib
+from typing import Iterable, Mapping
+
+import numpy as np
+import sinter
+import stim
+
+import gen
+from cultiv._stats_util import GapHistogram
+
+
+@dataclasses.dataclass(frozen=True)
+class ThresholdUncertainty:
+    """How well a task's stats pin down the kept error rate at a gap threshold.
+
+    Attributes:
+        gap: The gap threshold. Shots with a smaller gap count as discarded.
+        shots: The number of shots taken.
+        kept_shots: The number of shots kept at this gap threshold.
+        errors: The number of kept shots with a logical error.
+        low: The lower end of the credible interval of the kept error rate.
+        high: The upper end of the credible interval of the kept error rate.
+    """
+    gap: int
+    shots: int
+    kept_shots: int
+    errors: int
+    low: float
+    high: float
+
+    @property
+    def error_rate(self) -> float:
+        """The posterior mean of the kept error rate (under a Jeffreys prior)."""
+        return (self.errors + 0.5) / (self.kept_shots + 1)
+
+    @property
+    def kept_fraction(self) -> float:
+        """The estimated fraction of shots kept at this gap threshold."""
+        return (self.kept_shots + 0.5) / (self.shots + 1)
+
+    @property
+    def log10_width(self) -> float:
+        """The width of the credible interval, in decades."""
+        if self.low <= 0:
+            return math.inf
+        return math.log10(self.high / self.low)
+
+
+def gap_threshold_uncertainties(
+        stat: sinter.TaskStats | sinter.AnonTaskStats,
+        *,
+        gap_rounding: int,
+        gap_thresholds: Iterable[int] | None = None,
+        confidence: float = 0.95,
+) -> list[ThresholdUncertainty]:
+    """Computes the credible interval of the kept error rate at each gap threshold of a stat.
+
+    The kept shots and errors at each threshold match the stats made by
+    `cultiv.split_by_gap_threshold`. The intervals are equal-tailed intervals of the
+    Beta posterior of a Jeffreys prior.
+
+    Args:
+        stat: The stat to analyze. Stats without gap custom counts are treated as having
+            a single threshold of 0 that keeps every non-discarded shot.
+        gap_rounding: The rounding passed to `cultiv.split_by_gap_threshold`.
+        gap_thresholds: The thresholds to analyze. Defaults to the (rounded) gaps that
+            `cultiv.split_by_gap_threshold` would make stats for.
+        confidence: The posterior probability covered by the intervals.
+
+    Returns:
+        The uncertainty at each threshold, sorted by increasing gap.
+    """
+    import scipy.stats
+
+    stat_kept = stat.shots - stat.discards
+    hist = GapHistogram.from_stat(stat, rounding=gap_rounding)
+    if hist is None:
+        gaps = np.array([0], dtype=np.int64)
+        kept = np.array([stat_kept], dtype=np.int64)
+        errors = np.array([stat.errors], dtype=np.int64)
+    else:
+        gaps = hist.gaps
+        kept = stat_kept - hist.shots_below
+        errors = stat.errors - hist.errors_below
+    if gap_thresholds is not None:
+        thresholds = np.array(sorted(gap_thresholds), dtype=np.int64)
+        # A threshold keeps the shots of the histogram bins at or above it.
+        bins = np.searchsorted(gaps, thresholds, side='left')
+        kept = np.concatenate([kept, [0]])[bins]
+        errors = np.concatenate([errors, [0]])[bins]
+        gaps = thresholds
+
+    alpha = errors + 0.5
+    beta = kept - errors + 0.5
+    lows = np.where(errors > 0, scipy.stats.beta.ppf((1 - confidence) / 2, alpha, beta), 0.0)
+    highs = np.where(errors < kept, scipy.stats.beta.ppf((1 + confidence) / 2, alpha, beta), 1.0)
+    return [
+        ThresholdUncertainty(
+            gap=int(gaps[k]),
+            shots=stat.shots,
+            kept_shots=int(kept[k]),
+            errors=int(errors[k]),
+            low=float(lows[k]),
+            high=float(highs[k]),
+        )
+        for k in range(len(gaps))
+    ]
+
+
+class AdaptiveShotAllocator:
+    """Decides which task to sample next, based on how uncertain each task's gap thresholds are.
+
+    A gap threshold has converged when the credible interval of its kept error rate
+    spans at most `max_log10_width` decades, or when its upper end is below
+    `error_rate_floor`. Thresholds that keep less than `min_kept_fraction` of the shots
+    are ignored. A task is done when all its thresholds have converged, or when it has
+    reached `max_shots` or `max_errors`.
+
+    A threshold without errors has an unbounded interval (in decades), so it only
+    converges once its upper end drops below `error_rate_floor`. The top gap bins of a
+    histogram are usually error free, so without an `error_rate_floor`, tasks are only
+    stopped by `max_shots` or `max_errors`, and `choose` never returns None for a task
+    with neither.
+
+    Among the tasks that aren't done, the next batch goes to the task where the
+    unconverged thresholds gain the most information per second of sampling. The
+    information of a threshold is the inverse variance of its log error rate, which
+    is about its number of errors, so each shot adds information at a rate
+    proportional to the threshold's kept error rate times its kept fraction, divided
+    by its squared number of errors. So thresholds with few errors get shots first,
+    from whichever task makes those errors cheapest.
+    """
+
+    def __init__(
+            self,
+            *,
+            gap_rounding: int = 5,
+            gap_thresholds: Iterable[int] | None = None,
+            max_log10_width: float = 0.2,
+            error_rate_floor: float = 0,
+            min_kept_fraction: float = 0,
+            confidence: float = 0.95,
+            max_shots: int | None = None,
+            max_errors: int | None = None,
+            batch_seconds: float = 10,
+            min_batch_shots: int = 1024,
+    ):
+        """
+        Args:
+            gap_rounding: The rounding passed to `cultiv.split_by_gap_threshold`.
+            gap_thresholds: The thresholds that need to converge (e.g. the plotted
+                ones). Defaults to every threshold in each task's gap histogram.
+            max_log10_width: The width (in decades) of a converged credible interval.
+            error_rate_floor: Thresholds whose kept error rate is surely below this
+                value count as converged.
+            min_kept_fraction: Thresholds keeping a smaller fraction of the shots are
+                ignored.
+            confidence: The posterior probability covered by the credible intervals.
+            max_shots: The most shots to take for each task.
+            max_errors: Tasks with this many errors are done.
+            batch_seconds: Batches are sized to take about this long.
+            min_batch_shots: The fewest shots in a batch.
+        """
+        self.gap_rounding = gap_rounding
+        self.gap_thresholds = None if gap_thresholds is None else tuple(gap_thresholds)
+        self.max_log10_width = max_log10_width
+        self.error_rate_floor = error_rate_floor
+        self.min_kept_fraction = min_kept_fraction
+        self.confidence = confidence
+        self.max_shots = max_shots
+        self.max_errors = max_errors
+        self.batch_seconds = batch_seconds
+        self.min_batch_shots = min_batch_shots
+
+    def unconverged_thresholds(self, stat: sinter.TaskStats | sinter.AnonTaskStats) -> list[ThresholdUncertainty]:
+        """Returns the thresholds of a task's stat that still need more shots."""
+        if stat.shots == 0:
+            return [ThresholdUncertainty(gap=0, shots=0, kept_shots=0, errors=0, low=0, high=1)]
+        return [
+            threshold
+            for threshold in gap_threshold_uncertainties(
+                stat,
+                gap_rounding=self.gap_rounding,
+                gap_thresholds=self.gap_thresholds,
+                confidence=self.confidence,
+            )
+            if threshold.kept_fraction >= self.min_kept_fraction
+            if threshold.log10_width > self.max_log10_width
+            if threshold.high >= self.error_rate_floor
+        ]
+
+    def is_done(self, stat: sinter.TaskStats | sinter.AnonTaskStats) -> bool:
+        """Determines if a task needs no more shots."""
+        if self.max_shots is not None and stat.shots >= self.max_shots:
+            return True
+        if self.max_errors is not None and stat.errors >= self.max_errors:
+            return True
+        return not self.unconverged_thresholds(stat)
+
+    def information_rate(self, stat: sinter.TaskStats | sinter.AnonTaskStats) -> float:
+        """Returns how fast sampling a task adds information about its unconverged thresholds.
+
+        Returns infinity for tasks without shots or timing, so that they are sampled first.
+        """
+        if stat.shots == 0 or stat.seconds <= 0:
+            return math.inf
+        rate = sum(
+            threshold.error_rate * threshold.kept_fraction / (threshold.errors + 0.5)**2
+            for threshold in self.unconverged_thresholds(stat)
+        )
+        return rate * stat.shots / stat.seconds
+
+    def batch_shots(self, stat: sinter.TaskStats | sinter.AnonTaskStats) -> int:
+        """Returns the number of shots to take in the next batch of a task.
+
+        The batch takes about `batch_seconds`, grows the task's shots by at most a
+        factor of 2, and doesn't go (much) beyond the shots that the least converged
+        threshold is expected to need.
+        """
+        shots = self.min_batch_shots
+        if stat.shots > 0 and stat.seconds > 0:
+            shots = max(shots, min(
+                int(self.batch_seconds * stat.shots / stat.seconds),
+                stat.shots,
+                self._expected_shots_to_converge(stat),
+            ))
+        if self.max_shots is not None:
+            shots = min(shots, self.max_shots - stat.shots)
+        return max(shots, 1)
+
+    def _expected_shots_to_converge(self, stat: sinter.TaskStats | sinter.AnonTaskStats) -> int:
+        import scipy.stats
+
+        if self.max_log10_width <= 0:
+            # Intervals never get narrow enough, so this doesn't bound the batch size.
+            return stat.shots
+        # An interval spans about 2 z / sqrt(errors) in natural log units.
+        z = float(scipy.stats.norm.ppf((1 + self.confidence) / 2))
+        needed_errors = (2 * z / (self.max_log10_width * math.log(10)))**2
+        result = 0
+        for threshold in self.unconverged_thresholds(stat):
+            errors_per_shot = threshold.error_rate * threshold.kept_fraction
+            result = max(result, math.ceil((needed_errors - threshold.errors) / errors_per_shot))
+        return result
+
+    def choose(self, stats: Mapping[str, sinter.TaskStats | sinter.AnonTaskStats]) -> tuple[str, int] | None:
+        """Picks the task to sample next, and how many shots to take.
+
+        Args:
+            stats: The stats collected so far for each task, keyed by the task's strong id.
+
+        Returns:
+            A (strong_id, shots) tuple, or None if every task is done.
+        """
+        best = None
+        best_rate = -1.0
+        for strong_id, stat in stats.items():
+            if self.is_done(stat):
+                continue
+            rate = self.information_rate(stat)
+            if rate > best_rate:
+                best = strong_id
+                best_rate = rate
+        if best is None:
+            return None
+        return best, self.batch_shots(stats[best])
+
+
+def sinter_task(circuit_path: str | pathlib.Path, *, decoder: str) -> sinter.Task:
+    """Makes the task that `sinter collect --metadata_func auto` would make for a circuit file.
+
+    The task has the same strong id as the one sinter makes, so its stats can be merged
+    with stats collected by sinter. Its detector error model is loaded from (or stored
+    in) `gen.default_dem_cache()`.
+    """
+    circuit = stim.Circuit.from_file(circuit_path)
+    return sinter.Task(
+        circuit=circuit,
+        decoder=decoder,
+        detector_error_model=gen.sinter_detector_error_model(circuit),
+        json_metadata=sinter.comma_separated_key_values(str(circuit_path)),
+    )
+
+
+def merged_stats_by_strong_id(stats: Iterable[sinter.TaskStats]) -> dict[str, sinter.TaskStats]:
+    """Sums stats with the same strong id."""
+    result: dict[str, sinter.TaskStats] = {}
+    for stat in stats:
+        prev = result.get(stat.strong_id)
+        result[stat.strong_id] = stat if prev is None else prev + stat
+    return result
+
+
+def empty_task_stats(task: sinter.Task) -> sinter.TaskStats:
+    """Returns stats with no shots for a task."""
+    return sinter.TaskStats(
+        strong_id=task.strong_id(),
+        decoder=task.decoder,
+        json_metadata=task.json_metadata,
+        shots=0,
+    )
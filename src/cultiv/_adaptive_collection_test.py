@@ -0,0 +1,97 @@
+import collections
+import math
+
+import pytest
+import sinter
+import stim
+
+import cultiv
+from ._adaptive_collection import AdaptiveShotAllocator, gap_threshold_uncertainties, sinter_task
+
+
+def _stat(*, shots: int, seconds: float = 1, **custom_counts: int) -> sinter.TaskStats:
+    errors = sum(v for k, v in custom_counts.items() if k.startswith('E'))
+    kept = sum(custom_counts.values())
+    return sinter.TaskStats(
+        strong_id='test',
+        decoder='desaturation',
+        json_metadata={},
+        shots=shots,
+        errors=errors,
+        discards=shots - kept,
+        seconds=seconds,
+        custom_counts=collections.Counter(custom_counts),
+    )
+
+
+def test_gap_threshold_uncertainties_match_split_by_gap_threshold():
+    stat = _stat(shots=10000, C0=1000, E0=400, C5=3000, E5=100, C10=4000, E10=10)
+    uncertainties = gap_threshold_uncertainties(stat, gap_rounding=5)
+    split = cultiv.split_by_gap_threshold([stat], gap_rounding=5, keep_zero=True)
+    assert [e.gap for e in uncertainties] == [s.json_metadata['gap'] for s in split] == [0, 5, 10]
+    assert [e.kept_shots for e in uncertainties] == [s.shots - s.discards for s in split]
+    assert [e.errors for e in uncertainties] == [s.errors for s in split]
+    for e in uncertainties:
+        assert e.low < e.errors / e.kept_shots < e.high
+
+    # Thresholds between (or beyond) bins keep the bins above them.
+    uncertainties = gap_threshold_uncertainties(stat, gap_rounding=5, gap_thresholds=[7, 3, 12])
+    assert [(e.gap, e.kept_shots, e.errors) for e in uncertainties] == [(3, 7110, 110), (7, 4010, 10), (12, 0, 0)]
+    assert uncertainties[-1].low == 0 and uncertainties[-1].high == 1
+    assert uncertainties[-1].log10_width == math.inf
+
+    # Stats without a gap histogram have a single threshold.
+    plain = sinter.AnonTaskStats(shots=100, errors=10, discards=50)
+    e, = gap_threshold_uncertainties(plain, gap_rounding=5)
+    assert (e.gap, e.kept_shots, e.errors) == (0, 50, 10)
+
+
+def test_adaptive_shot_allocator_convergence():
+    allocator = AdaptiveShotAllocator(gap_rounding=5, max_log10_width=0.5)
+    assert not allocator.is_done(_stat(shots=0))
+    assert not allocator.is_done(_stat(shots=10000, C0=9000, E0=100, C10=900))
+    assert allocator.is_done(_stat(shots=10000, C0=9000, E0=100, C10=800, E10=100))
+
+    # Thresholds that keep too few shots, or surely have negligible error rates, are ignored.
+    assert AdaptiveShotAllocator(max_log10_width=0.5, min_kept_fraction=0.2).is_done(_stat(shots=10000, C0=9000, E0=100, C10=900))
+    assert AdaptiveShotAllocator(max_log10_width=0.5, error_rate_floor=0.01).is_done(_stat(shots=10000, C0=9000, E0=100, C10=900))
+
+    capped = AdaptiveShotAllocator(max_log10_width=0.5, max_shots=10000)
+    assert capped.is_done(_stat(shots=10000, C0=9000, E0=100, C10=900))
+    assert capped.batch_shots(_stat(shots=9000, seconds=0.001, C0=9000)) == 1000
+    assert AdaptiveShotAllocator(max_log10_width=0.5, max_errors=100).is_done(_stat(shots=10000, C0=9000, E0=100, C10=900))
+
+
+def test_adaptive_shot_allocator_choose():
+    allocator = AdaptiveShotAllocator(gap_rounding=5, max_log10_width=0.5, batch_seconds=1, min_batch_shots=100)
+    converged = _stat(shots=10000, C0=9000, E0=100, C10=800, E10=100)
+    few_errors = _stat(shots=10000, C0=9000, E0=100, C10=899, E10=1)
+    many_errors = _stat(shots=10000, C0=9000, E0=100, C10=890, E10=10)
+    slow_few_errors = _stat(shots=10000, seconds=1000, C0=9000, E0=100, C10=899, E10=1)
+    assert allocator.choose({'a': converged}) is None
+    assert allocator.choose({'a': converged, 'b': _stat(shots=0)}) == ('b', 100)
+    assert allocator.choose({'a': many_errors, 'b': few_errors, 'c': converged})[0] == 'b'
+    assert allocator.choose({'a': many_errors, 'b': slow_few_errors})[0] == 'a'
+
+    # Batches take about batch_seconds, and at most double the shots.
+    assert allocator.batch_shots(_stat(shots=10000, seconds=10, C0=9000, E0=100, C10=899, E10=1)) == 1000
+    assert allocator.batch_shots(few_errors) == 10000
+    # Batches don't go far beyond the shots needed to converge.
+    needed = allocator.batch_shots(_stat(shots=10**6, seconds=1, C0=10**6 - 10, E0=10))
+    assert 10**5 < needed < 10**6
+
+
+def test_sinter_task_matches_sinter_strong_id(tmp_path):
+    circuit = stim.Circuit.generated('repetition_code:memory', distance=3, rounds=3, before_round_data_depolarization=0.01)
+    path = tmp_path / 'd=3,p=0.01.stim'
+    circuit.to_file(path)
+    task = sinter_task(path, decoder='pymatching')
+    assert task.json_metadata == {'d': 3, 'p': 0.01}
+    expected = sinter.Task(
+        circuit=circuit,
+        decoder='pymatching',
+        detector_error_model=circuit.detector_error_model(decompose_errors=True, approximate_disjoint_errors=True),
+        json_metadata={'d': 3, 'p': 0.01},
+    )
+    assert task.strong_id() == expected.strong_id()
+    assert cultiv.empty_task_stats(task).strong_id == task.strong_id()
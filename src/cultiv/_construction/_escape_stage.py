@@ -1,7 +1,5 @@
 from typing import Literal
 
-import sinter
-
 import gen
 from ._color_code import make_color_code
 from ._surface_code import make_surface_code
@@ -102,6 +100,7 @@ def make_hybrid_color_surface_code(
 
     patch = gen.Patch(tiles)
     if obs_location == 'right':
+        import sinter
         right_qubits = [
             max(group, key=lambda e: e.real)
             for group in sinter.group_by(patch.data_set, key=lambda e: e.imag).values()
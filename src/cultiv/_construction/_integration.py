@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Callable, Literal
 
 import stim
 
@@ -14,6 +14,48 @@ from ._injection_stage import injection_circuit_with_rewritten_injection_rotatio
 from ._surface_code import make_surface_code_idle_chunk, make_surface_code
 
 
+def _locally_optimized(circuit: stim.Circuit) -> stim.Circuit:
+    return gen.LayerCircuit.from_stim_circuit(circuit).with_locally_optimized_layers().to_stim_circuit()
+
+
+def _end2end_optimized(circuit: stim.Circuit) -> stim.Circuit:
+    c = gen.LayerCircuit.from_stim_circuit(circuit)
+    c = c.with_locally_optimized_layers()
+    c = c.with_whole_layers_slid_as_to_merge_with_previous_layer_of_same_type(gen.ResetLayer)
+    c = c.with_whole_layers_slid_as_early_as_possible_for_merge_with_same_layer(gen.InteractLayer)
+    c = c.with_locally_optimized_layers()
+    c = c.with_whole_measurement_layers_slid_earlier()
+    return c.to_stim_circuit()
+
+
+def _compile_chunks(
+        chunks: list[gen.Chunk | gen.ChunkLoop],
+        *,
+        post_process_func: Callable[[stim.Circuit], stim.Circuit] | None,
+        compile_cache: gen.ChunkCompileCache | None,
+) -> stim.Circuit:
+    """Compiles chunks (with MPP boundaries and cultivation detector coords) into an optimized circuit.
+
+    When a compile cache is given, the compiled and optimized circuit is reused from
+    previous runs with the same chunks.
+    """
+    if compile_cache is not None:
+        return compile_cache.compile(
+            chunks,
+            add_mpp_boundaries=True,
+            flow_to_extra_coords_func=flow_to_extra_coords,
+            post_process_func=post_process_func,
+        )
+    circuit = gen.compile_chunks_into_circuit(
+        chunks,
+        add_mpp_boundaries=True,
+        flow_to_extra_coords_func=flow_to_extra_coords,
+    )
+    if post_process_func is not None:
+        circuit = post_process_func(circuit)
+    return circuit
+
+
 def make_escape_to_big_matchable_code_circuit(
         *,
         dcolor: int,
@@ -21,6 +63,7 @@ def make_escape_to_big_matchable_code_circuit(
         basis: Literal['X', 'Y', 'Z'],
         r_growing: int,
         r_end: int,
+        compile_cache: gen.ChunkCompileCache | None = None,
 ) -> stim.Circuit:
     chunks = make_color_code_to_big_matchable_code_escape_chunks(
         dcolor=dcolor,
@@ -29,12 +72,7 @@ def make_escape_to_big_matchable_code_circuit(
         r_growing=r_growing,
         r_end=r_end,
     )
-    layer_circuit = gen.LayerCircuit.from_stim_circuit(gen.compile_chunks_into_circuit(
-        chunks,
-        add_mpp_boundaries=True,
-        flow_to_extra_coords_func=flow_to_extra_coords,
-    ))
-    return layer_circuit.with_locally_optimized_layers().to_stim_circuit()
+    return _compile_chunks(chunks, post_process_func=_locally_optimized, compile_cache=compile_cache)
 
 
 def make_inject_and_cultivate_circuit(
@@ -42,6 +80,7 @@ def make_inject_and_cultivate_circuit(
         dcolor: int,
         inject_style: Literal['degenerate', 'bell', 'unitary'],
         basis: Literal['X', 'Y'],
+        compile_cache: gen.ChunkCompileCache | None = None,
 ) -> stim.Circuit:
     if dcolor == 3:
         inject_chunks = make_inject_and_cultivate_chunks_d3(style=inject_style)
@@ -49,12 +88,7 @@ def make_inject_and_cultivate_circuit(
         inject_chunks = make_inject_and_cultivate_chunks_d5(style=inject_style)
     else:
         raise NotImplementedError(f'{dcolor=}')
-    layer_circuit = gen.LayerCircuit.from_stim_circuit(gen.compile_chunks_into_circuit(
-        inject_chunks,
-        add_mpp_boundaries=True,
-        flow_to_extra_coords_func=flow_to_extra_coords,
-    ))
-    result = layer_circuit.with_locally_optimized_layers().to_stim_circuit()
+    result = _compile_chunks(inject_chunks, post_process_func=_locally_optimized, compile_cache=compile_cache)
     if basis == 'X':
         result = injection_circuit_with_rewritten_injection_rotation(result, turns=1)
     elif basis == 'Y':
@@ -71,7 +105,8 @@ def make_end2end_cultivation_circuit(
         basis: Literal['X', 'Y', 'Z'],
         r_growing: int,
         r_end: int,
-        inject_style: Literal['degenerate', 'bell', 'unitary']
+        inject_style: Literal['degenerate', 'bell', 'unitary'],
+        compile_cache: gen.ChunkCompileCache | None = None,
 ) -> stim.Circuit:
     if dcolor == 3:
         inject_chunks = make_inject_and_cultivate_chunks_d3(style=inject_style)
@@ -90,17 +125,7 @@ def make_end2end_cultivation_circuit(
             r_end=r_end,
         ),
     ]
-    c = gen.LayerCircuit.from_stim_circuit(gen.compile_chunks_into_circuit(
-        chunks,
-        add_mpp_boundaries=True,
-        flow_to_extra_coords_func=flow_to_extra_coords,
-    ))
-    c = c.with_locally_optimized_layers()
-    c = c.with_whole_layers_slid_as_to_merge_with_previous_layer_of_same_type(gen.ResetLayer)
-    c = c.with_whole_layers_slid_as_early_as_possible_for_merge_with_same_layer(gen.InteractLayer)
-    c = c.with_locally_optimized_layers()
-    c = c.with_whole_measurement_layers_slid_earlier()
-    return c.to_stim_circuit()
+    return _compile_chunks(chunks, post_process_func=_end2end_optimized, compile_cache=compile_cache)
 
 
 def make_idle_matchable_code_circuit(
@@ -109,17 +134,13 @@ def make_idle_matchable_code_circuit(
         dsurface: int,
         basis: Literal['X', 'Y', 'Z'],
         rounds: int,
+        compile_cache: gen.ChunkCompileCache | None = None,
 ) -> stim.Circuit:
     stable_code = make_post_escape_matchable_code(dcolor=dcolor, dsurface=dsurface)
     chunks = [
         make_hybrid_code_round_chunk(code=stable_code, obs_basis=basis) * rounds,
     ]
-    layer_circuit = gen.LayerCircuit.from_stim_circuit(gen.compile_chunks_into_circuit(
-        chunks,
-        add_mpp_boundaries=True,
-        flow_to_extra_coords_func=flow_to_extra_coords,
-    ))
-    return layer_circuit.with_locally_optimized_layers().to_stim_circuit()
+    return _compile_chunks(chunks, post_process_func=_locally_optimized, compile_cache=compile_cache)
 
 
 BASIS_COLOR_TO_EXTRA_COORDS = {
@@ -155,19 +176,28 @@ def flow_to_extra_coords(flow: gen.Flow) -> list[float]:
     return coords
 
 
-def make_escape_to_big_color_code_circuit(*, start_width: int, end_width: int, rounds: int, basis: Literal['X', 'Y', 'Z']) -> stim.Circuit:
+def make_escape_to_big_color_code_circuit(
+        *,
+        start_width: int,
+        end_width: int,
+        rounds: int,
+        basis: Literal['X', 'Y', 'Z'],
+        compile_cache: gen.ChunkCompileCache | None = None,
+) -> stim.Circuit:
     chunks = [
         make_color_code_grow_chunk(start_width, end_width, basis=basis),
         make_chunk_color_code_superdense_cycle(make_color_code(end_width), obs_basis=basis).time_reversed() * rounds,
     ]
-    return gen.compile_chunks_into_circuit(
-        chunks,
-        add_mpp_boundaries=True,
-        flow_to_extra_coords_func=flow_to_extra_coords,
-    )
+    return _compile_chunks(chunks, post_process_func=None, compile_cache=compile_cache)
 
 
-def make_surface_code_memory_circuit(*, dsurface: int, rounds: int, basis: Literal['X', 'Y', 'Z']) -> stim.Circuit:
+def make_surface_code_memory_circuit(
+        *,
+        dsurface: int,
+        rounds: int,
+        basis: Literal['X', 'Y', 'Z'],
+        compile_cache: gen.ChunkCompileCache | None = None,
+) -> stim.Circuit:
     code = make_surface_code(width=dsurface, height=dsurface)
     init = code.with_observables_from_basis('Y').mpp_init_chunk() if basis == 'Y' else code.transversal_init_chunk(basis=basis)
     chunks = [
@@ -175,7 +205,6 @@ def make_surface_code_memory_circuit(*, dsurface: int, rounds: int, basis: Liter
         make_surface_code_idle_chunk(code=code, basis=basis) * rounds,
         init.time_reversed(),
     ]
-    circuit = gen.compile_chunks_into_circuit(chunks)
-    circuit = gen.LayerCircuit.from_stim_circuit(circuit)
-    circuit = circuit.with_locally_optimized_layers()
-    return circuit.to_stim_circuit()
+    if compile_cache is None:
+        return _locally_optimized(gen.compile_chunks_into_circuit(chunks))
+    return compile_cache.compile(chunks, post_process_func=_locally_optimized)
@@ -75,6 +75,30 @@ def test_make_end2end_circuit(dcolor: int, dsurface: int, basis: Any):
     assert len(err) == min(4, dcolor)
 
 
+
+def test_make_end2end_circuit_with_compile_cache(tmp_path):
+    expected = make_end2end_cultivation_circuit(
+        dcolor=3,
+        dsurface=6,
+        r_growing=2,
+        r_end=2,
+        basis='Y',
+        inject_style='unitary',
+    )
+    cache = gen.ChunkCompileCache(tmp_path)
+    for _ in range(2):
+        circuit = make_end2end_cultivation_circuit(
+            dcolor=3,
+            dsurface=6,
+            r_growing=2,
+            r_end=2,
+            basis='Y',
+            inject_style='unitary',
+            compile_cache=cache,
+        )
+        assert str(circuit) == str(expected)
+    assert (cache.hits, cache.misses) == (1, 1)
+
 @pytest.mark.parametrize('dcolor,dsurface,rounds', [(3, 6, 4), (5, 10, 4)])
 @pytest.mark.parametrize('basis', ['X', 'Y', 'Z'])
 def test_make_matchable_idle_circuit(dcolor: int, dsurface: int, basis: Any, rounds: int):
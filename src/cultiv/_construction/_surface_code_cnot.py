@@ -1,7 +1,5 @@
 from typing import Literal, Callable
 
-import sinter
-
 import gen
 from cultiv._construction._surface_code import make_surface_code
 
@@ -78,6 +76,7 @@ def _make_data_reset_layer(
 
     assert next_code.data_set >= prev_code.data_set
     gained_qubits = next_code.data_set - prev_code.data_set
+    import sinter
     for b, qs in sorted(sinter.group_by(gained_qubits, key=data_basis_func).items()):
         builder.append(f'R{b}', qs)
 
@@ -124,6 +123,7 @@ def _make_data_measure_layer(
 
     assert next_code.data_set <= prev_code.data_set
     lost_qubits = prev_code.data_set - next_code.data_set
+    import sinter
     for b, qs in sorted(sinter.group_by(lost_qubits, key=data_basis_func).items()):
         builder.append(f'M{b}', qs)
 
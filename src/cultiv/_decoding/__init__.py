@@ -1 +1,33 @@
-from ._mux_sampler import sinter_samplers
+import importlib
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ._mux_sampler import sinter_samplers
+    from ._phase_timer import PhaseTimer, phase_seconds
+    from ._sampler_artifact_cache import SamplerArtifactCache
+    from ._splitting_sampler import SplittingSampler
+    from ._stratified_sampler import StratifiedSampler
+
+# Imported when first accessed, so that importing one sampler's module doesn't import
+# every sampler (and its decoder).
+_LAZY_ATTRIBUTES = {
+    'sinter_samplers': '._mux_sampler',
+    'PhaseTimer': '._phase_timer',
+    'phase_seconds': '._phase_timer',
+    'SamplerArtifactCache': '._sampler_artifact_cache',
+    'SplittingSampler': '._splitting_sampler',
+    'StratifiedSampler': '._stratified_sampler',
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *_LAZY_ATTRIBUTES})
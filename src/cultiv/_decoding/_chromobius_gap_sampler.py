@@ -1,13 +1,15 @@
 import collections
 import dataclasses
 import time
-from typing import Iterable
+from typing import Any, Iterable
 
 import numpy as np
 import sinter
 import stim
 
 import gen
+from cultiv._decoding._phase_timer import PhaseTimer
+from cultiv._decoding._sampler_artifact_cache import SamplerArtifactCache
 
 
 class ChromobiusGapSampler(sinter.Sampler):
@@ -17,8 +19,16 @@ class ChromobiusGapSampler(sinter.Sampler):
     basis picked on the most common adjacent colors to the observable. Then compares the
     weight from exciting and not exciting that detector.
     """
+    def __init__(self, artifact_cache: SamplerArtifactCache | None = None, phase_timing: bool = False):
+        self.artifact_cache = artifact_cache
+        self.phase_timing = phase_timing
+
     def compiled_sampler_for_task(self, task: sinter.Task) -> sinter.CompiledSampler:
-        return CompiledChromobiusGapSampler(task)
+        return CompiledChromobiusGapSampler(
+            task,
+            artifact_cache=self.artifact_cache,
+            phase_timing=self.phase_timing,
+        )
 
 
 @dataclasses.dataclass(frozen=True)
@@ -64,34 +74,31 @@ class _DemError:
 
 
 class CompiledChromobiusGapSampler(sinter.CompiledSampler):
-    def __init__(self, task: sinter.Task):
+    # Increase when changing what `_compute_artifacts` derives from a task.
+    ARTIFACT_VERSION = 1
+
+    def __init__(
+            self,
+            task: sinter.Task,
+            *,
+            artifact_cache: SamplerArtifactCache | None = None,
+            phase_timing: bool = False,
+    ):
+        self.phase_timing = phase_timing
         if task.detector_error_model.num_observables != 1:
             raise NotImplementedError(f'{task.detector_error_model.num_observables=} != 1')
-        self.main_dem = task.detector_error_model.flattened()
-        self.obs_det = self.main_dem.num_detectors
-        coords = self.main_dem.get_detector_coordinates()
-        adj_pairs = collections.Counter()
-
-        self.gap_dem_base = stim.DetectorErrorModel()
-        for inst in self.main_dem:
-            if inst.type == 'error':
-                err = _DemError.from_error_instruction(inst)
-                if err.has_obs and len(err.det_set) == 2:
-                    d1, d2 = err.det_set
-                    c1 = coords[d1][3]
-                    c2 = coords[d2][3]
-                    if (c1 // 3) == (c2 // 3) and (c1 % 3 != c2 % 3):
-                        adj_pairs[frozenset([c1, c2])] += 1
-                self.gap_dem_base.append(err.to_instruction(self.obs_det))
-            else:
-                self.gap_dem_base.append(inst)
-        max_key = max(adj_pairs.keys(), key=lambda key: adj_pairs[key])
-        c1, c2 = max_key
-        if (c1 // 3) != (c2 // 3):
-            raise NotImplementedError(f'{c1=}, {c2=}')
-        obs_color_basis = (c1 // 3) * 3 + (3 - (c1 % 3) - (c2 % 3))
-        self.gap_dem_base.append('detector', [-9, -9, -9, obs_color_basis], [stim.target_relative_detector_id(self.obs_det)])
-        self.main_dem.append('detector', [-9, -9, -9, obs_color_basis], [stim.target_relative_detector_id(self.obs_det)])
+        if artifact_cache is None:
+            artifacts = _compute_artifacts(task.detector_error_model)
+        else:
+            artifacts = artifact_cache.load_or_compute(
+                task,
+                sampler='chromobius-gap',
+                version=CompiledChromobiusGapSampler.ARTIFACT_VERSION,
+                compute=lambda: _compute_artifacts(task.detector_error_model),
+            )
+        self.main_dem = artifacts['main_dem']
+        self.gap_dem_base = artifacts['gap_dem_base']
+        self.obs_det = self.main_dem.num_detectors - 1
 
         import chromobius
         self.decoder = chromobius.compile_decoder_for_dem(self.main_dem)
@@ -108,31 +115,43 @@ class CompiledChromobiusGapSampler(sinter.CompiledSampler):
             det_data[k] ^= 1
         return self.decode_shot(np.packbits(det_data, bitorder='little'))
 
-    def decode_shot(self, shot: np.ndarray) -> tuple[bool, int]:
+    def decode_shot(self, shot: np.ndarray, timer: PhaseTimer | None = None) -> tuple[bool, int]:
         assert len(shot.shape) == 1
         assert shot.shape[0] == (self.obs_det + 8) // 8
         _, weight0 = self.gap_decoder.predict_weighted_obs_flips_from_dets_bit_packed(shot)
+        if timer is not None:
+            timer.lap('decode_off')
         shot[-1] ^= np.uint8(1 << (self.obs_det % 8))
         _, weight1 = self.gap_decoder.predict_weighted_obs_flips_from_dets_bit_packed(shot)
+        if timer is not None:
+            timer.lap('decode_on')
         shot[-1] ^= np.uint8(1 << (self.obs_det % 8))
         prediction = self.decoder.predict_obs_flips_from_dets_bit_packed(shot)
+        if timer is not None:
+            timer.lap('decode')
         return bool(prediction), round(abs(weight1 - weight0))
 
     def sample(self, shots: int) -> sinter.AnonTaskStats:
         t0 = time.monotonic()
+        timer = PhaseTimer(enabled=self.phase_timing)
+        shot_timer = timer if self.phase_timing else None
         dets, actual_obs = self.stim_sampler.sample(shots, separate_observables=True, bit_packed=True)
+        timer.lap('simulate')
         num_errors = 0
         gap_counts = collections.Counter()
         for k in range(shots):
             try:
-                pred, gap = self.decode_shot(dets[k])
+                pred, gap = self.decode_shot(dets[k], shot_timer)
             except ValueError:
                 pred, gap = False, 0
+                timer.lap('decode')
             if pred != np.any(actual_obs[k]):
                 num_errors += 1
                 gap_counts[f'E{gap}'] += 1
             else:
                 gap_counts[f'C{gap}'] += 1
+            timer.lap('classify')
+        gap_counts.update(timer.counts)
         t1 = time.monotonic()
 
         return sinter.AnonTaskStats(
@@ -141,3 +160,36 @@ class CompiledChromobiusGapSampler(sinter.CompiledSampler):
             seconds=t1 - t0,
             custom_counts=gap_counts,
         )
+
+
+def _compute_artifacts(dem: stim.DetectorErrorModel) -> dict[str, Any]:
+    """Derives the main and gap dems, which have a detector added for the observable."""
+    main_dem = dem.flattened()
+    obs_det = main_dem.num_detectors
+    coords = main_dem.get_detector_coordinates()
+    adj_pairs = collections.Counter()
+
+    gap_dem_base = stim.DetectorErrorModel()
+    for inst in main_dem:
+        if inst.type == 'error':
+            err = _DemError.from_error_instruction(inst)
+            if err.has_obs and len(err.det_set) == 2:
+                d1, d2 = err.det_set
+                c1 = coords[d1][3]
+                c2 = coords[d2][3]
+                if (c1 // 3) == (c2 // 3) and (c1 % 3 != c2 % 3):
+                    adj_pairs[frozenset([c1, c2])] += 1
+            gap_dem_base.append(err.to_instruction(obs_det))
+        else:
+            gap_dem_base.append(inst)
+    max_key = max(adj_pairs.keys(), key=lambda key: adj_pairs[key])
+    c1, c2 = max_key
+    if (c1 // 3) != (c2 // 3):
+        raise NotImplementedError(f'{c1=}, {c2=}')
+    obs_color_basis = (c1 // 3) * 3 + (3 - (c1 % 3) - (c2 % 3))
+    gap_dem_base.append('detector', [-9, -9, -9, obs_color_basis], [stim.target_relative_detector_id(obs_det)])
+    main_dem.append('detector', [-9, -9, -9, obs_color_basis], [stim.target_relative_detector_id(obs_det)])
+    return {
+        'main_dem': main_dem,
+        'gap_dem_base': gap_dem_base,
+    }
@@ -11,12 +11,45 @@ import sinter
 import stim
 
 import gen
+from cultiv._decoding._phase_timer import PhaseTimer
+from cultiv._decoding._pipelined_sampling import iter_sampled_batches
+from cultiv._decoding._sampler_artifact_cache import SamplerArtifactCache
 from cultiv._error_set import int_to_flipped_bits
 
 
 class DesaturationSampler(sinter.Sampler):
+    def __init__(
+            self,
+            artifact_cache: SamplerArtifactCache | None = None,
+            phase_timing: bool = False,
+            pipeline_depth: int = 0,
+            pipeline_batch_size: int = 1024,
+    ):
+        """
+        Args:
+            artifact_cache: If set, the gap dem and postselection data derived from each
+                task is stored in (or loaded from) this cache.
+            phase_timing: If set, the time spent in each phase of sampling is reported
+                in the custom counts (see `cultiv._decoding._phase_timer.PhaseTimer`).
+            pipeline_depth: If positive, shots are sampled on another thread while
+                earlier shots are decoded, with at most this many sampled batches
+                waiting to be decoded (see
+                `cultiv._decoding._pipelined_sampling.iter_sampled_batches`).
+            pipeline_batch_size: The number of shots in each pipelined batch.
+        """
+        self.artifact_cache = artifact_cache
+        self.phase_timing = phase_timing
+        self.pipeline_depth = pipeline_depth
+        self.pipeline_batch_size = pipeline_batch_size
+
     def compiled_sampler_for_task(self, task: sinter.Task) -> 'CompiledDesaturationSampler':
-        return CompiledDesaturationSampler.from_task(task)
+        return CompiledDesaturationSampler.from_task(
+            task,
+            artifact_cache=self.artifact_cache,
+            phase_timing=self.phase_timing,
+            pipeline_depth=self.pipeline_depth,
+            pipeline_batch_size=self.pipeline_batch_size,
+        )
 
 
 @dataclasses.dataclass(frozen=True)
@@ -66,14 +99,23 @@ class _DemError:
 
 @dataclasses.dataclass
 class CompiledDesaturationSampler(sinter.CompiledSampler):
+    # Increase when changing what `_compute_artifacts` derives from a task.
+    ARTIFACT_VERSION = 1
+
     def __init__(
         self,
         task: sinter.Task,
         gap_dem: stim.DetectorErrorModel,
         postselected_detectors: frozenset[int],
         gap_circuit: stim.Circuit,
+        phase_timing: bool = False,
+        pipeline_depth: int = 0,
+        pipeline_batch_size: int = 1024,
     ):
         self.task = task
+        self.phase_timing = phase_timing
+        self.pipeline_depth = pipeline_depth
+        self.pipeline_batch_size = pipeline_batch_size
         self.gap_dem = gap_dem
         self.postselected_detectors = postselected_detectors
         self.gap_circuit = gap_circuit
@@ -91,10 +133,42 @@ class CompiledDesaturationSampler(sinter.CompiledSampler):
         self.decibels_per_w = -math.log10(edge_p / (1 - edge_p)) * 10 / edge_w
 
     @staticmethod
-    def from_task(task: sinter.Task) -> 'CompiledDesaturationSampler':
+    def from_task(
+            task: sinter.Task,
+            *,
+            artifact_cache: SamplerArtifactCache | None = None,
+            phase_timing: bool = False,
+            pipeline_depth: int = 0,
+            pipeline_batch_size: int = 1024,
+    ) -> 'CompiledDesaturationSampler':
+        if artifact_cache is None:
+            artifacts = CompiledDesaturationSampler._compute_artifacts(task)
+        else:
+            artifacts = artifact_cache.load_or_compute(
+                task,
+                sampler='desaturation',
+                version=CompiledDesaturationSampler.ARTIFACT_VERSION,
+                compute=lambda: CompiledDesaturationSampler._compute_artifacts(task),
+            )
+        gap_circuit = task.circuit.copy()
+        for coords in artifacts['added_detector_coords']:
+            gap_circuit.append('DETECTOR', [], coords)
+        return CompiledDesaturationSampler(
+            task=task,
+            gap_dem=artifacts['gap_dem'],
+            postselected_detectors=frozenset(artifacts['postselected_detectors'].tolist()),
+            gap_circuit=gap_circuit,
+            phase_timing=phase_timing,
+            pipeline_depth=pipeline_depth,
+            pipeline_batch_size=pipeline_batch_size,
+        )
+
+    @staticmethod
+    def _compute_artifacts(task: sinter.Task) -> dict[str, Any]:
+        """Derives the gap dem, and the detectors to postselect and add, from a task."""
         dem = task.detector_error_model.flattened()
         num_dets = dem.num_detectors
-        gap_circuit = task.circuit.copy()
+        added_detector_coords = []
 
         # Parse color and basis annotations out of the dem.
         det_coords = dem.get_detector_coordinates()
@@ -169,7 +243,7 @@ class CompiledDesaturationSampler(sinter.CompiledSampler):
                 det_coords[k][0] += 0.25
                 det_coords[k][1] += 0.25
                 det_coords[k][2] += 0.25
-            gap_circuit.append('DETECTOR', [], det_coords[k])
+            added_detector_coords.append(list(det_coords[k]))
 
         matchable_dem = stim.DetectorErrorModel()
         for k in range(num_dets + len(pair2virtual)):
@@ -234,46 +308,138 @@ class CompiledDesaturationSampler(sinter.CompiledSampler):
 
         clipped_dem = clipped_matchable_dem(matchable_dem, postselected_detectors_hidden_from_matcher)
         clipped_dem_with_det_for_obs = _dem_with_obs_detector(clipped_dem)
-        gap_circuit.append("DETECTOR", [], [-9, -9, -9])  # gap observable detector
-        assert gap_circuit.num_detectors == clipped_dem_with_det_for_obs.num_detectors
-
-        clipped_dem.append(stim.DemInstruction('detector', [-9, -9, -9], [stim.target_relative_detector_id(clipped_dem_with_det_for_obs.num_detectors - 1)]))
-        return CompiledDesaturationSampler(
-            task=task,
-            gap_dem=clipped_dem_with_det_for_obs,
-            postselected_detectors=frozenset(postselected_detectors_hidden_from_matcher | postselected_detectors_visible_to_matcher),
-            gap_circuit=gap_circuit,
-        )
-
-    def sample(self, shots: int) -> sinter.AnonTaskStats:
-        t0 = time.monotonic()
+        added_detector_coords.append([-9, -9, -9])  # gap observable detector
+        assert num_dets + len(added_detector_coords) == clipped_dem_with_det_for_obs.num_detectors
+
+        postselected_detectors = postselected_detectors_hidden_from_matcher | postselected_detectors_visible_to_matcher
+        return {
+            'gap_dem': clipped_dem_with_det_for_obs,
+            'postselected_detectors': np.array(sorted(postselected_detectors), dtype=np.int64),
+            'added_detector_coords': added_detector_coords,
+        }
+
+    def _sample_kept_shots(self, shots: int, timer: PhaseTimer) -> tuple[np.ndarray, np.ndarray, int]:
+        """Returns the bit packed detection events and observable flips of the kept shots, and the number of discards."""
         dets, actual_obs = self.gap_circuit_sampler.sample(shots, separate_observables=True, bit_packed=True)
+        timer.lap('simulate')
+        return self._postselect(dets, actual_obs, timer)
 
+    def _postselect(self, dets: np.ndarray, actual_obs: np.ndarray, timer: PhaseTimer) -> tuple[np.ndarray, np.ndarray, int]:
         keep_mask = ~np.any(dets & self._discard_mask, axis=1)
-        dets = dets[keep_mask]
+        kept_dets = dets[keep_mask]
         actual_obs = actual_obs[keep_mask]
         assert actual_obs.shape[1] == 1
         actual_obs = actual_obs[:, 0]
-        predictions, gaps = self._decode_batch_overwrite_last_byte(bit_packed_dets=dets)
+        timer.lap('postselect')
+        return kept_dets, actual_obs, dets.shape[0] - kept_dets.shape[0]
+
+    def _classify_kept_shots(
+            self,
+            dets: np.ndarray,
+            actual_obs: np.ndarray,
+            counter: collections.Counter,
+            timer: PhaseTimer,
+    ) -> int:
+        """Decodes kept shots, adds their gaps to the counter, and returns the number of errors."""
+        predictions, gaps = self._decode_batch_overwrite_last_byte(bit_packed_dets=dets, timer=timer)
         errors = predictions ^ actual_obs
-        counter = collections.Counter()
         for gap, err in zip(gaps, errors):
             counter[f'E{round(gap)}' if err else f'C{round(gap)}'] += 1
+        timer.lap('classify')
+        return np.count_nonzero(errors)
+
+    def _pack_detection_events(self, dets: np.ndarray, obs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        padded_dets = np.zeros(shape=(dets.shape[0], self.num_dets), dtype=np.bool_)
+        padded_dets[:, :dets.shape[1]] = dets
+        return (
+            np.packbits(padded_dets, axis=1, bitorder='little'),
+            np.packbits(obs, axis=1, bitorder='little'),
+        )
+
+    def decode_detection_events(self, dets: np.ndarray, obs: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Postselects and decodes given shots, returning the outcome of each shot.
+
+        Args:
+            dets: A bool array of shape (shots, num_detectors) with the detection events
+                of the task's circuit.
+            obs: A bool array of shape (shots, num_observables) with the observable flips.
+
+        Returns:
+            A (kept, errors, gaps) tuple of arrays with a value per shot. `kept` and
+            `errors` are bool arrays, and `gaps` is an int array of gaps rounded to the
+            same bins as the custom counts of `sample`. Discarded shots have no error
+            and a gap of 0.
+        """
+        packed_dets, packed_obs = self._pack_detection_events(dets, obs)
+        kept = ~np.any(packed_dets & self._discard_mask, axis=1)
+        errors = np.zeros(shape=dets.shape[0], dtype=np.bool_)
+        gaps = np.zeros(shape=dets.shape[0], dtype=np.int64)
+        if np.any(kept):
+            predictions, kept_gaps = self._decode_batch_overwrite_last_byte(bit_packed_dets=packed_dets[kept])
+            errors[kept] = (predictions ^ packed_obs[kept, 0]) != 0
+            gaps[kept] = np.round(kept_gaps)
+        return kept, errors, gaps
+
+    def classify_detection_events(self, dets: np.ndarray, obs: np.ndarray) -> sinter.AnonTaskStats:
+        """Postselects, decodes and classifies given shots, instead of sampled shots.
+
+        Args:
+            dets: A bool array of shape (shots, num_detectors) with the detection events
+                of the task's circuit.
+            obs: A bool array of shape (shots, num_observables) with the observable flips.
+
+        Returns:
+            Stats with the same custom counts as the stats returned by `sample`.
+        """
+        timer = PhaseTimer(enabled=False)
+        kept_dets, kept_obs, num_discards = self._postselect(*self._pack_detection_events(dets, obs), timer)
+        counter = collections.Counter()
+        num_errors = self._classify_kept_shots(kept_dets, kept_obs, counter, timer)
+        return sinter.AnonTaskStats(
+            shots=dets.shape[0],
+            errors=num_errors,
+            discards=num_discards,
+            custom_counts=counter,
+        )
+
+    def sample(self, shots: int) -> sinter.AnonTaskStats:
+        t0 = time.monotonic()
+        timer = PhaseTimer(enabled=self.phase_timing)
+        num_errors = 0
+        num_discards = 0
+        counter = collections.Counter()
+        for dets, actual_obs, discards in iter_sampled_batches(
+                self._sample_kept_shots,
+                shots=shots,
+                timer=timer,
+                pipeline_depth=self.pipeline_depth,
+                pipeline_batch_size=self.pipeline_batch_size):
+            num_errors += self._classify_kept_shots(dets, actual_obs, counter, timer)
+            num_discards += discards
+        counter.update(timer.counts)
         t1 = time.monotonic()
 
         return sinter.AnonTaskStats(
             shots=shots,
-            errors=np.count_nonzero(errors),
-            discards=shots - np.count_nonzero(keep_mask),
+            errors=num_errors,
+            discards=num_discards,
             seconds=t1 - t0,
             custom_counts=counter,
         )
 
-    def _decode_batch_overwrite_last_byte(self, bit_packed_dets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    def _decode_batch_overwrite_last_byte(
+            self,
+            bit_packed_dets: np.ndarray,
+            timer: PhaseTimer | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
         bit_packed_dets[:, -1] |= self._obs_det_byte
         _, on_weights = self.gap_decoder.decode_batch(bit_packed_dets, return_weights=True, bit_packed_shots=True, bit_packed_predictions=True)
+        if timer is not None:
+            timer.lap('decode_on')
         bit_packed_dets[:, -1] ^= self._obs_det_byte
         _, off_weights = self.gap_decoder.decode_batch(bit_packed_dets, return_weights=True, bit_packed_shots=True, bit_packed_predictions=True)
+        if timer is not None:
+            timer.lap('decode_off')
         gaps: np.ndarray = np.abs((on_weights - off_weights) * self.decibels_per_w)
         predictions: np.ndarray = on_weights < off_weights
         return predictions, gaps
@@ -5,13 +5,17 @@ import numpy as np
 import sinter
 import stim
 
+from cultiv._decoding._phase_timer import PhaseTimer
 from cultiv._error_set import DemErrorSet
 
 
 class HighlanderSampler(sinter.Sampler):
     """Lookup table decoder that allows at most one error, else discards."""
+    def __init__(self, phase_timing: bool = False):
+        self.phase_timing = phase_timing
+
     def compiled_sampler_for_task(self, task: sinter.Task) -> sinter.CompiledSampler:
-        return CompiledHighlanderSampler(task)
+        return CompiledHighlanderSampler(task, phase_timing=self.phase_timing)
 
 
 def dem_to_single_error_lookup_table(dem: stim.DetectorErrorModel) -> dict[tuple[int, ...], np.ndarray]:
@@ -28,28 +32,36 @@ def dem_to_single_error_lookup_table(dem: stim.DetectorErrorModel) -> dict[tuple
 
 
 class CompiledHighlanderSampler(sinter.CompiledSampler):
-    def __init__(self, task: sinter.Task):
+    def __init__(self, task: sinter.Task, *, phase_timing: bool = False):
         self.stim_sampler = task.circuit.compile_detector_sampler()
         self.lookup_table = dem_to_single_error_lookup_table(task.detector_error_model)
+        self.phase_timing = phase_timing
 
     def sample(self, max_shots: int) -> sinter.AnonTaskStats:
         t0 = time.monotonic()
+        timer = PhaseTimer(enabled=self.phase_timing)
         dets, obs = self.stim_sampler.sample(
             shots=max_shots,
             bit_packed=True,
             separate_observables=True,
         )
         num_shots = dets.shape[0]
+        timer.lap('simulate')
+
+        predictions = [
+            self.lookup_table.get(tuple(np.flatnonzero(np.unpackbits(dets[shot], bitorder='little'))))
+            for shot in range(num_shots)
+        ]
+        timer.lap('decode')
 
         num_discards = 0
         num_errors = 0
-        for shot in range(num_shots):
-            key = tuple(np.flatnonzero(np.unpackbits(dets[shot], bitorder='little')))
-            prediction = self.lookup_table.get(key)
+        for shot, prediction in enumerate(predictions):
             if prediction is None:
                 num_discards += 1
             elif not np.array_equal(prediction, obs[shot]):
                 num_errors += 1
+        timer.lap('classify')
         t1 = time.monotonic()
 
         return sinter.AnonTaskStats(
@@ -57,4 +69,5 @@ class CompiledHighlanderSampler(sinter.CompiledSampler):
             errors=num_errors,
             discards=num_discards,
             seconds=t1 - t0,
+            custom_counts=timer.counts,
         )
@@ -2,30 +2,82 @@ import sinter
 
 from ._chromobius_continue_decoder import ChromobiusContinueDecoder
 from ._chromobius_gap_sampler import ChromobiusGapSampler
+from ._phase_timer import phase_timing_from_env
+from ._pipelined_sampling import pipeline_depth_from_env
 from ._pymatching_gap_sampler import PymatchingGapSampler
+from ._sampler_artifact_cache import SamplerArtifactCache, sampler_artifact_cache_from_env
+from ._splitting_sampler import SplittingSampler
+from ._stratified_sampler import StratifiedSampler
 from ._desaturation_sampler import DesaturationSampler
 from ._highlander_sampler import HighlanderSampler
 from ._no_touch_decoder import NoTouchDecoder
 from ._vec_intercept_sampler import VecInterceptSampler
 from ._twirl_intercept_sampler import TwirlInterceptSampler
 
+# The scores (in decibels) that the splitting samplers condition on, from kept shots
+# with gaps up to 30 dB to errors with gaps of at least 30 dB.
+SPLITTING_LEVELS = tuple(range(-30, 31, 10))
 
-def sinter_samplers() -> dict[str, sinter.Sampler]:
+
+def sinter_samplers(
+        *,
+        artifact_cache: SamplerArtifactCache | None = None,
+        phase_timing: bool | None = None,
+        pipeline_depth: int | None = None,
+) -> dict[str, sinter.Sampler]:
+    """Returns the custom samplers to give to sinter.
+
+    Args:
+        artifact_cache: Where the chromobius-gap, desaturation and pymatching-gap samplers
+            store the data they derive from tasks, so that other workers can load it
+            instead of recomputing it. Defaults to the directory in the
+            CULTIV_SAMPLER_ARTIFACT_CACHE environment variable, if set, otherwise no
+            cache is used.
+        phase_timing: Whether the samplers report the nanoseconds spent simulating,
+            postselecting, decoding and classifying shots, as custom counts with an
+            'ns_' prefix. Defaults to whether the CULTIV_SAMPLER_PHASE_TIMING
+            environment variable is set (to something other than 0).
+        pipeline_depth: If positive, the desaturation and pymatching-gap samplers
+            sample shots on a second thread while decoding earlier shots, with at most
+            this many sampled batches waiting to be decoded. Defaults to the
+            CULTIV_SAMPLER_PIPELINE_DEPTH environment variable, if set, otherwise 0
+            (not pipelined).
+    """
+    if artifact_cache is None:
+        artifact_cache = sampler_artifact_cache_from_env()
+    if phase_timing is None:
+        phase_timing = phase_timing_from_env()
+    if pipeline_depth is None:
+        pipeline_depth = pipeline_depth_from_env()
+    desaturation = DesaturationSampler(
+        artifact_cache=artifact_cache,
+        phase_timing=phase_timing,
+        pipeline_depth=pipeline_depth,
+    )
+    pymatching_gap = PymatchingGapSampler(
+        artifact_cache=artifact_cache,
+        phase_timing=phase_timing,
+        pipeline_depth=pipeline_depth,
+    )
     return {
-        'highlander': HighlanderSampler(),
-        'vec_intercept_t': VecInterceptSampler(turns=0.25, sweep_bit_randomization=False),
-        'vec_intercept_z': VecInterceptSampler(turns=1, sweep_bit_randomization=False),
-        'vec_intercept_s': VecInterceptSampler(turns=0.5, sweep_bit_randomization=False),
-        'vec_intercept_t_twirl': VecInterceptSampler(turns=0.25, sweep_bit_randomization=False),
-        'vec_intercept_z_twirl': VecInterceptSampler(turns=1, sweep_bit_randomization=False),
-        'vec_intercept_s_twirl': VecInterceptSampler(turns=0.5, sweep_bit_randomization=False),
-        'twirl_intercept_t': TwirlInterceptSampler(turns=0.25),
-        'twirl_intercept_z': TwirlInterceptSampler(turns=1),
-        'twirl_intercept_s': TwirlInterceptSampler(turns=0.5),
+        'highlander': HighlanderSampler(phase_timing=phase_timing),
+        'vec_intercept_t': VecInterceptSampler(turns=0.25, sweep_bit_randomization=False, phase_timing=phase_timing),
+        'vec_intercept_z': VecInterceptSampler(turns=1, sweep_bit_randomization=False, phase_timing=phase_timing),
+        'vec_intercept_s': VecInterceptSampler(turns=0.5, sweep_bit_randomization=False, phase_timing=phase_timing),
+        'vec_intercept_t_twirl': VecInterceptSampler(turns=0.25, sweep_bit_randomization=False, phase_timing=phase_timing),
+        'vec_intercept_z_twirl': VecInterceptSampler(turns=1, sweep_bit_randomization=False, phase_timing=phase_timing),
+        'vec_intercept_s_twirl': VecInterceptSampler(turns=0.5, sweep_bit_randomization=False, phase_timing=phase_timing),
+        'twirl_intercept_t': TwirlInterceptSampler(turns=0.25, phase_timing=phase_timing),
+        'twirl_intercept_z': TwirlInterceptSampler(turns=1, phase_timing=phase_timing),
+        'twirl_intercept_s': TwirlInterceptSampler(turns=0.5, phase_timing=phase_timing),
         'notouch': NoTouchDecoder(discard_on_fail=True),
         'notouch-hope': NoTouchDecoder(discard_on_fail=False),
         'chromobius-continue': ChromobiusContinueDecoder(),
-        'chromobius-gap': ChromobiusGapSampler(),
-        'desaturation': DesaturationSampler(),
-        'pymatching-gap': PymatchingGapSampler(),
+        'chromobius-gap': ChromobiusGapSampler(artifact_cache=artifact_cache, phase_timing=phase_timing),
+        'desaturation': desaturation,
+        'pymatching-gap': pymatching_gap,
+        'stratified-desaturation': StratifiedSampler(desaturation),
+        'stratified-pymatching-gap': StratifiedSampler(pymatching_gap),
+        'splitting-desaturation': SplittingSampler(desaturation, levels=SPLITTING_LEVELS),
+        'splitting-pymatching-gap': SplittingSampler(pymatching_gap, levels=SPLITTING_LEVELS),
     }
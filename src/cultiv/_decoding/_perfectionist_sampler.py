@@ -3,29 +3,39 @@ import time
 import numpy as np
 import sinter
 
+from cultiv._decoding._phase_timer import PhaseTimer
+
 
 class PerfectionistSampler(sinter.Sampler):
     """Predicts obs aren't flipped. Discards shots with any detection events."""
+    def __init__(self, phase_timing: bool = False):
+        self.phase_timing = phase_timing
+
     def compiled_sampler_for_task(self, task: sinter.Task) -> sinter.CompiledSampler:
-        return CompiledPerfectionistSampler(task)
+        return CompiledPerfectionistSampler(task, phase_timing=self.phase_timing)
 
 
 class CompiledPerfectionistSampler(sinter.CompiledSampler):
-    def __init__(self, task: sinter.Task):
+    def __init__(self, task: sinter.Task, *, phase_timing: bool = False):
         self.stim_sampler = task.circuit.compile_detector_sampler()
+        self.phase_timing = phase_timing
 
     def sample(self, max_shots: int) -> sinter.AnonTaskStats:
         t0 = time.monotonic()
+        timer = PhaseTimer(enabled=self.phase_timing)
         dets, obs = self.stim_sampler.sample(
             shots=max_shots,
             bit_packed=True,
             separate_observables=True,
         )
         num_shots = dets.shape[0]
+        timer.lap('simulate')
         discards = np.any(dets, axis=1)
-        errors = np.any(obs, axis=1)
         num_discards = np.count_nonzero(discards)
+        timer.lap('postselect')
+        errors = np.any(obs, axis=1)
         num_errors = np.count_nonzero(errors & ~discards)
+        timer.lap('classify')
         t1 = time.monotonic()
 
         return sinter.AnonTaskStats(
@@ -33,4 +43,5 @@ class CompiledPerfectionistSampler(sinter.CompiledSampler):
             errors=num_errors,
             discards=num_discards,
             seconds=t1 - t0,
+            custom_counts=timer.counts,
         )
@@ -0,0 +1,56 @@
+import collections
+import os
+import time
+
+PHASE_TIMING_ENV_VAR = 'CULTIV_SAMPLER_PHASE_TIMING'
+PHASE_TIMING_KEY_PREFIX = 'ns_'
+
+
+class PhaseTimer:
+    """Accumulates the nanoseconds that a compiled sampler's `sample` method spends in each phase.
+
+    The phases are:
+        - simulate: sampling detection events (and observable flips) from the circuit.
+        - postselect: finding and removing discarded shots.
+        - decode: predicting observable flips with a decoder other than the gap decoder.
+        - decode_on: gap decoding with the observable's detector excited.
+        - decode_off: gap decoding with the observable's detector not excited.
+        - classify: comparing predictions to actual flips, and histogramming gaps.
+        - wait: waiting for another thread to sample shots (when pipelined).
+    Samplers only report the phases they have. Time that isn't spent in any phase (e.g.
+    creating the timer) isn't counted.
+
+    The totals are reported as custom counts like 'ns_simulate', which sinter sums over
+    batches and workers. When disabled, `lap` does nothing and no counts are reported.
+    """
+
+    def __init__(self, *, enabled: bool = True):
+        self.enabled = enabled
+        self.counts: collections.Counter[str] = collections.Counter()
+        self._t = time.perf_counter_ns() if enabled else 0
+
+    def lap(self, phase: str) -> None:
+        """Attributes the time since the previous lap (or since the timer was created) to a phase."""
+        if self.enabled:
+            t = time.perf_counter_ns()
+            self.counts[PHASE_TIMING_KEY_PREFIX + phase] += t - self._t
+            self._t = t
+
+
+def phase_timing_from_env() -> bool:
+    """Returns whether the CULTIV_SAMPLER_PHASE_TIMING environment variable asks for phase timing."""
+    return os.environ.get(PHASE_TIMING_ENV_VAR, '') not in ('', '0')
+
+
+def is_phase_timing_key(key: str) -> bool:
+    """Determines if a custom count key is a phase timing, as opposed to e.g. a gap bin."""
+    return key.startswith(PHASE_TIMING_KEY_PREFIX)
+
+
+def phase_seconds(custom_counts: collections.Counter[str] | dict[str, int]) -> dict[str, float]:
+    """Returns the seconds spent in each phase, from the custom counts of a stat."""
+    return {
+        key[len(PHASE_TIMING_KEY_PREFIX):]: count / 1e9
+        for key, count in custom_counts.items()
+        if is_phase_timing_key(key)
+    }
@@ -0,0 +1,54 @@
+import sinter
+import stim
+
+import cultiv
+import gen
+from ._phase_timer import PhaseTimer, phase_seconds, phase_timing_from_env
+
+
+def test_phase_timer():
+    timer = PhaseTimer()
+    timer.lap('simulate')
+    timer.lap('classify')
+    timer.lap('simulate')
+    assert sorted(timer.counts.keys()) == ['ns_classify', 'ns_simulate']
+    assert all(v >= 0 for v in timer.counts.values())
+
+    disabled = PhaseTimer(enabled=False)
+    disabled.lap('simulate')
+    assert not disabled.counts
+
+
+def test_phase_seconds():
+    assert phase_seconds({'C5': 10, 'ns_simulate': 2_500_000_000, 'ns_decode_on': 1000}) == {
+        'simulate': 2.5,
+        'decode_on': 1e-6,
+    }
+
+
+def test_phase_timing_from_env(monkeypatch):
+    monkeypatch.delenv('CULTIV_SAMPLER_PHASE_TIMING', raising=False)
+    assert not phase_timing_from_env()
+    monkeypatch.setenv('CULTIV_SAMPLER_PHASE_TIMING', '0')
+    assert not phase_timing_from_env()
+    monkeypatch.setenv('CULTIV_SAMPLER_PHASE_TIMING', '1')
+    assert phase_timing_from_env()
+
+
+def test_samplers_report_phase_timings():
+    circuit = cultiv.make_end2end_cultivation_circuit(dcolor=3, dsurface=7, basis='Y', r_growing=2, r_end=1, inject_style='unitary')
+    circuit = gen.NoiseModel.uniform_depolarizing(1e-3).noisy_circuit_skipping_mpp_boundaries(circuit)
+    task = sinter.Task(circuit=circuit, detector_error_model=circuit.detector_error_model(), decoder='desaturation')
+
+    untimed = cultiv.sinter_samplers(phase_timing=False)['desaturation'].compiled_sampler_for_task(task).sample(256)
+    assert not any(k.startswith('ns_') for k in untimed.custom_counts)
+
+    timed = cultiv.sinter_samplers(phase_timing=True)['desaturation'].compiled_sampler_for_task(task).sample(256)
+    assert phase_seconds(timed.custom_counts).keys() == {'simulate', 'postselect', 'decode_on', 'decode_off', 'classify'}
+    gap_shots = sum(v for k, v in timed.custom_counts.items() if not k.startswith('ns_'))
+    assert gap_shots == timed.shots - timed.discards
+
+    circuit = stim.Circuit.generated('repetition_code:memory', distance=3, rounds=2, before_round_data_depolarization=0.01)
+    task = sinter.Task(circuit=circuit, detector_error_model=circuit.detector_error_model(), decoder='highlander')
+    timed = cultiv.sinter_samplers(phase_timing=True)['highlander'].compiled_sampler_for_task(task).sample(100)
+    assert phase_seconds(timed.custom_counts).keys() == {'simulate', 'decode', 'classify'}
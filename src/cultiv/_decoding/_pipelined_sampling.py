@@ -0,0 +1,97 @@
+import os
+import queue
+import threading
+from typing import Callable, Iterator, TypeVar
+
+from cultiv._decoding._phase_timer import PhaseTimer
+
+PIPELINE_DEPTH_ENV_VAR = 'CULTIV_SAMPLER_PIPELINE_DEPTH'
+
+TBatch = TypeVar('TBatch')
+
+
+class _SamplingFailed:
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+_DONE = object()
+
+
+def iter_sampled_batches(
+        sample_batch: Callable[[int, PhaseTimer], TBatch],
+        *,
+        shots: int,
+        timer: PhaseTimer,
+        pipeline_depth: int,
+        pipeline_batch_size: int,
+) -> Iterator[TBatch]:
+    """Yields batches of sampled shots, sampling the next batches while the caller decodes.
+
+    When `pipeline_depth` is 0, or the shots fit into one batch, all the shots are
+    sampled in one batch on the calling thread. Otherwise a thread samples batches of
+    (up to) `pipeline_batch_size` shots, and puts them into a queue holding at most
+    `pipeline_depth` batches. The thread blocks while the queue is full, so sampling
+    can't get far ahead of decoding. Stim sampling and pymatching decoding run in
+    native code, so the two threads can keep two cores busy.
+
+    Args:
+        sample_batch: Samples (and postselects) a batch with the given number of shots.
+            Laps the given timer after each phase.
+        shots: The total number of shots to sample.
+        timer: Times the phases of sampling. In pipelined mode the sampling thread
+            uses its own timer, which is added into this one when done, and the time
+            the calling thread spends waiting for batches is attributed to a 'wait'
+            phase.
+        pipeline_depth: The maximum number of sampled batches waiting to be decoded.
+        pipeline_batch_size: The number of shots in each pipelined batch.
+    """
+    if pipeline_depth <= 0 or shots <= pipeline_batch_size:
+        yield sample_batch(shots, timer)
+        return
+
+    batches: queue.Queue = queue.Queue(maxsize=pipeline_depth)
+    stop = threading.Event()
+    sample_timer = PhaseTimer(enabled=timer.enabled)
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            shots_left = shots
+            while shots_left > 0:
+                n = min(shots_left, pipeline_batch_size)
+                if not put(sample_batch(n, sample_timer)):
+                    return
+                shots_left -= n
+            put(_DONE)
+        except BaseException as ex:
+            put(_SamplingFailed(ex))
+
+    thread = threading.Thread(target=produce, name='cultiv-pipelined-sampling', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = batches.get()
+            timer.lap('wait')
+            if item is _DONE:
+                break
+            if isinstance(item, _SamplingFailed):
+                raise item.exception
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+        timer.counts.update(sample_timer.counts)
+
+
+def pipeline_depth_from_env() -> int:
+    """Returns the pipeline depth given by the CULTIV_SAMPLER_PIPELINE_DEPTH environment variable, or 0."""
+    return int(os.environ.get(PIPELINE_DEPTH_ENV_VAR) or 0)
@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+import pytest
+import sinter
+
+import cultiv
+import gen
+from ._phase_timer import PhaseTimer
+from ._pipelined_sampling import iter_sampled_batches
+
+
+def test_iter_sampled_batches_not_pipelined():
+    calls = []
+
+    def sample_batch(shots: int, timer: PhaseTimer) -> int:
+        calls.append((shots, threading.current_thread()))
+        return shots
+
+    timer = PhaseTimer()
+    assert list(iter_sampled_batches(sample_batch, shots=5000, timer=timer, pipeline_depth=0, pipeline_batch_size=1024)) == [5000]
+    assert list(iter_sampled_batches(sample_batch, shots=1000, timer=timer, pipeline_depth=2, pipeline_batch_size=1024)) == [1000]
+    assert all(thread is threading.current_thread() for _, thread in calls)
+
+
+def test_iter_sampled_batches_pipelined():
+    queued = threading.Semaphore(0)
+    threads = set()
+
+    def sample_batch(shots: int, timer: PhaseTimer) -> int:
+        threads.add(threading.current_thread())
+        timer.lap('simulate')
+        queued.release()
+        return shots
+
+    timer = PhaseTimer()
+    batches = iter_sampled_batches(sample_batch, shots=5000, timer=timer, pipeline_depth=2, pipeline_batch_size=1024)
+    assert next(batches) == 1024
+    # The sampling thread can get at most the queue depth ahead (plus one batch being put).
+    for _ in range(4):
+        assert queued.acquire(timeout=10)
+    assert not queued.acquire(timeout=0.2)
+    assert list(batches) == [1024, 1024, 1024, 904]
+    assert threads and threading.current_thread() not in threads
+    assert timer.counts.keys() == {'ns_simulate', 'ns_wait'}
+
+
+def test_iter_sampled_batches_propagates_errors_and_stops_early():
+    def failing_batch(shots: int, timer: PhaseTimer) -> int:
+        raise ValueError('sampling failed')
+
+    with pytest.raises(ValueError, match='sampling failed'):
+        list(iter_sampled_batches(failing_batch, shots=5000, timer=PhaseTimer(), pipeline_depth=2, pipeline_batch_size=1024))
+
+    calls = []
+
+    def sample_batch(shots: int, timer: PhaseTimer) -> int:
+        calls.append(shots)
+        return shots
+
+    batches = iter_sampled_batches(sample_batch, shots=10**9, timer=PhaseTimer(), pipeline_depth=2, pipeline_batch_size=10)
+    assert next(batches) == 10
+    batches.close()
+    assert len(calls) <= 5
+
+
+@pytest.mark.parametrize('decoder', ['desaturation', 'pymatching-gap'])
+def test_pipelined_samplers(decoder: str):
+    if decoder == 'desaturation':
+        circuit = cultiv.make_end2end_cultivation_circuit(dcolor=3, dsurface=7, basis='Y', r_growing=2, r_end=1, inject_style='unitary')
+    else:
+        circuit = cultiv.make_idle_matchable_code_circuit(dcolor=3, dsurface=7, basis='Y', rounds=3)
+    circuit = gen.NoiseModel.uniform_depolarizing(1e-3).noisy_circuit_skipping_mpp_boundaries(circuit)
+    task = sinter.Task(circuit=circuit, detector_error_model=circuit.detector_error_model(), decoder=decoder)
+
+    sampler = cultiv.sinter_samplers(pipeline_depth=2, phase_timing=True)[decoder]
+    sampler.pipeline_batch_size = 100
+    stats = sampler.compiled_sampler_for_task(task).sample(1050)
+    assert stats.shots == 1050
+    gap_counts = {k: v for k, v in stats.custom_counts.items() if not k.startswith('ns_')}
+    assert sum(gap_counts.values()) == stats.shots - stats.discards
+    assert sum(v for k, v in gap_counts.items() if k.startswith('E')) == stats.errors
+    assert stats.errors < 0.1 * stats.shots
+    assert 'ns_wait' in stats.custom_counts
+    assert np.isfinite(stats.seconds)
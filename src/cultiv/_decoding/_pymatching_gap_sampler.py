@@ -1,12 +1,16 @@
 import collections
 import math
 import time
+from typing import Any
 
 import numpy as np
 import pymatching
 import sinter
 import stim
 
+from cultiv._decoding._phase_timer import PhaseTimer
+from cultiv._decoding._pipelined_sampling import iter_sampled_batches
+from cultiv._decoding._sampler_artifact_cache import SamplerArtifactCache
 from latte.dem_util import dem_with_compressed_detectors, \
     dem_with_replaced_targets
 
@@ -16,40 +20,87 @@ class PymatchingGapSampler(sinter.Sampler):
 
     Requires the observable to exist purely on boundary edges.
     """
-    def __init__(self, decoder: sinter.Decoder | None = None):
+    def __init__(
+            self,
+            decoder: sinter.Decoder | None = None,
+            artifact_cache: SamplerArtifactCache | None = None,
+            phase_timing: bool = False,
+            pipeline_depth: int = 0,
+            pipeline_batch_size: int = 1024,
+    ):
+        """
+        Args:
+            decoder: Predicts observable flips. Defaults to the prediction of the gap decoder.
+            artifact_cache: If set, the dems and postselection mask derived from each task
+                are stored in (or loaded from) this cache.
+            phase_timing: If set, the time spent in each phase of sampling is reported
+                in the custom counts (see `cultiv._decoding._phase_timer.PhaseTimer`).
+            pipeline_depth: If positive, shots are sampled on another thread while
+                earlier shots are decoded, with at most this many sampled batches
+                waiting to be decoded (see
+                `cultiv._decoding._pipelined_sampling.iter_sampled_batches`).
+            pipeline_batch_size: The number of shots in each pipelined batch.
+        """
         self.decoder = decoder
+        self.artifact_cache = artifact_cache
+        self.phase_timing = phase_timing
+        self.pipeline_depth = pipeline_depth
+        self.pipeline_batch_size = pipeline_batch_size
 
     def compiled_sampler_for_task(self, task: sinter.Task) -> sinter.CompiledSampler:
-        return CompiledPymatchingGapSampler(task, self.decoder)
+        return CompiledPymatchingGapSampler(
+            task,
+            self.decoder,
+            artifact_cache=self.artifact_cache,
+            phase_timing=self.phase_timing,
+            pipeline_depth=self.pipeline_depth,
+            pipeline_batch_size=self.pipeline_batch_size,
+        )
+
+
+def _is_postselected(coords: list[float]) -> bool:
+    if len(coords) > 4 and (coords[4] == -99 or coords[4] == -9):
+        return True
+    if coords[-1] == 999:
+        return True
+    return False
 
 
 class CompiledPymatchingGapSampler(sinter.CompiledSampler):
-    def __init__(self, task: sinter.Task, decoder: sinter.Decoder | None):
-        circuit = task.circuit
-        def is_postselected(coords: list[float]) -> bool:
-            if len(coords) > 4 and (coords[4] == -99 or coords[4] == -9):
-                return True
-            if coords[-1] == 999:
-                return True
-            return False
+    # Increase when changing what `_compute_artifacts` derives from a task.
+    ARTIFACT_VERSION = 1
 
+    def __init__(
+            self,
+            task: sinter.Task,
+            decoder: sinter.Decoder | None,
+            *,
+            artifact_cache: SamplerArtifactCache | None = None,
+            phase_timing: bool = False,
+            pipeline_depth: int = 0,
+            pipeline_batch_size: int = 1024,
+    ):
+        circuit = task.circuit
+        self.phase_timing = phase_timing
+        self.pipeline_depth = pipeline_depth
+        self.pipeline_batch_size = pipeline_batch_size
         self.num_obs = circuit.num_observables
         num_dets = circuit.num_detectors
         if self.num_obs > 8:
             raise NotImplementedError(f"{self.num_obs} > 8")
 
-        dem = circuit.detector_error_model(
-            decompose_errors=True,
-            approximate_disjoint_errors=True,
-            ignore_decomposition_failures=True,
-        )
-        dem = dem_with_compressed_detectors(
-            dem=dem,
-            compressed_detector_predicate=is_postselected,
-            max_compressed_errors=2,
-            error_size_cutoff=3,
-            detection_event_cutoff=4,
-        )
+        if artifact_cache is None:
+            artifacts = _compute_artifacts(circuit)
+        else:
+            artifacts = artifact_cache.load_or_compute(
+                task,
+                sampler='pymatching-gap',
+                version=CompiledPymatchingGapSampler.ARTIFACT_VERSION,
+                compute=lambda: _compute_artifacts(circuit),
+            )
+        dem = artifacts['dem']
+        dem_obs2det = artifacts['dem_obs2det']
+        self.postselection_mask = np.array(artifacts['postselection_mask'])
 
         # Byte-align the additional detectors, for convenience.
         aligned_circuit = circuit.copy()
@@ -59,22 +110,7 @@ class CompiledPymatchingGapSampler(sinter.CompiledSampler):
         for k in range(self.num_obs):
             aligned_circuit.append("DETECTOR")
 
-        dem_obs2det = dem_with_replaced_targets(dem, {
-            stim.target_logical_observable_id(k): stim.target_relative_detector_id(num_dets + k)
-            for k in range(self.num_obs)
-        })
-        dem.append('detector', (), [stim.target_relative_detector_id(aligned_circuit.num_detectors - 1)])
-
-        self.postselection_mask = np.zeros(shape=num_dets // 8 + 1, dtype=np.uint8)
-        vv1 = []
-        vv2 = []
         self.d2c = circuit.get_detector_coordinates()
-        for det, coords in self.d2c.items():
-            if is_postselected(coords):
-                vv1.append(det)
-                vv2.append(coords)
-                self.postselection_mask[det >> 3] |= 1 << (det & 7)
-
         self.controlled_det_byte = num_dets >> 3
         if decoder is not None:
             self.compiled_decoder = decoder.compile_decoder_for_dem(dem=dem)
@@ -82,24 +118,57 @@ class CompiledPymatchingGapSampler(sinter.CompiledSampler):
             self.compiled_decoder = None
         self.gap_matcher = pymatching.Matching.from_detector_error_model(dem_obs2det)
         self.stim_sampler = aligned_circuit.compile_detector_sampler()
+        self.num_sampled_dets = aligned_circuit.num_detectors
 
         edge = next(iter(self.gap_matcher.to_networkx().edges.values()))
         edge_w = edge['weight']
         edge_p = edge['error_probability']
         self.decibels_per_w = -math.log10(edge_p / (1 - edge_p)) * 10 / edge_w
 
-    def sample(self, max_shots: int) -> sinter.AnonTaskStats:
-        t0 = time.monotonic()
+    def _sample_kept_shots(self, shots: int, timer: PhaseTimer) -> tuple[np.ndarray, np.ndarray, int]:
+        """Returns the bit packed detection events and observable flips of the kept shots, and the number of discards."""
         dets, actual_obs = self.stim_sampler.sample(
-            shots=max_shots,
+            shots=shots,
             bit_packed=True,
             separate_observables=True,
         )
-        num_shots = dets.shape[0]
+        timer.lap('simulate')
+        return self._postselect(dets, actual_obs, timer)
+
+    def _postselect(self, dets: np.ndarray, actual_obs: np.ndarray, timer: PhaseTimer) -> tuple[np.ndarray, np.ndarray, int]:
         discard_mask = np.any(dets & self.postselection_mask, axis=1)
         num_discards = np.count_nonzero(discard_mask)
         dets = dets[~discard_mask]
         actual_obs = actual_obs[~discard_mask]
+        timer.lap('postselect')
+        return dets, actual_obs, num_discards
+
+    def _classify_kept_shots(
+            self,
+            dets: np.ndarray,
+            actual_obs: np.ndarray,
+            custom_counts: collections.Counter,
+            timer: PhaseTimer,
+    ) -> int:
+        """Decodes kept shots, adds their gaps to the custom counts, and returns the number of errors."""
+        errors, gaps_db = self._decode_kept_shots(dets, actual_obs, timer)
+
+        # Classify all shots by their error + gap.
+        for k in range(dets.shape[0]):
+            g = gaps_db[k]
+            e = 'CE'[errors[k]]
+            key = f'{e}{g}'
+            custom_counts[key] += 1
+        timer.lap('classify')
+        return np.count_nonzero(errors)
+
+    def _decode_kept_shots(
+            self,
+            dets: np.ndarray,
+            actual_obs: np.ndarray,
+            timer: PhaseTimer,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns whether each kept shot was decoded incorrectly, and its gap in decibels."""
         num_kept_shots = dets.shape[0]
 
         predictions: np.ndarray | None = None
@@ -107,6 +176,7 @@ class CompiledPymatchingGapSampler(sinter.CompiledSampler):
             predictions = self.compiled_decoder.decode_shots_bit_packed(
                 bit_packed_detection_event_data=dets
             )[:, 0]
+            timer.lap('decode')
 
         weights = np.zeros(shape=(num_kept_shots, 1 << self.num_obs), dtype=np.float64)
         for mask in range(1 << self.num_obs):
@@ -117,6 +187,7 @@ class CompiledPymatchingGapSampler(sinter.CompiledSampler):
                 self.d2c,
             )
             weights[:, mask] = weight
+            timer.lap('decode_on' if mask else 'decode_off')
 
         if self.compiled_decoder is None:
             predictions = np.array(np.argmin(weights, axis=1), dtype=np.uint8)
@@ -124,20 +195,85 @@ class CompiledPymatchingGapSampler(sinter.CompiledSampler):
         errors = predictions != actual_obs[:, 0]
         sorted_weights = np.sort(weights, axis=1)
         gaps = (sorted_weights[:, 1] - sorted_weights[:, 0])
-        num_errors = np.count_nonzero(errors)
 
-        # Classify all shots by their error + gap.
-        custom_counts = collections.Counter()
         gaps_db = np.round(gaps * self.decibels_per_w).astype(dtype=np.int64)
-        for k in range(num_kept_shots):
-            g = gaps_db[k]
-            e = 'CE'[errors[k]]
-            key = f'{e}{g}'
-            custom_counts[key] += 1
+        return errors, gaps_db
+
+    def _pack_detection_events(self, dets: np.ndarray, obs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        padded_dets = np.zeros(shape=(dets.shape[0], self.num_sampled_dets), dtype=np.bool_)
+        padded_dets[:, :dets.shape[1]] = dets
+        return (
+            np.packbits(padded_dets, axis=1, bitorder='little'),
+            np.packbits(obs, axis=1, bitorder='little'),
+        )
+
+    def decode_detection_events(self, dets: np.ndarray, obs: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Postselects and decodes given shots, returning the outcome of each shot.
+
+        Args:
+            dets: A bool array of shape (shots, num_detectors) with the detection events
+                of the task's circuit.
+            obs: A bool array of shape (shots, num_observables) with the observable flips.
+
+        Returns:
+            A (kept, errors, gaps) tuple of arrays with a value per shot. `kept` and
+            `errors` are bool arrays, and `gaps` is an int array of gaps in decibels,
+            binned like the custom counts of `sample`. Discarded shots have no error and
+            a gap of 0.
+        """
+        packed_dets, packed_obs = self._pack_detection_events(dets, obs)
+        kept = ~np.any(packed_dets & self.postselection_mask, axis=1)
+        errors = np.zeros(shape=dets.shape[0], dtype=np.bool_)
+        gaps = np.zeros(shape=dets.shape[0], dtype=np.int64)
+        if np.any(kept):
+            errors[kept], gaps[kept] = self._decode_kept_shots(
+                packed_dets[kept],
+                packed_obs[kept],
+                PhaseTimer(enabled=False),
+            )
+        return kept, errors, gaps
+
+    def classify_detection_events(self, dets: np.ndarray, obs: np.ndarray) -> sinter.AnonTaskStats:
+        """Postselects, decodes and classifies given shots, instead of sampled shots.
+
+        Args:
+            dets: A bool array of shape (shots, num_detectors) with the detection events
+                of the task's circuit.
+            obs: A bool array of shape (shots, num_observables) with the observable flips.
+
+        Returns:
+            Stats with the same custom counts as the stats returned by `sample`.
+        """
+        timer = PhaseTimer(enabled=False)
+        kept_dets, kept_obs, num_discards = self._postselect(*self._pack_detection_events(dets, obs), timer)
+        custom_counts = collections.Counter()
+        num_errors = self._classify_kept_shots(kept_dets, kept_obs, custom_counts, timer)
+        return sinter.AnonTaskStats(
+            shots=dets.shape[0],
+            errors=num_errors,
+            discards=num_discards,
+            custom_counts=custom_counts,
+        )
+
+    def sample(self, max_shots: int) -> sinter.AnonTaskStats:
+        t0 = time.monotonic()
+        timer = PhaseTimer(enabled=self.phase_timing)
+        num_errors = 0
+        num_discards = 0
+        custom_counts = collections.Counter()
+        for dets, actual_obs, discards in iter_sampled_batches(
+                self._sample_kept_shots,
+                shots=max_shots,
+                timer=timer,
+                pipeline_depth=self.pipeline_depth,
+                pipeline_batch_size=self.pipeline_batch_size):
+            num_errors += self._classify_kept_shots(dets, actual_obs, custom_counts, timer)
+            num_discards += discards
+        custom_counts.update(timer.counts)
         t1 = time.monotonic()
 
         return sinter.AnonTaskStats(
-            shots=num_shots,
+            shots=max_shots,
             errors=num_errors,
             discards=num_discards,
             seconds=t1 - t0,
@@ -145,6 +281,45 @@ class CompiledPymatchingGapSampler(sinter.CompiledSampler):
         )
 
 
+def _compute_artifacts(circuit: stim.Circuit) -> dict[str, Any]:
+    """Derives the decoding and gap dems, and the postselection mask, from a circuit."""
+    num_obs = circuit.num_observables
+    dem = circuit.detector_error_model(
+        decompose_errors=True,
+        approximate_disjoint_errors=True,
+        ignore_decomposition_failures=True,
+    )
+    dem = dem_with_compressed_detectors(
+        dem=dem,
+        compressed_detector_predicate=_is_postselected,
+        max_compressed_errors=2,
+        error_size_cutoff=3,
+        detection_event_cutoff=4,
+    )
+
+    # Byte-align the additional detectors, for convenience.
+    num_dets = circuit.num_detectors
+    while num_dets & 7:
+        num_dets += 1
+
+    dem_obs2det = dem_with_replaced_targets(dem, {
+        stim.target_logical_observable_id(k): stim.target_relative_detector_id(num_dets + k)
+        for k in range(num_obs)
+    })
+    dem.append('detector', (), [stim.target_relative_detector_id(num_dets + num_obs - 1)])
+
+    postselection_mask = np.zeros(shape=num_dets // 8 + 1, dtype=np.uint8)
+    for det, coords in circuit.get_detector_coordinates().items():
+        if _is_postselected(coords):
+            postselection_mask[det >> 3] |= 1 << (det & 7)
+
+    return {
+        'dem': dem,
+        'dem_obs2det': dem_obs2det,
+        'postselection_mask': postselection_mask,
+    }
+
+
 def _decode_weight_with_pymatching_with_better_error_message(
         matcher: pymatching.Matching,
         dets: np.ndarray,
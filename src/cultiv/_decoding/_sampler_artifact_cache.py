@@ -0,0 +1,118 @@
+import json
+import os
+import pathlib
+import shutil
+from typing import Any, Callable
+
+import numpy as np
+import sinter
+import stim
+
+SAMPLER_ARTIFACT_CACHE_VERSION = 1
+SAMPLER_ARTIFACT_CACHE_ENV_VAR = 'CULTIV_SAMPLER_ARTIFACT_CACHE'
+
+
+class SamplerArtifactCache:
+    """Stores the data that compiled samplers derive from a task, keyed by the task's strong id.
+
+    Compiling a sampler (e.g. building the gap detector error model of the desaturation
+    sampler) can take seconds, and is repeated by every sinter worker that works on the
+    task. The cache lets workers load the derived data instead.
+
+    Each entry is a directory containing one file per artifact:
+        - `stim.DetectorErrorModel` artifacts are stored as `.dem` text files (which
+            store probabilities exactly).
+        - `np.ndarray` artifacts are stored as `.npy` files, and are memory mapped when
+            loaded.
+        - Other artifacts are stored together in a json file.
+
+    Entries are keyed by the sampler's name and version, and by the task's strong id.
+    Samplers must increase their version when they change what they derive.
+    """
+
+    def __init__(self, directory: str | pathlib.Path):
+        """
+        Args:
+            directory: Where to store artifacts. Created when first written to.
+        """
+        self.directory = pathlib.Path(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, task: sinter.Task, *, sampler: str, version: int) -> pathlib.Path:
+        """Returns the directory that the artifacts derived from a task are stored in."""
+        return self.directory / f'{sampler}-v{SAMPLER_ARTIFACT_CACHE_VERSION}.{version}-{task.strong_id()}'
+
+    def load_or_compute(
+            self,
+            task: sinter.Task,
+            *,
+            sampler: str,
+            version: int,
+            compute: Callable[[], dict[str, Any]],
+    ) -> dict[str, Any]:
+        """Returns the cached artifacts for a task, computing and storing them if needed.
+
+        Args:
+            task: The task the artifacts are derived from. Tasks without a strong id
+                (because their decoder or detector error model isn't set) aren't cached.
+            sampler: The name of the sampler deriving the artifacts.
+            version: The version of the sampler's derivation.
+            compute: Computes the artifacts, as a dictionary from names to values.
+
+        Returns:
+            The artifacts, as returned by `compute`, except that arrays are read-only
+            and json values have been round-tripped through json.
+        """
+        if task.decoder is None or task.detector_error_model is None:
+            return compute()
+        path = self.entry_path(task, sampler=sampler, version=version)
+        if path.exists():
+            self.hits += 1
+            return _read_artifacts(path)
+
+        self.misses += 1
+        artifacts = compute()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir()
+        _write_artifacts(tmp_path, artifacts)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another worker stored the same artifacts first.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return _read_artifacts(path)
+
+
+def sampler_artifact_cache_from_env() -> SamplerArtifactCache | None:
+    """Returns a cache in the directory given by the CULTIV_SAMPLER_ARTIFACT_CACHE environment variable, if set."""
+    directory = os.environ.get(SAMPLER_ARTIFACT_CACHE_ENV_VAR)
+    if not directory:
+        return None
+    return SamplerArtifactCache(directory)
+
+
+def _write_artifacts(path: pathlib.Path, artifacts: dict[str, Any]) -> None:
+    json_values = {}
+    for name, value in artifacts.items():
+        if isinstance(value, stim.DetectorErrorModel):
+            value.to_file(path / f'{name}.dem')
+        elif isinstance(value, np.ndarray):
+            np.save(path / f'{name}.npy', value, allow_pickle=False)
+        else:
+            json_values[name] = value
+    with open(path / 'values.json', 'w') as f:
+        json.dump(json_values, f)
+
+
+def _read_artifacts(path: pathlib.Path) -> dict[str, Any]:
+    with open(path / 'values.json') as f:
+        artifacts = json.load(f)
+    for file in sorted(path.iterdir()):
+        if file.suffix == '.dem':
+            artifacts[file.stem] = stim.DetectorErrorModel.from_file(file)
+        elif file.suffix == '.npy':
+            artifacts[file.stem] = np.load(file, mmap_mode='r', allow_pickle=False)
+    return artifacts
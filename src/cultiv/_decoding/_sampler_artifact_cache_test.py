@@ -0,0 +1,73 @@
+import numpy as np
+import sinter
+import stim
+
+import cultiv
+import gen
+from ._desaturation_sampler import CompiledDesaturationSampler
+from ._pymatching_gap_sampler import CompiledPymatchingGapSampler
+from ._sampler_artifact_cache import SamplerArtifactCache
+
+
+def test_load_or_compute(tmp_path):
+    cache = SamplerArtifactCache(tmp_path / 'cache')
+    circuit = stim.Circuit.generated('repetition_code:memory', distance=3, rounds=2, before_round_data_depolarization=0.125)
+    task = sinter.Task(circuit=circuit, detector_error_model=circuit.detector_error_model(), decoder='test')
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {
+            'dem': task.detector_error_model,
+            'mask': np.array([1, 2, 3], dtype=np.uint8),
+            'coords': [[0.5, -9], [1.25]],
+        }
+
+    for _ in range(2):
+        artifacts = cache.load_or_compute(task, sampler='test', version=1, compute=compute)
+        assert artifacts['dem'] == task.detector_error_model
+        np.testing.assert_array_equal(artifacts['mask'], [1, 2, 3])
+        assert artifacts['coords'] == [[0.5, -9], [1.25]]
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.load_or_compute(task, sampler='test', version=2, compute=compute)
+    cache.load_or_compute(task, sampler='other', version=1, compute=compute)
+    assert len(calls) == 3
+    assert len(list((tmp_path / 'cache').iterdir())) == 3
+
+    # Tasks without a strong id aren't cached.
+    undecoded = sinter.Task(circuit=circuit, detector_error_model=circuit.detector_error_model())
+    cache.load_or_compute(undecoded, sampler='test', version=1, compute=compute)
+    assert len(calls) == 4
+
+
+def test_desaturation_sampler_cache(tmp_path):
+    c = cultiv.make_end2end_cultivation_circuit(dcolor=3, dsurface=7, basis='Y', r_growing=2, r_end=1, inject_style='unitary')
+    c = gen.NoiseModel.uniform_depolarizing(1e-3).noisy_circuit_skipping_mpp_boundaries(c)
+    task = sinter.Task(circuit=c, detector_error_model=c.detector_error_model(), decoder='desaturation')
+    cache = SamplerArtifactCache(tmp_path)
+
+    expected = CompiledDesaturationSampler.from_task(task)
+    for _ in range(2):
+        actual = CompiledDesaturationSampler.from_task(task, artifact_cache=cache)
+        assert actual.gap_dem == expected.gap_dem
+        assert actual.gap_circuit == expected.gap_circuit
+        assert actual.postselected_detectors == expected.postselected_detectors
+        assert actual.decode_det_set(set()) == (False, 67)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_pymatching_gap_sampler_cache(tmp_path):
+    c = cultiv.make_idle_matchable_code_circuit(dcolor=3, dsurface=6, basis='Y', rounds=3)
+    c = gen.NoiseModel.uniform_depolarizing(1e-3).noisy_circuit_skipping_mpp_boundaries(c)
+    task = sinter.Task(circuit=c, detector_error_model=c.detector_error_model(), decoder='pymatching-gap')
+    cache = SamplerArtifactCache(tmp_path)
+
+    expected = CompiledPymatchingGapSampler(task, None)
+    for _ in range(2):
+        actual = CompiledPymatchingGapSampler(task, None, artifact_cache=cache)
+        np.testing.assert_array_equal(actual.postselection_mask, expected.postselection_mask)
+        assert actual.decibels_per_w == expected.decibels_per_w
+        assert actual.sample(256).shots == 256
+    assert (cache.hits, cache.misses) == (1, 1)
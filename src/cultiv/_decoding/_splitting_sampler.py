@@ -0,0 +1,309 @@
+import collections
+import time
+from typing import Iterable
+
+import numpy as np
+import sinter
+
+from cultiv._decoding._stratified_sampler import dem_fault_incidence
+
+SPLITTING_KEY_PREFIX = 'S'
+DISCARDED_SCORE = np.iinfo(np.int64).min
+
+
+class SplittingSampler(sinter.Sampler):
+    """Estimates the probability of rare high-gap logical errors, using subset simulation.
+
+    Each shot is scored by its outcome. A kept shot with a logical error scores its gap,
+    a kept shot without a logical error scores minus its gap minus one, and a discarded
+    shot scores -infinity. So shots with a score of at least T >= 0 are exactly the
+    shots that are kept, have a logical error, and have a gap of at least T (i.e. the
+    errors that remain when postselecting on a gap threshold of T).
+
+    Each call to `sample` first samples shots directly, by picking which error
+    mechanisms of the task's detector error model fire. These shots are reported like
+    the shots of the gap sampler (with 'C' and 'E' gap custom counts). Then, for each
+    pair of consecutive levels (a, b), Markov chains over the sets of firing mechanisms
+    are run conditioned on the score being at least a. They start from the shots that
+    reached a, and count how often they reach b. The chains are reported in custom
+    counts with keys like 'S-10:0:trials', 'S-10:0:hits' and 'S-10:0:hit_pairs'. The
+    probability of reaching the last level is estimated by the probability of reaching
+    the first level times the conditional probabilities of reaching each next level.
+    See `cultiv.estimate_splitting_stat`.
+    """
+
+    def __init__(
+            self,
+            gap_sampler: sinter.Sampler,
+            *,
+            levels: Iterable[int],
+            steps: int = 10,
+    ):
+        """
+        Args:
+            gap_sampler: A sampler whose compiled samplers have a
+                `decode_detection_events` method, such as the desaturation and
+                pymatching-gap samplers.
+            levels: Increasing scores to condition on. Their spacing trades the number
+                of levels against how rarely each level reaches the next.
+            steps: The number of steps each Markov chain takes. Each level runs one
+                chain per `steps` shots, so every level costs about as much as the
+                directly sampled shots.
+        """
+        self.gap_sampler = gap_sampler
+        self.levels = tuple(levels)
+        self.steps = steps
+
+    def compiled_sampler_for_task(self, task: sinter.Task) -> sinter.CompiledSampler:
+        return CompiledSplittingSampler(
+            task,
+            gap_sampler=self.gap_sampler.compiled_sampler_for_task(task),
+            levels=self.levels,
+            steps=self.steps,
+        )
+
+
+class FaultConfigurations:
+    """The sets of firing error mechanisms of several shots.
+
+    Stored as a padded int array with a row per shot, listing the mechanisms that fire
+    followed by -1s, and the number of mechanisms firing in each shot.
+    """
+
+    def __init__(self, faults: np.ndarray, weights: np.ndarray):
+        self.faults = faults
+        self.weights = weights
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def __getitem__(self, index: np.ndarray) -> 'FaultConfigurations':
+        return FaultConfigurations(self.faults[index], self.weights[index])
+
+    @staticmethod
+    def from_pairs(shots: int, shot_indices: np.ndarray, mechanisms: np.ndarray) -> 'FaultConfigurations':
+        """Collects (shot, mechanism) pairs into the fault configurations of each shot."""
+        order = np.argsort(shot_indices, kind='stable')
+        shot_indices = shot_indices[order]
+        mechanisms = mechanisms[order]
+        weights = np.bincount(shot_indices, minlength=shots)
+        starts = np.cumsum(weights) - weights
+        faults = np.full(shape=(shots, max(1, int(np.max(weights, initial=0)))), fill_value=-1, dtype=np.int64)
+        faults[shot_indices, np.arange(len(shot_indices)) - starts[shot_indices]] = mechanisms
+        return FaultConfigurations(faults, weights)
+
+    @staticmethod
+    def concatenate(parts: list['FaultConfigurations']) -> 'FaultConfigurations':
+        width = max(part.faults.shape[1] for part in parts)
+        return FaultConfigurations(
+            np.concatenate([
+                np.pad(part.faults, ((0, 0), (0, width - part.faults.shape[1])), constant_values=-1)
+                for part in parts
+            ]),
+            np.concatenate([part.weights for part in parts]),
+        )
+
+    def copy(self) -> 'FaultConfigurations':
+        return FaultConfigurations(self.faults.copy(), self.weights.copy())
+
+
+class CompiledSplittingSampler(sinter.CompiledSampler):
+    def __init__(
+            self,
+            task: sinter.Task,
+            *,
+            gap_sampler: sinter.CompiledSampler,
+            levels: Iterable[int],
+            steps: int,
+            seed: int | None = None,
+    ):
+        self.gap_sampler = gap_sampler
+        self.levels = tuple(levels)
+        self.steps = steps
+        if list(self.levels) != sorted(set(self.levels)):
+            raise ValueError(f'{self.levels=} must be strictly increasing')
+        if steps < 1:
+            raise ValueError(f'{steps=} < 1')
+        self.rng = np.random.default_rng(seed)
+
+        probabilities, self.fault_dets, self.fault_obs = dem_fault_incidence(task.detector_error_model)
+        self.num_mechanisms = len(probabilities)
+        odds = probabilities / (1 - probabilities)
+        self.total_odds = float(np.sum(odds))
+        self.fault_choice_probabilities = odds / self.total_odds
+        values, inverse = np.unique(probabilities, return_inverse=True)
+        self.mechanisms_by_probability = [
+            (float(p), np.flatnonzero(inverse == k))
+            for k, p in enumerate(values.tolist())
+        ]
+
+    def sample_fault_configurations(self, shots: int) -> FaultConfigurations:
+        """Picks which error mechanisms fire in each of several shots."""
+        shot_indices = []
+        mechanisms = []
+        for p, group in self.mechanisms_by_probability:
+            # Each (shot, mechanism) pair of the group fires independently with
+            # probability p, so the firing pairs are a uniformly random subset.
+            population = shots * len(group)
+            hits = self.rng.choice(population, size=self.rng.binomial(population, p), replace=False)
+            shot_indices.append(hits // len(group))
+            mechanisms.append(group[hits % len(group)])
+        return FaultConfigurations.from_pairs(
+            shots,
+            np.concatenate(shot_indices).astype(np.int64),
+            np.concatenate(mechanisms).astype(np.int64),
+        )
+
+    def detection_events(self, configurations: FaultConfigurations) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the detection events and observable flips of fault configurations."""
+        import scipy.sparse
+
+        valid = configurations.faults >= 0
+        fired = scipy.sparse.csr_matrix(
+            (
+                np.ones(np.count_nonzero(valid), dtype=np.int32),
+                configurations.faults[valid],
+                np.concatenate([[0], np.cumsum(configurations.weights)]),
+            ),
+            shape=(len(configurations), self.num_mechanisms),
+        )
+        dets = (fired @ self.fault_dets).toarray() % 2 == 1
+        obs = (fired @ self.fault_obs).toarray() % 2 == 1
+        return dets, obs
+
+    def scores(self, dets: np.ndarray, obs: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Decodes shots, returning (kept, errors, gaps, scores) arrays with a value per shot."""
+        kept, errors, gaps = self.gap_sampler.decode_detection_events(dets, obs)
+        scores = np.where(errors, gaps, -gaps - 1)
+        scores[~kept] = DISCARDED_SCORE
+        return kept, errors, gaps, scores
+
+    def run_chains(
+            self,
+            seeds: FaultConfigurations,
+            *,
+            level: int,
+            next_level: int,
+            counts: collections.Counter,
+    ) -> FaultConfigurations:
+        """Runs Markov chains conditioned on reaching a level, from given starting configurations.
+
+        The chains are Metropolis-Hastings random walks whose stationary distribution
+        is the distribution of the fault configurations that reach the level. Each step
+        either adds a mechanism (picked proportionally to its odds) or removes a firing
+        mechanism (picked uniformly), and is rejected if the configuration would no
+        longer reach the level.
+
+        Args:
+            seeds: The starting configuration of each chain. Must reach the level.
+            level: The score the chains are conditioned on reaching.
+            next_level: The score whose hits are counted.
+            counts: The custom counts to add the chain's trials and hits to.
+
+        Returns:
+            The visited configurations that reached the next level.
+        """
+        state = seeds.copy()
+        n = len(state)
+        dets, obs = self.detection_events(state)
+        *_, scores = self.scores(dets, obs)
+        assert np.all(scores >= level)
+
+        prefix = f'{SPLITTING_KEY_PREFIX}{level}:{next_level}:'
+        hit = scores >= next_level
+        hits = []
+        chains = np.arange(n)
+        for _ in range(self.steps):
+            adding = self.rng.random(n) < 0.5
+            removed_slots = np.floor(self.rng.random(n) * state.weights).astype(np.int64)
+            added = self.rng.choice(self.num_mechanisms, size=n, p=self.fault_choice_probabilities)
+            mechanisms = np.where(adding, added, state.faults[chains, removed_slots])
+            # Adding mechanism j to configuration x, and removing it from x+j, are each
+            # others' reverse moves. Their probability ratio works out to a
+            # Metropolis-Hastings acceptance probability that only depends on the weight.
+            acceptance = np.where(
+                adding,
+                self.total_odds / (state.weights + 1),
+                state.weights / self.total_odds,
+            )
+            moving = self.rng.random(n) < acceptance
+            moving &= np.where(adding, ~np.any(state.faults == added[:, None], axis=1), state.weights > 0)
+
+            movers = np.flatnonzero(moving)
+            if len(movers):
+                toggled = self.fault_dets[mechanisms[movers]].toarray() % 2 == 1
+                flipped = self.fault_obs[mechanisms[movers]].toarray() % 2 == 1
+                *_, new_scores = self.scores(dets[movers] ^ toggled, obs[movers] ^ flipped)
+                accepted = new_scores >= level
+                movers = movers[accepted]
+                dets[movers] ^= toggled[accepted]
+                obs[movers] ^= flipped[accepted]
+                scores[movers] = new_scores[accepted]
+                self._toggle(state, movers, mechanisms[movers], adding[movers], removed_slots[movers])
+                counts[prefix + 'accepted'] += len(movers)
+
+            new_hit = scores >= next_level
+            counts[prefix + 'trials'] += n
+            counts[prefix + 'hits'] += np.count_nonzero(new_hit)
+            counts[prefix + 'hit_pairs'] += np.count_nonzero(new_hit & hit)
+            hit = new_hit
+            if np.any(hit):
+                hits.append(state[hit])
+
+        if not hits:
+            return FaultConfigurations(np.zeros(shape=(0, 1), dtype=np.int64), np.zeros(shape=0, dtype=np.int64))
+        return FaultConfigurations.concatenate(hits)
+
+    @staticmethod
+    def _toggle(
+            state: FaultConfigurations,
+            chains: np.ndarray,
+            mechanisms: np.ndarray,
+            adding: np.ndarray,
+            removed_slots: np.ndarray,
+    ) -> None:
+        add = chains[adding]
+        if len(add):
+            if np.max(state.weights[add]) >= state.faults.shape[1]:
+                state.faults = np.pad(state.faults, ((0, 0), (0, state.faults.shape[1])), constant_values=-1)
+            state.faults[add, state.weights[add]] = mechanisms[adding]
+            state.weights[add] += 1
+        remove = chains[~adding]
+        if len(remove):
+            slots = removed_slots[~adding]
+            last = state.weights[remove] - 1
+            state.faults[remove, slots] = state.faults[remove, last]
+            state.faults[remove, last] = -1
+            state.weights[remove] -= 1
+
+    def sample(self, shots: int) -> sinter.AnonTaskStats:
+        t0 = time.monotonic()
+        custom_counts = collections.Counter()
+
+        configurations = self.sample_fault_configurations(shots)
+        kept, errors, gaps, scores = self.scores(*self.detection_events(configurations))
+        for gap, err in zip(gaps[kept].tolist(), errors[kept].tolist()):
+            custom_counts[f'E{gap}' if err else f'C{gap}'] += 1
+
+        if self.levels:
+            reached = configurations[scores >= self.levels[0]]
+            num_chains = max(1, shots // self.steps)
+            for level, next_level in zip(self.levels, self.levels[1:]):
+                if not len(reached):
+                    break
+                seeds = reached[self.rng.integers(len(reached), size=num_chains)]
+                reached = self.run_chains(seeds, level=level, next_level=next_level, counts=custom_counts)
+
+        t1 = time.monotonic()
+        return sinter.AnonTaskStats(
+            shots=shots,
+            errors=int(np.count_nonzero(errors)),
+            discards=int(np.count_nonzero(~kept)),
+            seconds=t1 - t0,
+            custom_counts=custom_counts,
+        )
+
+
+def is_splitting_key(key: str) -> bool:
+    """Determines if a custom count key counts Markov chain steps of a `cultiv.SplittingSampler`."""
+    return key.startswith(SPLITTING_KEY_PREFIX)
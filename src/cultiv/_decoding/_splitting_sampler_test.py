@@ -0,0 +1,112 @@
+import collections
+import itertools
+
+import numpy as np
+import pytest
+import sinter
+import stim
+
+import cultiv
+from ._pymatching_gap_sampler import PymatchingGapSampler
+from ._splitting_sampler import CompiledSplittingSampler, FaultConfigurations
+
+
+class _CountingGapSampler:
+    """Keeps every shot, decodes it to no flip, and uses its number of detection events as its gap."""
+
+    def decode_detection_events(self, dets: np.ndarray, obs: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return np.ones(len(dets), dtype=np.bool_), obs[:, 0].copy(), np.count_nonzero(dets, axis=1)
+
+
+def _small_task() -> sinter.Task:
+    circuit = stim.Circuit("""
+        X_ERROR(0.1) 0
+        X_ERROR(0.2) 1
+        X_ERROR(0.3) 2
+        X_ERROR(0.05) 3
+        M 0 1 2 3
+        DETECTOR rec[-4]
+        DETECTOR rec[-3]
+        DETECTOR rec[-2]
+        OBSERVABLE_INCLUDE(0) rec[-1]
+    """)
+    return sinter.Task(circuit=circuit, detector_error_model=circuit.detector_error_model())
+
+
+def test_fault_configurations():
+    configurations = FaultConfigurations.from_pairs(4, np.array([2, 0, 2, 3]), np.array([5, 6, 7, 8]))
+    np.testing.assert_array_equal(configurations.weights, [1, 0, 2, 1])
+    np.testing.assert_array_equal(configurations.faults, [[6, -1], [-1, -1], [5, 7], [8, -1]])
+
+    combined = FaultConfigurations.concatenate([configurations[np.array([0, 1])], FaultConfigurations(np.array([[1, 2, 3]]), np.array([3]))])
+    np.testing.assert_array_equal(combined.weights, [1, 0, 3])
+    np.testing.assert_array_equal(combined.faults, [[6, -1, -1], [-1, -1, -1], [1, 2, 3]])
+
+    sampler = CompiledSplittingSampler(_small_task(), gap_sampler=_CountingGapSampler(), levels=[0], steps=1, seed=1234)
+    dets, obs = sampler.detection_events(FaultConfigurations(np.array([[0, 2], [3, -1]]), np.array([2, 1])))
+    np.testing.assert_array_equal(dets, [[1, 0, 1], [0, 0, 0]])
+    np.testing.assert_array_equal(obs, [[0], [1]])
+
+    sampled = sampler.sample_fault_configurations(100000)
+    frequencies = [np.count_nonzero(np.any(sampled.faults == k, axis=1)) / 100000 for k in range(4)]
+    np.testing.assert_allclose(frequencies, [0.1, 0.2, 0.3, 0.05], atol=0.01)
+
+
+def test_run_chains_preserves_conditional_distribution():
+    task = _small_task()
+    probabilities = [0.1, 0.2, 0.3, 0.05]
+    sampler = CompiledSplittingSampler(task, gap_sampler=_CountingGapSampler(), levels=[-3, -2], steps=20, seed=1234)
+
+    # Correct shots score minus their number of detection events minus one, so reaching
+    # -2 means at most one of the first three mechanisms fired (or the fourth fired).
+    def reaches(subset: tuple[int, ...]) -> bool:
+        return 3 in subset or len(set(subset) - {3}) <= 1
+
+    expected = {}
+    for weight in range(5):
+        for subset in itertools.combinations(range(4), weight):
+            if reaches(subset):
+                expected[subset] = np.prod([p if k in subset else 1 - p for k, p in enumerate(probabilities)])
+    total = sum(expected.values())
+
+    configurations = sampler.sample_fault_configurations(20000)
+    *_, scores = sampler.scores(*sampler.detection_events(configurations))
+    seeds = configurations[scores >= -2]
+    counts = collections.Counter()
+    visited = sampler.run_chains(seeds, level=-2, next_level=-2, counts=counts)
+    assert len(visited) == counts['S-2:-2:trials'] == counts['S-2:-2:hits'] == len(seeds) * 20
+    assert counts['S-2:-2:accepted'] > 0
+
+    frequencies = collections.Counter(
+        tuple(sorted(row[:weight].tolist()))
+        for row, weight in zip(visited.faults, visited.weights)
+    )
+    assert set(frequencies) <= set(expected)
+    for subset, p in expected.items():
+        assert abs(frequencies[subset] / len(visited) - p / total) < 0.01, subset
+
+
+def test_splitting_sampler_matches_direct_sampling():
+    circuit = stim.Circuit.generated(
+        'repetition_code:memory',
+        distance=5,
+        rounds=5,
+        before_round_data_depolarization=0.03,
+        before_measure_flip_probability=0.03,
+    )
+    task = sinter.Task(circuit=circuit, detector_error_model=circuit.detector_error_model())
+    direct = PymatchingGapSampler().compiled_sampler_for_task(task).sample(200000)
+
+    sampler = CompiledSplittingSampler(task, gap_sampler=PymatchingGapSampler().compiled_sampler_for_task(task), levels=[-20, -10, 0, 10], steps=10)
+    stats = sampler.sample(20000)
+    assert stats.shots == 20000
+    assert stats.errors == sum(v for k, v in stats.custom_counts.items() if k.startswith('E'))
+    assert stats.shots - stats.discards == sum(v for k, v in stats.custom_counts.items() if k[0] in 'CE')
+    assert stats.custom_counts['S0:10:trials'] == 20000
+
+    estimate = cultiv.estimate_splitting_stat(stats)
+    assert sorted(estimate.tail_probabilities) == [-20, -10, 0, 10]
+    assert 0.65 < estimate.tail_probabilities[0] / (direct.errors / direct.shots) < 1.35
+    rate, low, high = estimate.error_rate_when_kept(0)
+    assert low < rate < high
+    assert rate == pytest.approx(estimate.tail_probabilities[0] / (1 - stats.discards / stats.shots))
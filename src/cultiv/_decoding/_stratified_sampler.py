@@ -0,0 +1,186 @@
+import collections
+import time
+from typing import Iterable
+
+import numpy as np
+import sinter
+import stim
+
+STRATIFIED_SHOTS_KEY = 'shots'
+STRATIFIED_ERRORS_KEY = 'errors'
+STRATIFIED_DISCARDS_KEY = 'discards'
+
+
+class StratifiedSampler(sinter.Sampler):
+    """Samples shots with exactly k faults, for each of several fault counts k.
+
+    Instead of simulating the noisy circuit, picks which error mechanisms of the task's
+    detector error model fire, conditioned on exactly k of them firing, and gives the
+    resulting detection events to a gap sampler to postselect, decode and classify.
+
+    The stats of each fault count are stored in the custom counts, with keys prefixed by
+    'k{fault_count}:' (e.g. 'k3:shots', 'k3:errors', 'k3:discards', 'k3:C17'). The
+    stats conditioned on the fault count barely depend on the noise strength, so they
+    can be reweighted to estimate the stats at any (small enough) noise strength. See
+    `cultiv.reweight_stratified_stat`.
+    """
+
+    def __init__(self, gap_sampler: sinter.Sampler, *, fault_counts: Iterable[int] = range(9)):
+        """
+        Args:
+            gap_sampler: A sampler whose compiled samplers have a
+                `classify_detection_events` method, such as the desaturation and
+                pymatching-gap samplers.
+            fault_counts: The numbers of faults to sample. Each call to `sample`
+                splits its shots evenly between them.
+        """
+        self.gap_sampler = gap_sampler
+        self.fault_counts = tuple(fault_counts)
+
+    def compiled_sampler_for_task(self, task: sinter.Task) -> sinter.CompiledSampler:
+        return CompiledStratifiedSampler(
+            task,
+            gap_sampler=self.gap_sampler.compiled_sampler_for_task(task),
+            fault_counts=self.fault_counts,
+        )
+
+
+class CompiledStratifiedSampler(sinter.CompiledSampler):
+    def __init__(
+            self,
+            task: sinter.Task,
+            *,
+            gap_sampler: sinter.CompiledSampler,
+            fault_counts: Iterable[int],
+            seed: int | None = None,
+    ):
+        self.gap_sampler = gap_sampler
+        self.fault_counts = tuple(fault_counts)
+        if not self.fault_counts or min(self.fault_counts) < 0:
+            raise ValueError(f'{self.fault_counts=} must be non-empty and non-negative')
+        self.rng = np.random.default_rng(seed)
+
+        probabilities, self.fault_dets, self.fault_obs = dem_fault_incidence(task.detector_error_model)
+        odds = probabilities / (1 - probabilities)
+        num_possible = int(np.count_nonzero(odds))
+        if max(self.fault_counts) > num_possible:
+            raise ValueError(
+                f'{max(self.fault_counts)=} exceeds the {num_possible} error mechanisms '
+                f'with nonzero probability in the detector error model.'
+            )
+        weights = odds / np.sum(odds) if num_possible else odds
+
+        # suffix_sums[i, j] is the sum, over every set of j distinct mechanisms with
+        # indices at least i, of the product of the mechanisms' weights. So
+        # suffix_sums[i, j] = suffix_sums[i + 1, j] + weights[i] * suffix_sums[i + 1, j - 1].
+        suffix_sums = np.zeros(shape=(len(weights) + 1, max(self.fault_counts) + 1), dtype=np.float64)
+        suffix_sums[:, 0] = 1
+        for j in range(1, suffix_sums.shape[1]):
+            suffix_sums[:-1, j] = np.cumsum((weights * suffix_sums[1:, j - 1])[::-1])[::-1]
+        self._suffix_sums = suffix_sums
+
+    def sample_fault_sets(self, fault_count: int, shots: int) -> np.ndarray:
+        """Returns the error mechanisms that fire in each shot, given that exactly `fault_count` fire.
+
+        Each set of `fault_count` mechanisms is picked with probability proportional to
+        the product of the mechanisms' odds p/(1-p), which is the distribution of the
+        mechanisms that fire conditioned on how many fire.
+
+        Returns:
+            An int array of shape (shots, fault_count) listing distinct mechanisms, in
+            increasing order.
+        """
+        if not 0 <= fault_count < self._suffix_sums.shape[1]:
+            raise ValueError(f'{fault_count=} must be between 0 and {max(self.fault_counts)=}')
+        result = np.empty(shape=(shots, fault_count), dtype=np.int64)
+        start = np.zeros(shots, dtype=np.int64)
+        for t in range(fault_count):
+            # Picks the next mechanism m >= start, given that j mechanisms remain to be
+            # picked, with probability weights[m] * suffix_sums[m + 1, j - 1] / suffix_sums[start, j].
+            # That's the probability that suffix_sums[:, j] drops from above a uniform
+            # target to at most the target when going from index m to m + 1.
+            column = self._suffix_sums[:, fault_count - t]
+            targets = self.rng.random(shots) * column[start]
+            result[:, t] = np.searchsorted(-column, -targets, side='left') - 1
+            start = result[:, t] + 1
+        return result
+
+    def detection_events_for_fault_sets(self, fault_sets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the detection events and observable flips caused by sets of firing mechanisms.
+
+        Returns:
+            A (dets, obs) tuple of bool arrays with shapes (shots, num_detectors) and
+            (shots, num_observables).
+        """
+        import scipy.sparse
+
+        shots, fault_count = fault_sets.shape
+        fired = scipy.sparse.csr_matrix(
+            (
+                np.ones(shots * fault_count, dtype=np.int32),
+                fault_sets.reshape(-1),
+                np.arange(shots + 1) * fault_count,
+            ),
+            shape=(shots, self.fault_dets.shape[0]),
+        )
+        dets = (fired @ self.fault_dets).toarray() % 2 == 1
+        obs = (fired @ self.fault_obs).toarray() % 2 == 1
+        return dets, obs
+
+    def sample(self, shots: int) -> sinter.AnonTaskStats:
+        t0 = time.monotonic()
+        custom_counts = collections.Counter()
+        total = sinter.AnonTaskStats()
+        for index, fault_count in enumerate(self.fault_counts):
+            n = shots // len(self.fault_counts) + (index < shots % len(self.fault_counts))
+            if n == 0:
+                continue
+            fault_sets = self.sample_fault_sets(fault_count, n)
+            dets, obs = self.detection_events_for_fault_sets(fault_sets)
+            stats = self.gap_sampler.classify_detection_events(dets, obs)
+            prefix = f'k{fault_count}:'
+            custom_counts[prefix + STRATIFIED_SHOTS_KEY] += stats.shots
+            custom_counts[prefix + STRATIFIED_ERRORS_KEY] += stats.errors
+            custom_counts[prefix + STRATIFIED_DISCARDS_KEY] += stats.discards
+            for key, count in stats.custom_counts.items():
+                custom_counts[prefix + key] += count
+            total += sinter.AnonTaskStats(shots=stats.shots, errors=stats.errors, discards=stats.discards)
+        t1 = time.monotonic()
+        return total + sinter.AnonTaskStats(seconds=t1 - t0, custom_counts=custom_counts)
+
+
+def dem_fault_incidence(dem: stim.DetectorErrorModel) -> tuple[np.ndarray, 'scipy.sparse.csr_matrix', 'scipy.sparse.csr_matrix']:
+    """Returns the probabilities of a dem's error mechanisms, and what they flip.
+
+    Returns:
+        A (probabilities, dets, obs) tuple. `dets` and `obs` are sparse int matrices
+        with a row per error mechanism, and a column per detector or observable. An
+        entry is odd when the mechanism flips the detector or observable.
+    """
+    import scipy.sparse
+
+    probabilities = []
+    det_rows, det_cols = [], []
+    obs_rows, obs_cols = [], []
+    for inst in dem.flattened():
+        if inst.type != 'error':
+            continue
+        row = len(probabilities)
+        probabilities.append(inst.args_copy()[0])
+        for target in inst.targets_copy():
+            if target.is_relative_detector_id():
+                det_rows.append(row)
+                det_cols.append(target.val)
+            elif target.is_logical_observable_id():
+                obs_rows.append(row)
+                obs_cols.append(target.val)
+    n = len(probabilities)
+    dets = scipy.sparse.csr_matrix(
+        (np.ones(len(det_rows), dtype=np.int32), (det_rows, det_cols)),
+        shape=(n, dem.num_detectors),
+    )
+    obs = scipy.sparse.csr_matrix(
+        (np.ones(len(obs_rows), dtype=np.int32), (obs_rows, obs_cols)),
+        shape=(n, dem.num_observables),
+    )
+    return np.array(probabilities, dtype=np.float64), dets, obs
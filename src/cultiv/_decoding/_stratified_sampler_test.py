@@ -0,0 +1,124 @@
+import collections
+
+import numpy as np
+import pytest
+import sinter
+import stim
+
+import cultiv
+from ._pymatching_gap_sampler import PymatchingGapSampler
+from ._stratified_sampler import CompiledStratifiedSampler, StratifiedSampler, dem_fault_incidence
+
+
+def _repetition_code_task(p: float) -> sinter.Task:
+    circuit = stim.Circuit.generated(
+        'repetition_code:memory',
+        distance=5,
+        rounds=5,
+        before_round_data_depolarization=p,
+        before_measure_flip_probability=p,
+    )
+    return sinter.Task(circuit=circuit, detector_error_model=circuit.detector_error_model(), decoder='stratified-pymatching-gap')
+
+
+def test_dem_fault_incidence():
+    dem = stim.DetectorErrorModel("""
+        error(0.125) D0 D1
+        error(0.25) D1 ^ D1 D2 L0
+        detector D3
+    """)
+    probabilities, dets, obs = dem_fault_incidence(dem)
+    np.testing.assert_array_equal(probabilities, [0.125, 0.25])
+    np.testing.assert_array_equal(dets.toarray() % 2, [[1, 1, 0, 0], [0, 0, 1, 0]])
+    np.testing.assert_array_equal(obs.toarray() % 2, [[0], [1]])
+
+
+def test_sample_fault_sets_is_conditioned_on_fault_count():
+    circuit = stim.Circuit("""
+        X_ERROR(0.1) 0
+        X_ERROR(0.2) 1
+        X_ERROR(0.3) 2
+        M 0 1 2
+        DETECTOR rec[-3]
+        DETECTOR rec[-2]
+        DETECTOR rec[-1]
+    """)
+    task = sinter.Task(circuit=circuit, detector_error_model=circuit.detector_error_model())
+    sampler = CompiledStratifiedSampler(task, gap_sampler=None, fault_counts=[1, 2], seed=1234)
+    odds = np.array([0.1 / 0.9, 0.2 / 0.8, 0.3 / 0.7])
+
+    fault_sets = sampler.sample_fault_sets(1, 100000)
+    frequencies = np.bincount(fault_sets[:, 0], minlength=3) / 100000
+    np.testing.assert_allclose(frequencies, odds / np.sum(odds), atol=0.01)
+
+    fault_sets = sampler.sample_fault_sets(2, 100000)
+    assert np.all(fault_sets[:, 0] != fault_sets[:, 1])
+    pairs = collections.Counter(map(tuple, np.sort(fault_sets, axis=1).tolist()))
+    pair_odds = {(0, 1): odds[0] * odds[1], (0, 2): odds[0] * odds[2], (1, 2): odds[1] * odds[2]}
+    total = sum(pair_odds.values())
+    for pair, o in pair_odds.items():
+        assert abs(pairs[pair] / 100000 - o / total) < 0.01
+
+    dets, obs = sampler.detection_events_for_fault_sets(np.array([[0, 2], [1, 2]]))
+    np.testing.assert_array_equal(dets, [[1, 0, 1], [0, 1, 1]])
+    assert obs.shape == (2, 0)
+
+    assert sampler.sample_fault_sets(0, 5).shape == (5, 0)
+
+
+def _independent_errors_task(probabilities: list[float]) -> sinter.Task:
+    circuit = stim.Circuit()
+    for q, p in enumerate(probabilities):
+        circuit.append('X_ERROR', [q], p)
+    circuit.append('M', range(len(probabilities)))
+    for q in range(len(probabilities)):
+        circuit.append('DETECTOR', [stim.target_rec(q - len(probabilities))])
+    return sinter.Task(circuit=circuit, detector_error_model=circuit.detector_error_model())
+
+
+def test_sample_fault_sets_with_too_few_mechanisms():
+    task = _independent_errors_task([0.1, 0.2, 0])
+    with pytest.raises(ValueError, match='exceeds'):
+        CompiledStratifiedSampler(task, gap_sampler=None, fault_counts=[1, 3])
+    sampler = CompiledStratifiedSampler(task, gap_sampler=None, fault_counts=[2], seed=1234)
+    np.testing.assert_array_equal(sampler.sample_fault_sets(2, 10), [[0, 1]] * 10)
+
+
+def test_sample_fault_sets_with_dominant_mechanisms():
+    # A few likely mechanisms among many unlikely ones, where picking with replacement
+    # would almost always repeat a likely mechanism.
+    task = _independent_errors_task([0.4, 0.4] + [1e-6] * 10000)
+    sampler = CompiledStratifiedSampler(task, gap_sampler=None, fault_counts=[3], seed=1234)
+    fault_sets = sampler.sample_fault_sets(3, 100000)
+    assert np.all(fault_sets[:, :-1] < fault_sets[:, 1:])
+    # Sets with both likely mechanisms have total odds (2/3)**2 * 10000 * 1e-6, and sets
+    # with one of them have total odds 2 * (2/3) * C(10000, 2) * 1e-12.
+    both = (2 / 3)**2 * 10000 * 1e-6
+    one = 2 * (2 / 3) * 10000 * 9999 / 2 * 1e-12
+    has_both = np.all(fault_sets[:, :2] == [0, 1], axis=1)
+    assert abs(np.mean(has_both) - both / (both + one)) < 0.002
+    assert len(set(fault_sets[has_both, 2].tolist())) > 9000
+
+
+def test_stratified_sampler_matches_direct_sampling():
+    task = _repetition_code_task(0.03)
+    direct = PymatchingGapSampler().compiled_sampler_for_task(task).sample(100000)
+
+    sampler = StratifiedSampler(PymatchingGapSampler(), fault_counts=range(10))
+    stats = sampler.compiled_sampler_for_task(task).sample(100000)
+    counts = cultiv.stratified_counts(stats)
+    assert sorted(counts) == list(range(10))
+    assert all(c['shots'] == 10000 for c in counts.values())
+    assert counts[0]['errors'] == counts[1]['errors'] == counts[2]['errors'] == 0
+    assert sum(v for k, v in counts[5].items() if k[0] in 'CE') == 10000 - counts[5]['discards']
+
+    estimate = cultiv.reweight_stratified_stat(stats, dem=task.detector_error_model)
+    assert estimate.unsampled_probability < 1e-5
+    assert 0.7 < estimate.error_probability / (direct.errors / direct.shots) < 1.3
+    assert abs(sum(estimate.gap_error_probabilities.values()) - estimate.error_probability) < 1e-12
+
+    # Reweighting to half the noise strength matches sampling at half the noise strength.
+    half_task = _repetition_code_task(0.015)
+    direct = PymatchingGapSampler().compiled_sampler_for_task(half_task).sample(300000)
+    estimate = cultiv.reweight_stratified_stat(stats, dem=task.detector_error_model, noise_scale=0.5)
+    assert 0.7 < estimate.error_probability / (direct.errors / direct.shots) < 1.3
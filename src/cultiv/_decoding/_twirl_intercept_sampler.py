@@ -4,6 +4,8 @@ import numpy as np
 import sinter
 import stim
 
+from cultiv._decoding._phase_timer import PhaseTimer
+
 
 class TwirlInterceptSampler(sinter.Sampler):
     """Samples while overriding S rotations with powers of T.
@@ -15,17 +17,19 @@ class TwirlInterceptSampler(sinter.Sampler):
     errors, as suggested in https://arxiv.org/abs/2003.03049 . THIS
     SEEMS TO WORK VERY POORLY BE VERY CAREFUL USING THIS SAMPLER.
     """
-    def __init__(self, turns: float):
+    def __init__(self, turns: float, phase_timing: bool = False):
         self.turns = turns
+        self.phase_timing = phase_timing
 
     def compiled_sampler_for_task(self, task: sinter.Task) -> sinter.CompiledSampler:
-        return CompiledTwirlInterceptSampler(task, self.turns)
+        return CompiledTwirlInterceptSampler(task, self.turns, phase_timing=self.phase_timing)
 
 
 class CompiledTwirlInterceptSampler(sinter.CompiledSampler):
-    def __init__(self, task: sinter.Task, turns: float):
+    def __init__(self, task: sinter.Task, turns: float, *, phase_timing: bool = False):
         assert turns % 0.25 == 0 and 0 <= turns < 2
         self.task = task
+        self.phase_timing = phase_timing
         self.turns = turns
         self.num_qubits = task.circuit.num_qubits
         self.instructions = self.task.circuit.flattened()
@@ -63,7 +67,7 @@ class CompiledTwirlInterceptSampler(sinter.CompiledSampler):
         else:
             raise NotImplementedError(f'{self.turns=}')
 
-    def _sample_once(self, shots: int) -> sinter.AnonTaskStats:
+    def _sample_once(self, shots: int, timer: PhaseTimer) -> sinter.AnonTaskStats:
         shots = min(shots, 256)
         if self.simulator is None or shots != self.simulator.batch_size:
             self.simulator = stim.FlipSimulator(
@@ -99,21 +103,25 @@ class CompiledTwirlInterceptSampler(sinter.CompiledSampler):
             else:
                 self.simulator.do(inst)
 
+        timer.lap('simulate')
         discard_mask = np.any(self.simulator.get_detector_flips(bit_packed=False), axis=0)
-        error_mask = np.any(self.simulator.get_observable_flips(bit_packed=False), axis=0)
         discards = np.count_nonzero(discard_mask)
+        timer.lap('postselect')
+        error_mask = np.any(self.simulator.get_observable_flips(bit_packed=False), axis=0)
         errors = np.count_nonzero(error_mask & ~discard_mask)
+        timer.lap('classify')
         return sinter.AnonTaskStats(shots=shots, errors=errors, discards=discards)
 
     def sample(self, shots: int) -> sinter.AnonTaskStats:
         t0 = time.monotonic()
+        timer = PhaseTimer(enabled=self.phase_timing)
 
         total = sinter.AnonTaskStats()
         shots_left = shots
         while shots_left > 0:
-            sample = self._sample_once(shots_left)
+            sample = self._sample_once(shots_left, timer)
             shots_left -= sample.shots
             total += sample
         t1 = time.monotonic()
-        total += sinter.AnonTaskStats(seconds=t1 - t0 - total.seconds)
+        total += sinter.AnonTaskStats(seconds=t1 - t0 - total.seconds, custom_counts=timer.counts)
         return total
@@ -5,6 +5,7 @@ import sinter
 import stim
 
 import gen
+from cultiv._decoding._phase_timer import PhaseTimer
 from latte.vec_sim import VecSim
 
 
@@ -18,21 +19,37 @@ class VecInterceptSampler(sinter.Sampler):
     stabilizer gates.
     """
 
-    def __init__(self, turns: float, sweep_bit_randomization: bool):
+    def __init__(self, turns: float, sweep_bit_randomization: bool, phase_timing: bool = False):
         self.turns = turns
         self.sweep_bit_randomization = sweep_bit_randomization
+        self.phase_timing = phase_timing
 
     def compiled_sampler_for_task(self, task: sinter.Task) -> sinter.CompiledSampler:
-        return CompiledVecInterceptSampler(task, self.turns, self.sweep_bit_randomization)
+        return CompiledVecInterceptSampler(
+            task,
+            self.turns,
+            self.sweep_bit_randomization,
+            phase_timing=self.phase_timing,
+        )
 
 
 class CompiledVecInterceptSampler(sinter.CompiledSampler):
-    def __init__(self, task: sinter.Task, turns: float, sweep_bit_randomization: bool):
+    def __init__(
+            self,
+            task: sinter.Task,
+            turns: float,
+            sweep_bit_randomization: bool,
+            *,
+            phase_timing: bool = False,
+    ):
         self.task = task
         self.turns = turns
         self.sweep_bit_randomization = sweep_bit_randomization
+        self.phase_timing = phase_timing
 
     def sample(self, shots: int) -> sinter.AnonTaskStats:
+        # Shots are discarded as soon as a detector fires, so postselection is part of simulating.
+        timer = PhaseTimer(enabled=self.phase_timing)
         result = sinter.AnonTaskStats()
         for _ in range(shots):
             result += sample_circuit_with_vec_sim(
@@ -40,7 +57,8 @@ class CompiledVecInterceptSampler(sinter.CompiledSampler):
                 self.turns,
                 self.sweep_bit_randomization,
             )
-        return result
+            timer.lap('simulate')
+        return result + sinter.AnonTaskStats(custom_counts=timer.counts)
 
 
 def sample_circuit_with_vec_sim(circuit: stim.Circuit, turns: float, sweep_bit_randomization: bool) -> sinter.AnonTaskStats:
@@ -1,6 +1,8 @@
 import dataclasses
 import pathlib
+from typing import Callable, Iterable
 
+import numpy as np
 import stim
 
 import gen
@@ -55,7 +57,7 @@ class ErrorEnumerationReport:
             noise = gen.NoiseModel.uniform_depolarizing(noise)
         if noise is not None:
             circuit = noise.noisy_circuit_skipping_mpp_boundaries(circuit)
-        dem = circuit.detector_error_model()
+        dem = gen.cached_detector_error_model(circuit)
         if dem.num_errors == 0:
             raise ValueError("dem.num_errors == 0")
         if dem.num_observables == 0:
@@ -109,3 +111,118 @@ class ErrorEnumerationReport:
             error_set=err_set,
             logical_errs=logical_errs,
         )
+
+
+@dataclasses.dataclass(frozen=True)
+class ErrorEnumerationSweep:
+    """Error enumeration statistics of one circuit evaluated at many noise strengths.
+
+    The enumerated logical errors only depend on the (det, obs) symptoms of the error
+    mechanisms, not their probabilities, so they are found (or looked up in the cache)
+    once. Their probabilities are then evaluated for every noise strength at once.
+    """
+    noise_strengths: np.ndarray
+    heralded_error_rates: np.ndarray
+    keep_rates: np.ndarray
+    distance_to_heralded_error_rates: dict[int, np.ndarray]
+    error_set: DemErrorSet
+    error_probs: np.ndarray
+    logical_errors: list[tuple[int, ...]]
+
+    @property
+    def discard_rates(self) -> np.ndarray:
+        return 1 - self.keep_rates
+
+    @staticmethod
+    def from_circuit(
+            circuit: stim.Circuit,
+            *,
+            noise_strengths: Iterable[float],
+            max_weight: int,
+            cache: dict[str, list[tuple[int, ...]]],
+            noise_model_func: Callable[[float], gen.NoiseModel] = gen.NoiseModel.uniform_depolarizing,
+    ) -> 'ErrorEnumerationSweep':
+        noise_strengths = np.array(list(noise_strengths), dtype=np.float64)
+        if len(noise_strengths) == 0:
+            raise ValueError("len(noise_strengths) == 0")
+
+        error_sets = []
+        for p in noise_strengths:
+            noisy_circuit = noise_model_func(float(p)).noisy_circuit_skipping_mpp_boundaries(circuit)
+            dem = gen.cached_detector_error_model(noisy_circuit)
+            if dem.num_errors == 0:
+                raise ValueError("dem.num_errors == 0")
+            if dem.num_observables == 0:
+                raise ValueError("dem.num_observables == 0")
+            error_sets.append(DemErrorSet.from_dem(dem))
+
+        err_set = error_sets[0]
+        symptoms = [(e.det, e.obs) for e in err_set.errors]
+        for other in error_sets[1:]:
+            if [(e.det, e.obs) for e in other.errors] != symptoms:
+                raise ValueError("The error mechanisms of the circuit depend on the noise strength.")
+
+        return ErrorEnumerationSweep.from_error_probs(
+            err_set,
+            error_probs=np.array([e.probs for e in error_sets]),
+            noise_strengths=noise_strengths,
+            max_weight=max_weight,
+            cache=cache,
+        )
+
+    @staticmethod
+    def from_error_probs(
+            err_set: DemErrorSet,
+            *,
+            error_probs: np.ndarray,
+            noise_strengths: np.ndarray,
+            max_weight: int,
+            cache: dict[str, list[tuple[int, ...]]],
+    ) -> 'ErrorEnumerationSweep':
+        """Evaluates the enumerated logical errors of an error set under many probability assignments.
+
+        Args:
+            err_set: The error set to enumerate logical errors of.
+            error_probs: A float array with shape (len(noise_strengths), len(err_set.errors)).
+                Row k gives the probability of each error mechanism at noise_strengths[k].
+            noise_strengths: The noise strengths labelling the rows of error_probs.
+            max_weight: The maximum number of error mechanisms in an enumerated logical error.
+            cache: Maps error set strong ids to previously enumerated logical errors.
+        """
+        num_ps, num_errors = error_probs.shape
+        if num_errors != len(err_set.errors) or num_ps != len(noise_strengths):
+            raise ValueError(f"Bad {error_probs.shape=}")
+
+        key = err_set.strong_id(max_weight=max_weight)
+        if key not in cache:
+            print("    cache miss", key)
+            cache[key] = err_set.find_logical_errors(max_distance=max_weight)
+        logical_errors = cache[key]
+
+        # Each error is used with odds p/(1-p) on top of the no-error chance. The extra
+        # zero-odds column is padding for logical errors with fewer than max_weight terms.
+        with np.errstate(divide='ignore'):
+            log_no_err = np.log1p(-error_probs)
+            log_odds = np.log(error_probs) - log_no_err
+        log_odds = np.concatenate([log_odds, np.zeros(shape=(num_ps, 1))], axis=1)
+        log_keep_rates = np.sum(log_no_err, axis=1)
+        indices = np.full(shape=(len(logical_errors), max_weight), fill_value=num_errors, dtype=np.int64)
+        weights = np.zeros(shape=len(logical_errors), dtype=np.int64)
+        for k, logical_error in enumerate(logical_errors):
+            indices[k, :len(logical_error)] = logical_error
+            weights[k] = len(logical_error)
+        logical_probs = np.exp(log_keep_rates[:, None] + np.sum(log_odds[:, indices], axis=2))
+
+        keep_rates = np.exp(log_keep_rates)
+        return ErrorEnumerationSweep(
+            noise_strengths=noise_strengths,
+            heralded_error_rates=np.sum(logical_probs, axis=1) / keep_rates,
+            keep_rates=keep_rates,
+            distance_to_heralded_error_rates={
+                d: np.sum(logical_probs[:, weights == d], axis=1) / keep_rates
+                for d in range(max_weight + 1)
+            },
+            error_set=err_set,
+            error_probs=error_probs,
+            logical_errors=logical_errors,
+        )
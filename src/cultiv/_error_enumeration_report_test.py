@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+import stim
+
+from ._error_enumeration_report import ErrorEnumerationReport, ErrorEnumerationSweep
+
+
+def test_sweep_matches_individual_reports():
+    circuit = stim.Circuit.generated('repetition_code:memory', distance=3, rounds=2)
+    ps = [1e-3, 2e-3, 5e-3]
+    cache = {}
+    sweep = ErrorEnumerationSweep.from_circuit(circuit, noise_strengths=ps, max_weight=3, cache=cache)
+    assert len(cache) == 1
+    assert len(sweep.logical_errors) > 0
+    assert np.array_equal(sweep.noise_strengths, ps)
+
+    for k, p in enumerate(ps):
+        report = ErrorEnumerationReport.from_circuit(circuit, noise=p, max_weight=3, cache=cache)
+        assert len(cache) == 1
+        assert sweep.keep_rates[k] == pytest.approx(report.keep_rate, rel=1e-9)
+        assert sweep.discard_rates[k] == pytest.approx(report.discard_rate, rel=1e-9)
+        assert sweep.heralded_error_rates[k] == pytest.approx(report.heralded_error_rate, rel=1e-9)
+        for d in range(4):
+            assert sweep.distance_to_heralded_error_rates[d][k] == pytest.approx(
+                report.distance_to_heralded_error_rate[d], rel=1e-9)
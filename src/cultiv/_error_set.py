@@ -297,40 +297,70 @@ def chance_of_exactly_1(ps: list[float]) -> float:
     return total
 
 
-def analyze_solerr_discard_vs_error_rate(error_set: DemErrorSet, logical_errors: list['DemCombinedError']):
-    e2f = {}
-    for k_cond in range(len(error_set.errors)):
-        p = 0
-        for logical_err in logical_errors:
-            p += math.prod(error_set.probs[k] for k in logical_err.src_errors if k_cond != k)
-        e2f[k_cond] = p
-
-    xs = []
-    ys = []
-    allowed_singleton_errors = set()
-    selected_errors = set(range(len(error_set.errors)))
-    for k, v in sorted(e2f.items(), key=lambda e: (e[1], e[0])):
-        allowed_singleton_errors.add(k)
-        selected_errors.remove(k)
-        p0a = chance_of_exactly_0([error_set.probs[k] for k in selected_errors])
-        p0b = chance_of_exactly_0([error_set.probs[k] for k in allowed_singleton_errors])
-        p1b = chance_of_exactly_1([error_set.probs[k] for k in allowed_singleton_errors])
-        keep_rate = p0a * (p0b + p1b)
-
-        fail_sets = set()
-        for logical_err in logical_errors:
-            for k_cond in logical_err.src_errors:
-                if k_cond in allowed_singleton_errors:
-                    fail_sets.add(frozenset(e for e in logical_err.src_errors if e != k_cond))
-                else:
-                    fail_sets.add(frozenset(logical_err.src_errors))
-        fail_rate = 0
-        for fail_set in fail_sets:
-            fail_rate += math.prod(error_set.probs[e] for e in fail_set)
-
-        xs.append(1 - keep_rate)
-        ys.append(fail_rate)
-    return xs, ys
+def analyze_solerr_discard_vs_error_rate(
+        error_set: DemErrorSet,
+        logical_errors: list['DemCombinedError'],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Tracks discard rate vs logical error rate as errors are allowed to occur once.
+
+    Errors are moved, one at a time, from the set of errors that cause a discard into the
+    set of errors that are allowed to occur as a singleton. They are moved in order of how
+    much logical error they enable. A logical error contributes its own probability while
+    any of its errors still causes a discard, and the probability of the rest of its errors
+    for each of its errors that has been allowed.
+
+    Returns:
+        A (discard_rates, logical_error_rates) tuple with one entry per moved error.
+    """
+    probs = np.asarray(error_set.probs, dtype=np.float64)
+    num_errors = len(probs)
+    max_weight = max((len(err.src_errors) for err in logical_errors), default=0)
+
+    # Padding entries point at an extra error with probability 1 (and rank -1, meaning allowed).
+    src = np.full(shape=(len(logical_errors), max_weight), fill_value=num_errors, dtype=np.int64)
+    for k, logical_err in enumerate(logical_errors):
+        src[k, :len(logical_err.src_errors)] = logical_err.src_errors
+    is_real = src < num_errors
+    terms = np.append(probs, 1)[src]
+    full_probs = np.prod(terms, axis=1)
+    ones = np.ones(shape=(len(logical_errors), 1))
+    prefix = np.cumprod(np.concatenate([ones, terms[:, :-1]], axis=1), axis=1)
+    suffix = np.cumprod(np.concatenate([ones, terms[:, :0:-1]], axis=1), axis=1)[:, ::-1]
+    leave_one_out_probs = (prefix * suffix)[:, :max_weight]
+    pair_errors = src[is_real]
+    pair_leave_one_out_probs = leave_one_out_probs[is_real]
+    pair_full_probs = np.broadcast_to(full_probs[:, None], src.shape)[is_real]
+
+    e2f = np.sum(full_probs) + np.bincount(
+        pair_errors,
+        weights=pair_leave_one_out_probs - pair_full_probs,
+        minlength=num_errors,
+    )
+    order = np.lexsort((np.arange(num_errors), e2f))
+    rank = np.empty(shape=num_errors, dtype=np.int64)
+    rank[order] = np.arange(num_errors)
+
+    # Chance of no selected errors times chance of at most one allowed error, after each step.
+    q = probs[order]
+    is_one = q == 1
+    num_ones = np.cumsum(is_one)
+    allowed_prod = np.cumprod(np.where(is_one, 1, 1 - q))
+    odds = np.divide(q, 1 - q, out=np.zeros_like(q), where=~is_one)
+    p0b = np.where(num_ones > 0, 0, allowed_prod)
+    p1b = np.where(num_ones >= 2, 0, np.where(num_ones == 1, allowed_prod, allowed_prod * np.cumsum(odds)))
+    p0a = np.append(np.cumprod((1 - q)[::-1])[::-1][1:], 1)
+    keep_rates = p0a * (p0b + p1b)
+
+    # Logical errors with a still-selected error fail with their full probability.
+    last_rank = np.max(np.append(rank, -1)[src], axis=1, initial=-1)
+    nonempty = last_rank >= 0
+    step_full = np.bincount(last_rank[nonempty], weights=full_probs[nonempty], minlength=num_errors)
+    still_selected = np.append(np.cumsum(step_full[::-1])[::-1][1:], 0)
+    # Each allowed error of a logical error lets the rest of the logical error fail it.
+    step_partial = np.bincount(rank[pair_errors], weights=pair_leave_one_out_probs, minlength=num_errors)
+    fail_rates = still_selected + np.cumsum(step_partial)
+
+    return 1 - keep_rates, fail_rates
 
 
 @dataclasses.dataclass(frozen=True)
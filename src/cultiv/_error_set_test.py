@@ -1,8 +1,12 @@
+import math
+
 import numpy as np
+import pytest
 import stim
 
 from ._error_set import DemError, \
-    int_to_flipped_bits, iter_pair_chunks, iter_triplet_chunks, DemErrorSet, chance_of_exactly_1, chance_of_exactly_0
+    int_to_flipped_bits, iter_pair_chunks, iter_triplet_chunks, DemErrorSet, chance_of_exactly_1, chance_of_exactly_0, \
+    analyze_solerr_discard_vs_error_rate
 
 
 def test_int_to_flipped_bits():
@@ -257,3 +261,61 @@ def test_chance_of_exactly_1():
     assert chance_of_exactly_1([0.5, 0.5, 0.5, 0.5]) == 4 / 16
     assert chance_of_exactly_1([0.5, 0.5, 0.5, 0.5, 0.5]) == 5 / 32
     assert chance_of_exactly_1([0.25, 0.5, 0.5, 0.5, 0.5]) == 13 / 64
+
+
+def _reference_analyze_solerr_discard_vs_error_rate(error_set, logical_errors):
+    e2f = {}
+    for k_cond in range(len(error_set.errors)):
+        p = 0
+        for logical_err in logical_errors:
+            p += math.prod(error_set.probs[k] for k in logical_err.src_errors if k_cond != k)
+        e2f[k_cond] = p
+
+    xs = []
+    ys = []
+    allowed_singleton_errors = set()
+    selected_errors = set(range(len(error_set.errors)))
+    for k, v in sorted(e2f.items(), key=lambda e: (e[1], e[0])):
+        allowed_singleton_errors.add(k)
+        selected_errors.remove(k)
+        p0a = chance_of_exactly_0([error_set.probs[k] for k in selected_errors])
+        p0b = chance_of_exactly_0([error_set.probs[k] for k in allowed_singleton_errors])
+        p1b = chance_of_exactly_1([error_set.probs[k] for k in allowed_singleton_errors])
+        fail_sets = set()
+        for logical_err in logical_errors:
+            for k_cond in logical_err.src_errors:
+                if k_cond in allowed_singleton_errors:
+                    fail_sets.add(frozenset(e for e in logical_err.src_errors if e != k_cond))
+                else:
+                    fail_sets.add(frozenset(logical_err.src_errors))
+        xs.append(1 - p0a * (p0b + p1b))
+        ys.append(sum(math.prod(error_set.probs[e] for e in fail_set) for fail_set in fail_sets))
+    return xs, ys
+
+
+def test_analyze_solerr_discard_vs_error_rate():
+    dem = stim.DetectorErrorModel("""
+        error(0.011) L0 D0
+        error(0.037) D0 D1
+        error(0.023) D0 D11
+        error(0.013) D1 D2
+        error(0.029) D11 D12
+        error(0.017) D2 D3
+        error(0.031) D12 D3
+        error(0.019) D3
+        error(0.041) D3 D4
+        error(0.043) D4 L0
+    """)
+    error_set = DemErrorSet.from_dem(dem)
+    logical_errors = error_set.expand_logical_errors(error_set.find_logical_errors(max_distance=6))
+    assert len(logical_errors) > 2
+
+    xs, ys = analyze_solerr_discard_vs_error_rate(error_set, logical_errors)
+    expected_xs, expected_ys = _reference_analyze_solerr_discard_vs_error_rate(error_set, logical_errors)
+    assert len(xs) == len(ys) == len(error_set.errors)
+    np.testing.assert_allclose(xs, expected_xs, rtol=1e-9)
+    np.testing.assert_allclose(ys, expected_ys, rtol=1e-9)
+
+    xs, ys = analyze_solerr_discard_vs_error_rate(error_set, [])
+    assert np.all(ys == 0)
+    assert xs[-1] == pytest.approx(1 - chance_of_exactly_0(error_set.probs) - chance_of_exactly_1(error_set.probs))
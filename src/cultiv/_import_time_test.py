@@ -0,0 +1,33 @@
+import pytest
+
+from gen._import_time_util import IMPORT_TIME_ENV_VAR, import_seconds_and_modules, import_time_checks_enabled
+
+# Generous compared to the ~0.2 seconds it takes, to avoid flakiness on slow machines,
+# but much less than the ~0.9 seconds it took when everything was imported eagerly.
+IMPORT_SECONDS_BUDGET = 0.5
+
+# Modules that `import cultiv` shouldn't import, because they're slow to import and only
+# needed when sampling or analyzing stats.
+LAZY_MODULES = ['sinter', 'pymatching', 'chromobius', 'matplotlib', 'latte', 'cultiv._decoding._mux_sampler']
+
+
+def test_import_cultiv_is_lazy():
+    _, modules = import_seconds_and_modules('cultiv')
+    for lazy in LAZY_MODULES:
+        assert lazy not in modules, f'`import cultiv` imported {lazy}'
+
+
+@pytest.mark.skipif(not import_time_checks_enabled(), reason=f'set {IMPORT_TIME_ENV_VAR}=1 to check')
+def test_import_cultiv_is_fast():
+    seconds, _ = import_seconds_and_modules('cultiv', repetitions=3)
+    assert seconds < IMPORT_SECONDS_BUDGET, f'`import cultiv` took {seconds:.3f}s'
+
+
+def test_lazy_attributes():
+    import cultiv
+
+    assert callable(cultiv.sinter_samplers)
+    assert cultiv.GapHistogram.__name__ == 'GapHistogram'
+    assert 'DesaturationSampler' in dir(cultiv)
+    with pytest.raises(AttributeError, match='not_an_attribute'):
+        _ = cultiv.not_an_attribute
@@ -0,0 +1,205 @@
+import collections
+import dataclasses
+import hashlib
+import io
+import json
+import os
+import pathlib
+from typing import Callable, Any
+
+import numpy as np
+import sinter
+
+STATS_CACHE_VERSION = 1
+_TAIL_CHECK_BYTES = 4096
+
+
+@dataclasses.dataclass
+class CachedStats:
+    """The merged stats from a sinter CSV file, and the preprocessed version of each one.
+
+    The preprocess function is applied to merged stats one at a time, so it must act on
+    each stat independently (like `split_by_gap_threshold` does).
+    """
+    stats: dict[str, sinter.TaskStats]
+    preprocessed: dict[str, list[sinter.TaskStats]]
+
+    def preprocessed_stats(
+            self,
+            filter_func: Callable[[sinter.TaskStats], Any] = lambda _: True,
+    ) -> list[sinter.TaskStats]:
+        """Returns the preprocessed stats of the merged stats that pass the filter."""
+        return [
+            out_stat
+            for strong_id, stat in self.stats.items()
+            if filter_func(stat)
+            for out_stat in self.preprocessed[strong_id]
+        ]
+
+
+def _stats_to_columns(stats: list[sinter.TaskStats], prefix: str) -> dict[str, np.ndarray]:
+    return {
+        f'{prefix}strong_id': np.array([s.strong_id for s in stats], dtype=np.str_),
+        f'{prefix}decoder': np.array([s.decoder for s in stats], dtype=np.str_),
+        f'{prefix}json_metadata': np.array([json.dumps(s.json_metadata) for s in stats], dtype=np.str_),
+        f'{prefix}custom_counts': np.array([json.dumps(dict(s.custom_counts)) for s in stats], dtype=np.str_),
+        f'{prefix}shots': np.array([s.shots for s in stats], dtype=np.int64),
+        f'{prefix}errors': np.array([s.errors for s in stats], dtype=np.int64),
+        f'{prefix}discards': np.array([s.discards for s in stats], dtype=np.int64),
+        f'{prefix}seconds': np.array([s.seconds for s in stats], dtype=np.float64),
+    }
+
+
+def _columns_to_stats(columns: Any, prefix: str) -> list[sinter.TaskStats]:
+    return [
+        sinter.TaskStats(
+            strong_id=str(strong_id),
+            decoder=str(decoder),
+            json_metadata=json.loads(json_metadata),
+            custom_counts=collections.Counter(json.loads(custom_counts)),
+            shots=shots,
+            errors=errors,
+            discards=discards,
+            seconds=seconds,
+        )
+        for strong_id, decoder, json_metadata, custom_counts, shots, errors, discards, seconds in zip(
+            columns[f'{prefix}strong_id'].tolist(),
+            columns[f'{prefix}decoder'].tolist(),
+            columns[f'{prefix}json_metadata'].tolist(),
+            columns[f'{prefix}custom_counts'].tolist(),
+            columns[f'{prefix}shots'].tolist(),
+            columns[f'{prefix}errors'].tolist(),
+            columns[f'{prefix}discards'].tolist(),
+            columns[f'{prefix}seconds'].tolist(),
+        )
+    ]
+
+
+def _tail_hash(path: pathlib.Path, offset: int) -> str:
+    with open(path, 'rb') as f:
+        start = max(0, offset - _TAIL_CHECK_BYTES)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+def _load_cache(cache_path: pathlib.Path, key: dict[str, Any]) -> tuple[dict[str, Any], CachedStats] | None:
+    try:
+        with np.load(cache_path) as columns:
+            header = json.loads(str(columns['header']))
+            if {k: header.get(k) for k in key} != key:
+                return None
+            stats = _columns_to_stats(columns, 'raw_')
+            out_stats = _columns_to_stats(columns, 'pre_')
+            sources = columns['pre_source'].tolist()
+    except (OSError, KeyError, ValueError):
+        return None
+    preprocessed = {stat.strong_id: [] for stat in stats}
+    for source, out_stat in zip(sources, out_stats):
+        preprocessed[stats[source].strong_id].append(out_stat)
+    return header, CachedStats(stats={stat.strong_id: stat for stat in stats}, preprocessed=preprocessed)
+
+
+def _save_cache(cache_path: pathlib.Path, header: dict[str, Any], cached: CachedStats) -> None:
+    stats = list(cached.stats.values())
+    out_stats = []
+    sources = []
+    for k, stat in enumerate(stats):
+        for out_stat in cached.preprocessed[stat.strong_id]:
+            out_stats.append(out_stat)
+            sources.append(k)
+    cache_path.parent.mkdir(exist_ok=True, parents=True)
+    tmp_path = cache_path.with_name(f'{cache_path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            header=np.array(json.dumps(header), dtype=np.str_),
+            pre_source=np.array(sources, dtype=np.int64),
+            **_stats_to_columns(stats, 'raw_'),
+            **_stats_to_columns(out_stats, 'pre_'),
+        )
+    os.replace(tmp_path, cache_path)
+
+
+def read_stats_with_cache(
+        path: str | pathlib.Path,
+        *,
+        cache_dir: str | pathlib.Path,
+        preprocess_stats_func: str | None = None,
+) -> CachedStats:
+    """Reads merged and preprocessed stats from a sinter CSV file, reusing previous work.
+
+    The merged stats and their preprocessed versions are stored in a binary columnar
+    file under `cache_dir`, keyed by the CSV file's path and the preprocess function.
+    The cache records how far into the CSV file it has read. When the file has only
+    been appended to since then (e.g. by a resumed `sinter collect`), only the new rows
+    are parsed and only the stats they touch are preprocessed again. Otherwise the
+    whole file is read again.
+
+    Args:
+        path: The sinter CSV file to read.
+        cache_dir: Directory to store cache files in.
+        preprocess_stats_func: An expression using a `stats` variable, like the
+            `--preprocess_stats_func` argument of `sinter plot`. It's applied to a
+            list containing one merged stat at a time. Defaults to no preprocessing.
+
+    Returns:
+        The merged stats and their preprocessed versions.
+    """
+    path = pathlib.Path(path).absolute()
+    if preprocess_stats_func is None:
+        preprocess = lambda *, stats: stats
+    else:
+        preprocess = eval(compile(
+            f'lambda *, stats: {preprocess_stats_func}',
+            filename='preprocess_stats_func:read_stats_with_cache',
+            mode='eval',
+        ))
+    key = {
+        'version': STATS_CACHE_VERSION,
+        'source': str(path),
+        'preprocess': preprocess_stats_func,
+    }
+    cache_name = hashlib.sha1(json.dumps(key).encode('utf8')).hexdigest()[:20]
+    cache_path = pathlib.Path(cache_dir) / f'{path.name}.{cache_name}.npz'
+
+    file_stat = os.stat(path)
+    loaded = _load_cache(cache_path, key)
+    if loaded is not None:
+        header, cached = loaded
+        if header['size'] == file_stat.st_size and header['mtime_ns'] == file_stat.st_mtime_ns:
+            return cached
+        offset = header['offset']
+        if offset > file_stat.st_size or _tail_hash(path, offset) != header['tail_hash']:
+            offset = 0
+            cached = CachedStats(stats={}, preprocessed={})
+    else:
+        offset = 0
+        cached = CachedStats(stats={}, preprocessed={})
+
+    with open(path, 'rb') as f:
+        csv_header = f.readline()
+        f.seek(offset)
+        new_data = f.read(file_stat.st_size - offset)
+    # Leave any partially written last line for the next read.
+    new_data = new_data[:new_data.rfind(b'\n') + 1]
+    if offset > 0:
+        new_data = csv_header + new_data
+    offset += len(new_data) - (len(csv_header) if offset > 0 else 0)
+
+    changed = set()
+    if new_data.strip():
+        for stat in sinter.read_stats_from_csv_files(io.StringIO(new_data.decode('utf8'))):
+            prev = cached.stats.get(stat.strong_id)
+            cached.stats[stat.strong_id] = stat if prev is None else prev + stat
+            changed.add(stat.strong_id)
+    for strong_id in changed:
+        cached.preprocessed[strong_id] = list(preprocess(stats=[cached.stats[strong_id]]))
+
+    _save_cache(cache_path, {
+        **key,
+        'size': file_stat.st_size,
+        'mtime_ns': file_stat.st_mtime_ns,
+        'offset': offset,
+        'tail_hash': _tail_hash(path, offset),
+    }, cached)
+    return cached
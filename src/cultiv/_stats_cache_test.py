@@ -0,0 +1,68 @@
+import collections
+
+import sinter
+
+from ._stats_cache import read_stats_with_cache
+from ._stats_util import split_by_gap_threshold
+
+
+def _stat(strong_id: str, shots: int, errors: int, gap: int) -> sinter.TaskStats:
+    return sinter.TaskStats(
+        strong_id=strong_id,
+        decoder='desaturation',
+        json_metadata={'id': strong_id},
+        shots=shots,
+        errors=errors,
+        custom_counts=collections.Counter({f'E{gap}': errors, f'C{gap + 1}': shots - errors}),
+    )
+
+
+def test_read_stats_with_cache(tmp_path):
+    csv_path = tmp_path / 'stats.csv'
+    cache_dir = tmp_path / 'cache'
+    func = "__import__('cultiv').split_by_gap_threshold(stats, gap_rounding=1, keep_zero=True)"
+    with open(csv_path, 'w') as f:
+        print(sinter.CSV_HEADER, file=f)
+        print(_stat('a', 100, 5, 2).to_csv_line(), file=f)
+        print(_stat('b', 100, 7, 3).to_csv_line(), file=f)
+        print(_stat('a', 50, 1, 4).to_csv_line(), file=f)
+
+    def check(cached):
+        expected = sinter.read_stats_from_csv_files(csv_path)
+        assert sorted(cached.stats.values(), key=lambda s: s.strong_id) == sorted(expected, key=lambda s: s.strong_id)
+        for stat in expected:
+            assert cached.preprocessed[stat.strong_id] == split_by_gap_threshold([stat], gap_rounding=1, keep_zero=True)
+
+    cached = read_stats_with_cache(csv_path, cache_dir=cache_dir, preprocess_stats_func=func)
+    check(cached)
+    assert cached.stats['a'].shots == 150
+    assert len(list(cache_dir.iterdir())) == 1
+    assert read_stats_with_cache(csv_path, cache_dir=cache_dir, preprocess_stats_func=func) == cached
+    assert len(cached.preprocessed_stats(lambda stat: stat.strong_id == 'b')) == 2
+
+    # Appended rows, including a partially written one, are picked up incrementally.
+    with open(csv_path, 'a') as f:
+        print(_stat('b', 10, 2, 3).to_csv_line(), file=f)
+        print(_stat('c', 20, 3, 1).to_csv_line(), file=f)
+        f.write(_stat('a', 1000, 1, 1).to_csv_line()[:10])
+    cached = read_stats_with_cache(csv_path, cache_dir=cache_dir, preprocess_stats_func=func)
+    assert cached.stats['b'].shots == 110
+    assert cached.stats['a'].shots == 150
+    with open(csv_path, 'a') as f:
+        f.write(_stat('a', 1000, 1, 1).to_csv_line()[10:] + '\n')
+    cached = read_stats_with_cache(csv_path, cache_dir=cache_dir, preprocess_stats_func=func)
+    check(cached)
+    assert cached.stats['a'].shots == 1150
+
+    # Rewritten files are read from scratch.
+    with open(csv_path, 'w') as f:
+        print(sinter.CSV_HEADER, file=f)
+        print(_stat('d', 100, 5, 2).to_csv_line(), file=f)
+    cached = read_stats_with_cache(csv_path, cache_dir=cache_dir, preprocess_stats_func=func)
+    check(cached)
+    assert cached.stats.keys() == {'d'}
+
+    # Different preprocessing uses a different cache file.
+    cached = read_stats_with_cache(csv_path, cache_dir=cache_dir)
+    assert cached.preprocessed == {'d': [cached.stats['d']]}
+    assert len(list(cache_dir.iterdir())) == 2
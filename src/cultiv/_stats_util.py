@@ -5,9 +5,14 @@ import dataclasses
 import math
 from typing import Callable
 
+import numpy as np
 import sinter
 import stim
 
+import gen
+from cultiv._decoding._phase_timer import is_phase_timing_key
+from cultiv._decoding._splitting_sampler import is_splitting_key
+
 
 @dataclasses.dataclass
 class GapArg:
@@ -20,6 +25,104 @@ class GapArg:
     at_most: sinter.AnonTaskStats
 
 
+@dataclasses.dataclass(frozen=True)
+class GapHistogram:
+    """Columnar form of the gap histogram stored in a stat's custom counts.
+
+    Custom count keys like 'E17' and 'C3' count kept shots that had a logical
+    error (E) or no logical error (C) and a given (rounded) gap. Phase timing
+    keys (like 'ns_simulate') and splitting keys (like 'S0:10:hits') are
+    ignored. The arrays are aligned and sorted by increasing gap.
+    """
+    source: sinter.TaskStats
+    gaps: np.ndarray
+    errors: np.ndarray
+    corrects: np.ndarray
+
+    @property
+    def shots(self) -> np.ndarray:
+        return self.errors + self.corrects
+
+    @property
+    def shots_below(self) -> np.ndarray:
+        """The number of shots with a gap strictly less than each gap."""
+        return np.cumsum(self.shots) - self.shots
+
+    @property
+    def errors_below(self) -> np.ndarray:
+        """The number of errors with a gap strictly less than each gap."""
+        return np.cumsum(self.errors) - self.errors
+
+    @staticmethod
+    def from_stat(stat: sinter.TaskStats, *, rounding: int) -> 'GapHistogram | None':
+        """Parses the gap histogram of a stat, or returns None if it has no gap counts.
+
+        Gaps are rounded to the nearest multiple of `rounding`, except that the
+        largest gap is kept as is and no gap is rounded above it.
+        """
+        gap_counts = [
+            (key, count)
+            for key, count in stat.custom_counts.items()
+            if not is_phase_timing_key(key) and not is_splitting_key(key)
+        ]
+        if not gap_counts:
+            return None
+        n = len(gap_counts)
+        raw_gaps = np.empty(shape=n, dtype=np.int64)
+        hits = np.empty(shape=n, dtype=np.int64)
+        is_error = np.empty(shape=n, dtype=np.bool_)
+        for k, (cor_gap, count) in enumerate(gap_counts):
+            if cor_gap.startswith('C'):
+                is_error[k] = False
+            elif cor_gap.startswith('E'):
+                is_error[k] = True
+            else:
+                raise NotImplementedError(f'{cor_gap=}')
+            raw_gaps[k] = int(cor_gap[1:])
+            hits[k] = count
+
+        max_gap = np.max(raw_gaps)
+        rounded = np.minimum(max_gap, np.rint(raw_gaps / rounding).astype(np.int64) * rounding)
+        rounded[raw_gaps == max_gap] = max_gap
+        assert np.all(rounded >= 0)
+        gaps, slots = np.unique(rounded, return_inverse=True)
+        errors = np.zeros(shape=len(gaps), dtype=np.int64)
+        corrects = np.zeros(shape=len(gaps), dtype=np.int64)
+        np.add.at(errors, slots[is_error], hits[is_error])
+        np.add.at(corrects, slots[~is_error], hits[~is_error])
+        return GapHistogram(source=stat, gaps=gaps, errors=errors, corrects=corrects)
+
+    def to_task_stats(
+            self,
+            *,
+            shots: np.ndarray,
+            errors: np.ndarray,
+            discards: np.ndarray,
+    ) -> list[sinter.TaskStats]:
+        """Creates one stat per gap. The source stat's discards are added to the given discards."""
+        stat = self.source
+        shots = np.broadcast_to(shots, self.gaps.shape)
+        errors = np.broadcast_to(errors, self.gaps.shape)
+        discards = np.broadcast_to(discards, self.gaps.shape)
+        return [
+            sinter.TaskStats(
+                strong_id=stat.strong_id + f':gap{gap}',
+                decoder=stat.decoder,
+                json_metadata={
+                    **stat.json_metadata,
+                    'gap': gap,
+                    'src_errors': stat.errors,
+                    'src_discards': stat.discards,
+                    'src_shots': stat.shots,
+                },
+                shots=int(shots[k]),
+                errors=int(errors[k]),
+                discards=int(discards[k]) + stat.discards,
+            )
+            for k, gap in enumerate(self.gaps.tolist())
+        ]
+
+
 def compute_expected_injection_growth_volume(
         circuit: stim.Circuit,
         *,
@@ -57,7 +160,7 @@ def compute_expected_injection_growth_volume(
     for l in sorted(layer_qubits.keys()):
         layer_qubits[l] |= layer_qubits[l - 1]
     layer_passes = collections.defaultdict(lambda: 1)
-    dem = circuit.detector_error_model()
+    dem = gen.cached_detector_error_model(circuit)
     for inst in dem.flattened():
         if inst.type == 'error':
             layer = min((
@@ -96,32 +199,26 @@ def stat_to_gap_stats(
 
 
 def split_by_gap_threshold(stats: list[sinter.TaskStats], *, gap_rounding: int, keep_zero: bool = False) -> list[sinter.TaskStats]:
-    stats = stat_to_gap_stats(
-        stats,
-        rounding=gap_rounding,
-        func=lambda arg: sinter.AnonTaskStats(
-            shots=arg.source.shots,
-            discards=arg.at_least.discards + arg.less.shots,
-            errors=arg.at_least.errors,
-        ),
-    )
+    result = []
+    for stat in stats:
+        hist = GapHistogram.from_stat(stat, rounding=gap_rounding)
+        if hist is None:
+            result.append(stat)
+            continue
+        result.extend(hist.to_task_stats(
+            shots=stat.shots,
+            errors=stat.errors - hist.errors_below,
+            discards=hist.shots_below,
+        ))
     return [
         stat
-        for stat in stats
+        for stat in result
         if keep_zero or stat.json_metadata.get('gap', 1) > 0
     ]
 
 
 def split_into_gap_distribution(stats: list[sinter.TaskStats], *, gap_rounding: int) -> list[sinter.TaskStats]:
-    stats = stat_to_gap_stats(
-        stats,
-        rounding=gap_rounding,
-        func=lambda arg: sinter.AnonTaskStats(
-            shots=arg.cur.shots,
-            discards=arg.cur.discards,
-            errors=arg.cur.errors,
-        ),
-    )
+    stats = split_by_gap(stats, gap_rounding=gap_rounding)
     return [
         stat.with_edits(
             errors=stat.errors if e else stat.shots - stat.errors,
@@ -139,19 +236,18 @@ def split_into_gap_distribution(stats: list[sinter.TaskStats], *, gap_rounding:
 
 
 def split_by_gap(stats: list[sinter.TaskStats], *, gap_rounding: int) -> list[sinter.TaskStats]:
-    stats = stat_to_gap_stats(
-        stats,
-        rounding=gap_rounding,
-        func=lambda arg: sinter.AnonTaskStats(
-            shots=arg.cur.shots,
-            discards=arg.cur.discards,
-            errors=arg.cur.errors,
-        ),
-    )
-    return [
-        stat
-        for stat in stats
-    ]
+    result = []
+    for stat in stats:
+        hist = GapHistogram.from_stat(stat, rounding=gap_rounding)
+        if hist is None:
+            result.append(stat)
+            continue
+        result.extend(hist.to_task_stats(
+            shots=hist.shots,
+            errors=hist.errors,
+            discards=0,
+        ))
+    return result
 
 
 def split_by_custom_count(
@@ -160,6 +256,8 @@ def split_by_custom_count(
     result = []
     for stat in stats:
         for key, count  in stat.custom_counts.items():
+            if is_phase_timing_key(key):
+                continue
             k, v = key.split('=')
             try:
                 v = int(v)
@@ -172,51 +270,34 @@ def split_by_custom_count(
     return result
 
 
-def sub_anon(a: sinter.AnonTaskStats, b: sinter.AnonTaskStats) -> sinter.AnonTaskStats:
-    return sinter.AnonTaskStats(
-        shots=a.shots - b.shots,
-        errors=a.errors - b.errors,
-        discards=a.discards - b.discards,
-        seconds=a.seconds - b.seconds,
-        custom_counts=a.custom_counts - b.custom_counts,
-    )
-
-
 def _stat_to_gap_stats_single(
         stat: sinter.TaskStats,
         rounding: int,
         func: Callable[[GapArg], sinter.AnonTaskStats],
 ) -> list[sinter.TaskStats]:
-    if not stat.custom_counts:
+    hist = GapHistogram.from_stat(stat, rounding=rounding)
+    if hist is None:
         return [stat]
-    global_discards = stat.discards
-    anon_stat = stat.to_anon_stats()
-    anon_stat = sinter.AnonTaskStats(shots=anon_stat.shots, errors=anon_stat.errors, discards=0, seconds=anon_stat.seconds, custom_counts=anon_stat.custom_counts)
-    gap_stats = collections.defaultdict(sinter.AnonTaskStats)
-    max_gap = max(int(k[1:]) for k in anon_stat.custom_counts.keys() if k.startswith('C') or k.startswith('E'))
-    for cor_gap, hits in anon_stat.custom_counts.items():
-        if cor_gap.startswith('C'):
-            is_error = False
-        elif cor_gap.startswith('E'):
-            is_error = True
-        else:
-            raise NotImplementedError(f'{cor_gap=}')
-        gap = int(cor_gap[1:])
-        gap = max_gap if gap == max_gap else min(max_gap, round(gap / rounding) * rounding)
-        assert gap >= 0
-        gap_stats[gap] += sinter.AnonTaskStats(shots=hits, errors=hits * is_error)
-    if not gap_stats:
-        gap_stats[0] = anon_stat
 
+    total = sinter.AnonTaskStats(
+        shots=stat.shots,
+        errors=stat.errors,
+        seconds=stat.seconds,
+        custom_counts=stat.custom_counts,
+    )
     result = []
-    less = sinter.AnonTaskStats()
-    more = anon_stat
-    more += sinter.AnonTaskStats(discards=-more.discards)
-    for gap in sorted(gap_stats.keys()):
-        gap_stat = gap_stats[gap]
-        more = sub_anon(more, gap_stat)
-        choice = func(GapArg(source=stat, gap=gap, cur=gap_stat, less=less, more=more, at_least=gap_stat + more, at_most=gap_stat + less))
-        less += gap_stat
+    for gap, shots, errors, shots_below, errors_below in zip(
+            hist.gaps.tolist(),
+            hist.shots.tolist(),
+            hist.errors.tolist(),
+            hist.shots_below.tolist(),
+            hist.errors_below.tolist()):
+        cur = sinter.AnonTaskStats(shots=shots, errors=errors)
+        less = sinter.AnonTaskStats(shots=shots_below, errors=errors_below)
+        at_most = sinter.AnonTaskStats(shots=shots_below + shots, errors=errors_below + errors)
+        at_least = dataclasses.replace(total, shots=total.shots - shots_below, errors=total.errors - errors_below)
+        more = dataclasses.replace(total, shots=at_least.shots - shots, errors=at_least.errors - errors)
+        choice = func(GapArg(source=stat, gap=gap, cur=cur, less=less, more=more, at_least=at_least, at_most=at_most))
         result.append(sinter.TaskStats(
             strong_id=stat.strong_id + f':gap{gap}',
             decoder=stat.decoder,
@@ -229,7 +310,7 @@ def _stat_to_gap_stats_single(
             },
             shots=choice.shots,
             errors=choice.errors,
-            discards=choice.discards + global_discards,
+            discards=choice.discards + stat.discards,
             seconds=choice.seconds,
             custom_counts=choice.custom_counts,
         ))
@@ -283,3 +364,265 @@ def preprocess_intercepted_simulation_stats(stats: list[sinter.TaskStats]) -> li
     #         )
 
     return result
+
+
+def fault_count_distribution(fault_probabilities: np.ndarray, *, max_fault_count: int) -> np.ndarray:
+    """Returns the probability that exactly k of a set of independent faults happen.
+
+    Args:
+        fault_probabilities: The probability of each fault.
+        max_fault_count: The largest k to return the probability of.
+
+    Returns:
+        A float array of length max_fault_count + 1. Entry k is the probability that
+        exactly k faults happen (the Poisson binomial distribution).
+    """
+    import scipy.stats
+
+    # Circuits tend to have few distinct fault probabilities, so the distribution is a
+    # convolution of a few binomial distributions.
+    values, multiplicities = np.unique(np.asarray(fault_probabilities, dtype=np.float64), return_counts=True)
+    ks = np.arange(max_fault_count + 1)
+    result = np.zeros(shape=max_fault_count + 1, dtype=np.float64)
+    result[0] = 1
+    for p, m in zip(values.tolist(), multiplicities.tolist()):
+        result = np.convolve(result, scipy.stats.binom.pmf(ks, m, p))[:max_fault_count + 1]
+    return result
+
+
+@dataclasses.dataclass(frozen=True)
+class StratifiedEstimate:
+    """Per-shot probabilities estimated from the stats of a `cultiv.StratifiedSampler`.
+
+    Shots with a fault count that wasn't sampled aren't counted as errors, discards or
+    kept shots. Their total probability is `unsampled_probability`, which bounds how
+    much the estimate of each probability can be too low.
+    """
+    fault_count_probabilities: dict[int, float]
+    unsampled_probability: float
+    error_probability: float
+    discard_probability: float
+    kept_probability: float
+    gap_error_probabilities: dict[int, float]
+    gap_correct_probabilities: dict[int, float]
+
+    @property
+    def error_rate_when_kept(self) -> float:
+        """The probability that a kept shot has a logical error."""
+        return self.error_probability / self.kept_probability
+
+
+def stratified_counts(stat: sinter.TaskStats | sinter.AnonTaskStats) -> dict[int, collections.Counter[str]]:
+    """Splits the custom counts of a stratified sampler's stat by fault count.
+
+    For example, custom counts {'k2:shots': 10, 'k2:C5': 7} become {2: {'shots': 10, 'C5': 7}}.
+    """
+    result = collections.defaultdict(collections.Counter)
+    for key, count in stat.custom_counts.items():
+        if key.startswith('k') and ':' in key:
+            fault_count, rest = key[1:].split(':', 1)
+            result[int(fault_count)][rest] += count
+    return dict(result)
+
+
+def reweight_stratified_stat(
+        stat: sinter.TaskStats | sinter.AnonTaskStats,
+        *,
+        dem: stim.DetectorErrorModel,
+        noise_scale: float = 1,
+) -> StratifiedEstimate:
+    """Estimates per-shot stats at a noise strength, from the stats of a stratified sampler.
+
+    The stats of each fault count are weighted by the probability of that many faults
+    happening. This assumes that the stats conditioned on the fault count don't depend
+    on the noise strength, which holds when scaling the noise scales every error
+    mechanism's probability by the same factor, and the probabilities are small.
+
+    Args:
+        stat: Stats collected by a `cultiv.StratifiedSampler`.
+        dem: The detector error model the stats were collected with (e.g. the one
+            sinter made for the task).
+        noise_scale: The target noise strength divided by the noise strength of the
+            detector error model. The probability of each error mechanism is scaled by
+            this factor.
+
+    Returns:
+        The estimated per-shot probabilities at the target noise strength.
+    """
+    counts = stratified_counts(stat)
+    if not counts:
+        raise ValueError('The stat has no stratified custom counts (like "k3:shots").')
+    fault_probabilities = np.array(
+        [inst.args_copy()[0] for inst in dem.flattened() if inst.type == 'error'],
+        dtype=np.float64,
+    ) * noise_scale
+    if np.any(fault_probabilities > 0.5):
+        raise ValueError(f'{noise_scale=} makes some error mechanisms more likely than not.')
+    distribution = fault_count_distribution(fault_probabilities, max_fault_count=max(counts))
+
+    fault_count_probabilities = {}
+    error_probability = 0
+    discard_probability = 0
+    kept_probability = 0
+    gap_error_probabilities = collections.Counter()
+    gap_correct_probabilities = collections.Counter()
+    for fault_count, fault_counts in sorted(counts.items()):
+        shots = fault_counts['shots']
+        if shots == 0:
+            continue
+        p = float(distribution[fault_count])
+        fault_count_probabilities[fault_count] = p
+        error_probability += p * fault_counts['errors'] / shots
+        discard_probability += p * fault_counts['discards'] / shots
+        kept_probability += p * (shots - fault_counts['discards']) / shots
+        for key, count in fault_counts.items():
+            if key.startswith('E'):
+                gap_error_probabilities[int(key[1:])] += p * count / shots
+            elif key.startswith('C'):
+                gap_correct_probabilities[int(key[1:])] += p * count / shots
+
+    return StratifiedEstimate(
+        fault_count_probabilities=fault_count_probabilities,
+        unsampled_probability=max(0.0, 1 - sum(fault_count_probabilities.values())),
+        error_probability=error_probability,
+        discard_probability=discard_probability,
+        kept_probability=kept_probability,
+        gap_error_probabilities=dict(sorted(gap_error_probabilities.items())),
+        gap_correct_probabilities=dict(sorted(gap_correct_probabilities.items())),
+    )
+
+
+@dataclasses.dataclass(frozen=True)
+class SplittingEstimate:
+    """Per-shot probabilities estimated from the stats of a `cultiv.SplittingSampler`.
+
+    Attributes:
+        tail_probabilities: The probability that a shot's score is at least each level.
+            For levels T >= 0, this is the probability that a shot is kept and has a
+            logical error with a gap of at least T.
+        tail_probability_bounds: A (low, high) confidence interval for each tail
+            probability.
+        kept_gap_probabilities: The probability that a shot is kept with each gap,
+            estimated from the directly sampled shots.
+    """
+    tail_probabilities: dict[int, float]
+    tail_probability_bounds: dict[int, tuple[float, float]]
+    kept_gap_probabilities: dict[int, float]
+
+    def error_rate_when_kept(self, gap_threshold: int) -> tuple[float, float, float]:
+        """Returns the (estimate, low, high) logical error rate of shots kept by a gap threshold.
+
+        The gap threshold must be one of the (non-negative) levels. The probability of
+        keeping a shot is estimated from the directly sampled shots, and its
+        uncertainty is ignored.
+        """
+        if gap_threshold < 0 or gap_threshold not in self.tail_probabilities:
+            raise ValueError(f'{gap_threshold=} is not a non-negative level of the estimate.')
+        kept = sum(p for gap, p in self.kept_gap_probabilities.items() if gap >= gap_threshold)
+        low, high = self.tail_probability_bounds[gap_threshold]
+        return self.tail_probabilities[gap_threshold] / kept, low / kept, high / kept
+
+
+def splitting_counts(stat: sinter.TaskStats | sinter.AnonTaskStats) -> dict[tuple[int, int], collections.Counter[str]]:
+    """Splits the custom counts of a splitting sampler's stat by level.
+
+    For example, custom counts {'S-10:0:trials': 10, 'S-10:0:hits': 7} become
+    {(-10, 0): {'trials': 10, 'hits': 7}}.
+    """
+    result = collections.defaultdict(collections.Counter)
+    for key, count in stat.custom_counts.items():
+        if is_splitting_key(key):
+            level, next_level, rest = key[1:].split(':')
+            result[(int(level), int(next_level))][rest] += count
+    return dict(result)
+
+
+def estimate_splitting_stat(
+        stat: sinter.TaskStats | sinter.AnonTaskStats,
+        *,
+        confidence: float = 0.95,
+) -> SplittingEstimate:
+    """Estimates the probability of reaching each level, from the stats of a splitting sampler.
+
+    The probability of reaching the first level is estimated from the directly sampled
+    shots, and multiplied by the fraction of Markov chain steps at each level that
+    reached the next level. The estimate is consistent, but not exactly unbiased
+    (because consecutive levels share chains).
+
+    The confidence intervals treat the estimate as log-normal. The variance of each
+    level's fraction is inflated to account for the correlation between consecutive
+    steps of a chain, estimated from how often consecutive steps both hit. When no step
+    of a level hits, the upper bound uses the rule of three (generalized to the
+    confidence).
+
+    Args:
+        stat: Stats collected by a `cultiv.SplittingSampler`.
+        confidence: The probability covered by the confidence intervals.
+
+    Returns:
+        The estimated probability of reaching each level that was sampled.
+    """
+    import scipy.stats
+
+    counts = splitting_counts(stat)
+    if not counts:
+        raise ValueError('The stat has no splitting custom counts (like "S0:10:hits").')
+    next_levels = {level: next_level for level, next_level in counts}
+    if len(next_levels) != len(counts):
+        raise ValueError(f'The stat has inconsistent splitting levels: {sorted(counts)}.')
+
+    kept_gap_probabilities = collections.Counter()
+    first_level = min(next_levels)
+    first_hits = 0
+    for key, count in stat.custom_counts.items():
+        if key[:1] in ('C', 'E'):
+            gap = int(key[1:])
+            kept_gap_probabilities[gap] += count / stat.shots
+            score = gap if key[0] == 'E' else -gap - 1
+            if score >= first_level:
+                first_hits += count
+
+    z = float(scipy.stats.norm.ppf((1 + confidence) / 2))
+    zero_hit_bound = -math.log(1 - confidence)
+    tail_probabilities = {}
+    tail_probability_bounds = {}
+    level = first_level
+    p = 1.0
+    log_variance = 0.0
+    high_if_zero = 1.0
+    trials, hits, hit_pairs = stat.shots, first_hits, None
+    while True:
+        if trials == 0:
+            break
+        if p > 0:
+            fraction = hits / trials
+            if fraction == 0:
+                high_if_zero = p * min(1.0, zero_hit_bound / trials)
+            else:
+                inflation = 1.0
+                if hit_pairs is not None and fraction < 1:
+                    correlation = (hit_pairs / trials - fraction**2) / (fraction - fraction**2)
+                    correlation = min(max(correlation, 0.0), 0.99)
+                    inflation = (1 + correlation) / (1 - correlation)
+                log_variance += (1 - fraction) / hits * inflation
+            p *= fraction
+        tail_probabilities[level] = p
+        if p > 0:
+            spread = math.exp(z * math.sqrt(log_variance))
+            tail_probability_bounds[level] = (p / spread, min(1.0, p * spread))
+        else:
+            tail_probability_bounds[level] = (0.0, high_if_zero)
+
+        if level not in next_levels:
+            break
+        level_counts = counts[(level, next_levels[level])]
+        level = next_levels[level]
+        trials = level_counts['trials']
+        hits = level_counts['hits']
+        hit_pairs = level_counts['hit_pairs']
+
+    return SplittingEstimate(
+        tail_probabilities=tail_probabilities,
+        tail_probability_bounds=tail_probability_bounds,
+        kept_gap_probabilities=dict(sorted(kept_gap_probabilities.items())),
+    )
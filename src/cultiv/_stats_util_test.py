@@ -1,6 +1,15 @@
+import collections
+import math
+
+import numpy as np
+import pytest
+import sinter
+import stim
+
 import gen
 import cultiv
-from ._stats_util import compute_expected_injection_growth_volume
+from ._stats_util import compute_expected_injection_growth_volume, GapHistogram, split_by_gap_threshold, split_by_gap, \
+    fault_count_distribution, reweight_stratified_stat, stratified_counts, estimate_splitting_stat
 
 
 def test_compute_expected_injection_growth_volume():
@@ -13,3 +22,141 @@ def test_compute_expected_injection_growth_volume():
     circuit = gen.NoiseModel.uniform_depolarizing(1e-3).noisy_circuit_skipping_mpp_boundaries(circuit)
     v = compute_expected_injection_growth_volume(circuit)
     assert 1550 <= v <= 1650
+
+
+def _example_gap_stat() -> sinter.TaskStats:
+    return sinter.TaskStats(
+        strong_id='test',
+        decoder='desaturation',
+        json_metadata={'d': 3},
+        shots=1000,
+        errors=23,
+        discards=100,
+        custom_counts=collections.Counter({'C0': 5, 'E0': 10, 'C3': 20, 'E4': 7, 'C12': 703, 'C13': 149, 'E13': 6, 'E14': 0}),
+    )
+
+
+def test_gap_histogram_from_stat():
+    hist = GapHistogram.from_stat(_example_gap_stat(), rounding=5)
+    assert np.array_equal(hist.gaps, [0, 5, 10, 14])
+    assert np.array_equal(hist.errors, [10, 7, 0, 6])
+    assert np.array_equal(hist.corrects, [5, 20, 703, 149])
+    assert np.array_equal(hist.shots_below, [0, 15, 42, 745])
+    assert np.array_equal(hist.errors_below, [0, 10, 17, 17])
+
+    hist = GapHistogram.from_stat(_example_gap_stat(), rounding=1)
+    assert np.array_equal(hist.gaps, [0, 3, 4, 12, 13, 14])
+
+    assert GapHistogram.from_stat(_example_gap_stat().with_edits(custom_counts=collections.Counter()), rounding=5) is None
+
+
+def test_gap_histogram_from_stat_ignores_phase_timings():
+    stat = _example_gap_stat()
+    timed = stat.with_edits(custom_counts=collections.Counter({**stat.custom_counts, 'ns_simulate': 12345, 'ns_decode_on': 678}))
+    hist = GapHistogram.from_stat(timed, rounding=5)
+    expected = GapHistogram.from_stat(stat, rounding=5)
+    assert np.array_equal(hist.gaps, expected.gaps)
+    assert np.array_equal(hist.errors, expected.errors)
+    assert np.array_equal(hist.corrects, expected.corrects)
+
+    only_timings = stat.with_edits(custom_counts=collections.Counter({'ns_simulate': 12345}))
+    assert GapHistogram.from_stat(only_timings, rounding=5) is None
+
+
+def test_split_by_gap():
+    stats = split_by_gap_threshold([_example_gap_stat()], gap_rounding=5, keep_zero=True)
+    assert [(s.json_metadata['gap'], s.shots, s.errors, s.discards) for s in stats] == [
+        (0, 1000, 23, 100),
+        (5, 1000, 13, 115),
+        (10, 1000, 6, 142),
+        (14, 1000, 6, 845),
+    ]
+    assert stats[1].strong_id == 'test:gap5'
+    assert stats[1].json_metadata == {'d': 3, 'gap': 5, 'src_errors': 23, 'src_discards': 100, 'src_shots': 1000}
+    assert len(split_by_gap_threshold([_example_gap_stat()], gap_rounding=5)) == 3
+
+    stats = split_by_gap([_example_gap_stat().with_edits(shots=900, discards=0)], gap_rounding=5)
+    assert [(s.json_metadata['gap'], s.shots, s.errors, s.discards) for s in stats] == [
+        (0, 15, 10, 0),
+        (5, 27, 7, 0),
+        (10, 703, 0, 0),
+        (14, 155, 6, 0),
+    ]
+
+
+def test_fault_count_distribution():
+    probabilities = [0.1, 0.2, 0.2, 0.3, 0.1, 0.1]
+    expected = np.zeros(len(probabilities) + 1)
+    expected[0] = 1
+    for p in probabilities:
+        expected[1:] = expected[1:] * (1 - p) + expected[:-1] * p
+        expected[0] *= 1 - p
+    np.testing.assert_allclose(fault_count_distribution(np.array(probabilities), max_fault_count=6), expected)
+    np.testing.assert_allclose(fault_count_distribution(np.array(probabilities), max_fault_count=2), expected[:3])
+
+
+def test_reweight_stratified_stat():
+    dem = stim.DetectorErrorModel("""
+        error(0.1) D0
+        error(0.1) D1 L0
+    """)
+    stat = sinter.AnonTaskStats(
+        shots=300,
+        custom_counts=collections.Counter({
+            'k0:shots': 100, 'k0:C9': 100,
+            'k1:shots': 100, 'k1:discards': 50, 'k1:errors': 10, 'k1:C5': 40, 'k1:E5': 10,
+            'k2:shots': 100, 'k2:discards': 100,
+        }),
+    )
+    assert stratified_counts(stat)[1] == {'shots': 100, 'discards': 50, 'errors': 10, 'C5': 40, 'E5': 10}
+
+    estimate = reweight_stratified_stat(stat, dem=dem)
+    assert estimate.fault_count_probabilities == pytest.approx({0: 0.81, 1: 0.18, 2: 0.01})
+    assert estimate.unsampled_probability == pytest.approx(0)
+    assert estimate.error_probability == pytest.approx(0.018)
+    assert estimate.discard_probability == pytest.approx(0.09 + 0.01)
+    assert estimate.kept_probability == pytest.approx(0.81 + 0.09)
+    assert estimate.error_rate_when_kept == pytest.approx(0.018 / 0.9)
+    assert estimate.gap_error_probabilities == pytest.approx({5: 0.018})
+    assert estimate.gap_correct_probabilities == pytest.approx({5: 0.072, 9: 0.81})
+
+    estimate = reweight_stratified_stat(stat, dem=dem, noise_scale=2)
+    assert estimate.fault_count_probabilities == pytest.approx({0: 0.64, 1: 0.32, 2: 0.04})
+    assert estimate.error_probability == pytest.approx(0.032)
+
+    with pytest.raises(ValueError, match='stratified'):
+        reweight_stratified_stat(sinter.AnonTaskStats(shots=1), dem=dem)
+
+
+def test_estimate_splitting_stat():
+    stat = sinter.TaskStats(
+        strong_id='test',
+        decoder='splitting-pymatching-gap',
+        json_metadata={},
+        shots=1000,
+        errors=5,
+        discards=500,
+        custom_counts=collections.Counter({
+            'C20': 300, 'C5': 195, 'E3': 5,
+            'S-10:0:trials': 1000, 'S-10:0:hits': 100, 'S-10:0:hit_pairs': 10,
+            'S0:10:trials': 1000, 'S0:10:hits': 0, 'S0:10:hit_pairs': 0,
+        }),
+    )
+    hist = GapHistogram.from_stat(stat, rounding=1)
+    np.testing.assert_array_equal(hist.gaps, [3, 5, 20])
+
+    estimate = estimate_splitting_stat(stat)
+    # Scores of at least -10: errors, and correct shots with gaps of at most 9.
+    assert estimate.tail_probabilities == pytest.approx({-10: 0.2, 0: 0.02, 10: 0})
+    low, high = estimate.tail_probability_bounds[-10]
+    assert low < 0.2 < high
+    # The chains at level -10 are uncorrelated, so only the binomial variances count.
+    log_spread = math.log(estimate.tail_probability_bounds[0][1] / 0.02)
+    assert log_spread == pytest.approx(1.959964 * math.sqrt(0.8 / 200 + 0.9 / 100), rel=1e-4)
+    assert estimate.tail_probability_bounds[10] == pytest.approx((0, 0.02 * -math.log(0.05) / 1000))
+    assert estimate.kept_gap_probabilities == pytest.approx({3: 0.005, 5: 0.195, 20: 0.3})
+
+    rate, low, high = estimate.error_rate_when_kept(0)
+    assert rate == pytest.approx(0.02 / 0.5)
+    with pytest.raises(ValueError):
+        estimate.error_rate_when_kept(5)
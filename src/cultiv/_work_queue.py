@@ -0,0 +1,360 @@
+import importlib
+import multiprocessing.connection
+import os
+import pathlib
+import threading
+import time
+import uuid
+from typing import Any, Iterable
+
+import sinter
+
+from cultiv._adaptive_collection import AdaptiveShotAllocator, empty_task_stats, merged_stats_by_strong_id
+
+AUTHKEY_ENV_VAR = 'CULTIV_COLLECT_AUTHKEY'
+
+
+class CollectionCoordinator:
+    """Hands out batches of shots to collection workers, and merges their stats into a resume file.
+
+    Workers (see `cultiv.run_collection_worker`) connect to the coordinator's address,
+    possibly from other machines, and repeatedly ask for work. Each batch is a task
+    and a number of shots, picked by the allocator from the stats merged so far. The
+    task itself is sent along with the first batch of it on a connection, so workers
+    don't need access to the circuit files.
+
+    The stats of each batch are appended to the resume file in sinter's CSV format,
+    so the file can be read by sinter (which sums rows with the same strong id) and
+    resumed from by both this coordinator and `sinter collect`. Every batch has an id,
+    which is recorded in a ledger file next to the resume file before its stats are
+    appended. Stats of batches already in the ledger (e.g. resent by a worker that
+    lost its connection before hearing back) are ignored, so no batch is counted
+    twice, even across coordinator restarts.
+
+    The allocator only sees merged stats, so tasks without batches in flight are
+    preferred, and a task's batch is shrunk by the shots it already has in flight.
+    So the allocator's limits on batch sizes hold for all of a task's batches in
+    flight, instead of for each of them. Batches assigned to a worker that
+    disconnects are given to other workers.
+
+    Messages are pickled, so only run workers and coordinators that trust each other
+    (they authenticate with a shared key).
+    """
+
+    def __init__(
+            self,
+            tasks: Iterable[sinter.Task],
+            *,
+            allocator: AdaptiveShotAllocator,
+            save_resume_filepath: str | pathlib.Path,
+            authkey: bytes,
+            address: tuple[str, int] = ('localhost', 0),
+            wait_seconds: float = 1,
+    ):
+        """
+        Args:
+            tasks: The tasks to collect. Tasks with the same strong id are collected once.
+            allocator: Picks which task to sample next, how many shots to take, and when
+                to stop.
+            save_resume_filepath: The sinter CSV file that stats are read from and
+                appended to. Its ledger is stored in the same directory, with a
+                '.batches' suffix.
+            authkey: The key that workers must present.
+            address: The (host, port) to listen on. Port 0 picks a free port (see
+                `self.address`).
+            wait_seconds: How long workers wait before asking again, when every
+                remaining batch is already assigned.
+        """
+        self.tasks: dict[str, sinter.Task] = {}
+        for task in tasks:
+            self.tasks.setdefault(task.strong_id(), task)
+        self.allocator = allocator
+        self.save_resume_filepath = pathlib.Path(save_resume_filepath)
+        self.ledger_filepath = self.save_resume_filepath.with_name(self.save_resume_filepath.name + '.batches')
+        self.wait_seconds = wait_seconds
+
+        existing = {}
+        if self.save_resume_filepath.exists():
+            existing = merged_stats_by_strong_id(sinter.stats_from_csv_files(self.save_resume_filepath))
+        else:
+            self.save_resume_filepath.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.save_resume_filepath, 'w') as f:
+                print(sinter.CSV_HEADER, file=f)
+        self.stats: dict[str, sinter.TaskStats] = {
+            strong_id: existing.get(strong_id) or empty_task_stats(task)
+            for strong_id, task in self.tasks.items()
+        }
+        self.applied_batches: set[str] = set()
+        if self.ledger_filepath.exists():
+            self.applied_batches.update(self.ledger_filepath.read_text().split())
+
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._closed = False
+        self._num_connections = 0
+        self._pending: dict[str, dict[str, int]] = {strong_id: {} for strong_id in self.tasks}
+        self._listener = multiprocessing.connection.Listener(address, authkey=authkey)
+        self.address: tuple[str, int] = self._listener.address
+        self._check_done()
+
+    def start(self) -> None:
+        """Starts accepting workers on a background thread."""
+        threading.Thread(target=self._serve, name='cultiv-coordinator', daemon=True).start()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Waits until every task is done, returning whether they are."""
+        return self._done.wait(timeout)
+
+    def is_done(self) -> bool:
+        return self._done.is_set()
+
+    def close(self, timeout: float | None = None) -> None:
+        """Stops accepting workers, after waiting for connected workers to hear that they're done.
+
+        Args:
+            timeout: The longest time to wait for workers to disconnect. Defaults to
+                long enough for waiting workers to ask again.
+        """
+        if timeout is None:
+            timeout = 2 * self.wait_seconds + 1
+        deadline = time.monotonic() + timeout
+        while self._done.is_set() and self._num_connections and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._closed = True
+        self._listener.close()
+
+    def __enter__(self) -> 'CollectionCoordinator':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (OSError, multiprocessing.AuthenticationError):
+                if self._closed:
+                    return
+                continue
+            threading.Thread(target=self._handle, args=(conn,), name='cultiv-coordinator-conn', daemon=True).start()
+
+    def _handle(self, conn: multiprocessing.connection.Connection) -> None:
+        sent_tasks: set[str] = set()
+        assigned: dict[str, str] = {}
+        with self._lock:
+            self._num_connections += 1
+        try:
+            with conn:
+                while True:
+                    message = conn.recv()
+                    if message['type'] == 'request':
+                        reply = self._assign()
+                        if reply['type'] == 'work':
+                            strong_id = reply['strong_id']
+                            assigned[reply['batch_id']] = strong_id
+                            if strong_id not in sent_tasks:
+                                reply['task'] = self.tasks[strong_id]
+                                sent_tasks.add(strong_id)
+                        conn.send(reply)
+                    elif message['type'] == 'result':
+                        assigned.pop(message['batch_id'], None)
+                        self.apply_result(message['batch_id'], message['stat'])
+                        conn.send({'type': 'ack'})
+                    else:
+                        raise NotImplementedError(f'{message=}')
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._num_connections -= 1
+                for batch_id, strong_id in assigned.items():
+                    self._pending[strong_id].pop(batch_id, None)
+                self._check_done()
+
+    def _remaining_shots(self, strong_id: str) -> float:
+        if self.allocator.max_shots is None:
+            return float('inf')
+        pending = sum(self._pending[strong_id].values())
+        return self.allocator.max_shots - self.stats[strong_id].shots - pending
+
+    def _assign(self) -> dict[str, Any]:
+        with self._lock:
+            # The allocator only sees merged stats, so batches in flight are accounted
+            # for here.
+            candidates = [strong_id for strong_id in self.tasks if self._remaining_shots(strong_id) > 0]
+            idle = {strong_id: self.stats[strong_id] for strong_id in candidates if not self._pending[strong_id]}
+            busy = {strong_id: self.stats[strong_id] for strong_id in candidates if self._pending[strong_id]}
+            for group in [idle, busy]:
+                while True:
+                    choice = self.allocator.choose(group)
+                    if choice is None:
+                        break
+                    strong_id, shots = choice
+                    shots = int(min(
+                        shots - sum(self._pending[strong_id].values()),
+                        self._remaining_shots(strong_id),
+                    ))
+                    if shots <= 0:
+                        del group[strong_id]
+                        continue
+                    batch_id = uuid.uuid4().hex
+                    self._pending[strong_id][batch_id] = shots
+                    return {'type': 'work', 'batch_id': batch_id, 'strong_id': strong_id, 'shots': shots}
+            self._check_done()
+            if self._done.is_set():
+                return {'type': 'done'}
+            return {'type': 'wait', 'seconds': self.wait_seconds}
+
+    def apply_result(self, batch_id: str, stat: sinter.TaskStats) -> bool:
+        """Merges the stats of a batch, unless they were already merged.
+
+        Returns:
+            Whether the stats were merged.
+        """
+        with self._lock:
+            self._pending.get(stat.strong_id, {}).pop(batch_id, None)
+            if batch_id in self.applied_batches:
+                return False
+            # The ledger is written first, so a crash between the two writes loses the
+            # batch instead of counting it twice.
+            with open(self.ledger_filepath, 'a') as f:
+                print(batch_id, file=f)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.save_resume_filepath, 'a') as f:
+                print(stat, file=f)
+            self.applied_batches.add(batch_id)
+            if stat.strong_id in self.stats:
+                self.stats[stat.strong_id] += stat
+            self._check_done()
+            return True
+
+    def _check_done(self) -> None:
+        if any(self._pending.values()):
+            return
+        if all(
+            self.allocator.is_done(stat) or self._remaining_shots(strong_id) <= 0
+            for strong_id, stat in self.stats.items()
+        ):
+            self._done.set()
+
+
+def run_collection_worker(
+        address: tuple[str, int],
+        *,
+        authkey: bytes,
+        samplers: dict[str, sinter.Sampler],
+        connect_timeout: float = 60,
+) -> int:
+    """Takes batches of shots from a `cultiv.CollectionCoordinator` until it has no more.
+
+    If the connection is lost, the worker reconnects (resending the stats of its last
+    batch if they weren't acknowledged), giving up when it can't connect for
+    `connect_timeout` seconds.
+
+    Args:
+        address: The (host, port) of the coordinator.
+        authkey: The key shared with the coordinator.
+        samplers: The samplers to use for each decoder name.
+        connect_timeout: How long to keep trying to connect.
+
+    Returns:
+        The number of batches whose stats were sent.
+    """
+    tasks: dict[str, sinter.Task] = {}
+    compiled: dict[str, sinter.CompiledSampler] = {}
+    unsent: dict[str, Any] | None = None
+    num_batches = 0
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            conn = multiprocessing.connection.Client(address, authkey=authkey)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+            continue
+
+        try:
+            with conn:
+                if unsent is not None:
+                    conn.send(unsent)
+                    conn.recv()
+                    unsent = None
+                while True:
+                    conn.send({'type': 'request'})
+                    reply = conn.recv()
+                    if reply['type'] == 'done':
+                        return num_batches
+                    if reply['type'] == 'wait':
+                        time.sleep(reply['seconds'])
+                        continue
+
+                    strong_id = reply['strong_id']
+                    if 'task' in reply:
+                        tasks[strong_id] = reply['task']
+                    task = tasks[strong_id]
+                    sampler = compiled.get(strong_id)
+                    if sampler is None:
+                        sampler = samplers[task.decoder].compiled_sampler_for_task(task)
+                        compiled[strong_id] = sampler
+                    anon = sampler.sample(reply['shots'])
+                    unsent = {
+                        'type': 'result',
+                        'batch_id': reply['batch_id'],
+                        'stat': sinter.TaskStats(
+                            strong_id=strong_id,
+                            decoder=task.decoder,
+                            json_metadata=task.json_metadata,
+                            shots=anon.shots,
+                            errors=anon.errors,
+                            discards=anon.discards,
+                            seconds=anon.seconds,
+                            custom_counts=anon.custom_counts,
+                        ),
+                    }
+                    conn.send(unsent)
+                    conn.recv()
+                    unsent = None
+                    num_batches += 1
+        except (EOFError, OSError):
+            deadline = time.monotonic() + connect_timeout
+
+
+def load_samplers(custom_decoders: str | None, *, tmp_dir: str | pathlib.Path) -> dict[str, sinter.Sampler]:
+    """Returns sinter's built-in samplers, and the ones named by a "module:function" spec.
+
+    The spec has the syntax of sinter's --custom_decoders argument. Decoders are wrapped
+    into samplers the way sinter wraps them.
+
+    Args:
+        custom_decoders: Names a function returning a dict of custom decoders and
+            samplers, like "cultiv:sinter_samplers".
+        tmp_dir: Where wrapped decoders write temporary files.
+    """
+    from sinter._decoding._stim_then_decode_sampler import StimThenDecodeSampler
+
+    named: dict[str, Any] = dict(sinter.BUILT_IN_SAMPLERS)
+    if custom_decoders:
+        module, function = custom_decoders.split(':')
+        named.update(getattr(importlib.import_module(module), function)())
+    result = {}
+    for name, sampler in named.items():
+        if not isinstance(sampler, sinter.Sampler):
+            sampler = StimThenDecodeSampler(
+                decoder=sampler,
+                count_detection_events=False,
+                count_observable_error_combos=False,
+                tmp_dir=pathlib.Path(tmp_dir),
+            )
+        result[name] = sampler
+    return result
+
+
+def authkey_from_env() -> bytes:
+    """Returns the key in the CULTIV_COLLECT_AUTHKEY environment variable."""
+    key = os.environ.get(AUTHKEY_ENV_VAR)
+    if not key:
+        raise ValueError(f'Set the {AUTHKEY_ENV_VAR} environment variable to a secret shared by the coordinator and workers.')
+    return key.encode('utf8')
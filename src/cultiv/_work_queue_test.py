@@ -0,0 +1,141 @@
+import multiprocessing
+
+import pytest
+import sinter
+import stim
+
+import cultiv
+from ._adaptive_collection import AdaptiveShotAllocator, merged_stats_by_strong_id
+from ._work_queue import CollectionCoordinator, load_samplers, run_collection_worker
+
+
+def _repetition_code_task(*, d: int, p: float) -> sinter.Task:
+    circuit = stim.Circuit.generated(
+        'repetition_code:memory',
+        distance=d,
+        rounds=d,
+        before_round_data_depolarization=p,
+        before_measure_flip_probability=p,
+    )
+    return sinter.Task(
+        circuit=circuit,
+        decoder='pymatching-gap',
+        detector_error_model=circuit.detector_error_model(decompose_errors=True),
+        json_metadata={'d': d, 'p': p},
+    )
+
+
+def _tasks() -> list[sinter.Task]:
+    return [_repetition_code_task(d=d, p=0.02) for d in [3, 5]]
+
+
+def _worker(address: tuple[str, int], tmp_dir: str) -> int:
+    return run_collection_worker(
+        address,
+        authkey=b'test',
+        samplers=load_samplers('cultiv:sinter_samplers', tmp_dir=tmp_dir),
+    )
+
+
+def test_coordinator_with_worker_processes(tmp_path):
+    path = tmp_path / 'stats.csv'
+    tasks = _tasks()
+    allocator = AdaptiveShotAllocator(max_shots=20000, max_log10_width=0, min_batch_shots=1000, batch_seconds=0.1)
+    coordinator = CollectionCoordinator(
+        # The duplicated task is only collected once.
+        [*tasks, tasks[0]],
+        allocator=allocator,
+        save_resume_filepath=path,
+        authkey=b'test',
+        wait_seconds=0.1,
+    )
+    assert len(coordinator.tasks) == 2
+    coordinator.start()
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(3) as pool:
+        results = [pool.apply_async(_worker, (coordinator.address, str(tmp_path))) for _ in range(3)]
+        assert coordinator.wait(timeout=120)
+        num_batches = [r.get(timeout=60) for r in results]
+    coordinator.close()
+
+    stats = merged_stats_by_strong_id(sinter.stats_from_csv_files(path))
+    assert sorted(stats) == sorted(task.strong_id() for task in tasks)
+    assert all(stat.shots == 20000 for stat in stats.values())
+    assert all(stat.errors > 0 for stat in stats.values())
+    assert {stat.json_metadata['d'] for stat in stats.values()} == {3, 5}
+    ledger = coordinator.ledger_filepath.read_text().split()
+    assert len(ledger) == len(set(ledger)) == sum(num_batches) == len(path.read_text().splitlines()) - 1
+
+    # Restarting the coordinator resumes from the file, and finds nothing to do.
+    with CollectionCoordinator(tasks, allocator=allocator, save_resume_filepath=path, authkey=b'test') as restarted:
+        assert restarted.is_done()
+        assert restarted.stats == stats
+
+
+def test_coordinator_accounts_for_batches_in_flight(tmp_path):
+    noisy = _repetition_code_task(d=3, p=0.1)
+    quiet = _repetition_code_task(d=3, p=0.01)
+    allocator = AdaptiveShotAllocator(gap_thresholds=[0], max_log10_width=0.5, max_shots=10**6, min_batch_shots=1000)
+    with CollectionCoordinator([noisy, quiet], allocator=allocator, save_resume_filepath=tmp_path / 'a.csv', authkey=b'test') as coordinator:
+        first, second, third = [coordinator._assign() for _ in range(3)]
+        # Tasks without batches in flight go first, and the batches in flight count
+        # against the next batch of a task.
+        assert {first['strong_id'], second['strong_id']} == {noisy.strong_id(), quiet.strong_id()}
+        assert first['shots'] == second['shots'] == 1000
+        assert third['type'] == 'wait'
+
+    # The noisy task converges after its first batch, so the other workers don't
+    # sample it at the same time.
+    path = tmp_path / 'b.csv'
+    coordinator = CollectionCoordinator(
+        [noisy],
+        allocator=allocator,
+        save_resume_filepath=path,
+        authkey=b'test',
+        wait_seconds=0.1,
+    )
+    coordinator.start()
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(3) as pool:
+        results = [pool.apply_async(_worker, (coordinator.address, str(tmp_path))) for _ in range(3)]
+        assert coordinator.wait(timeout=120)
+        assert sum(r.get(timeout=60) for r in results) == 1
+    coordinator.close()
+    stat, = sinter.stats_from_csv_files(path)
+    assert stat.shots == 1000
+    assert allocator.is_done(stat)
+
+
+def test_coordinator_ignores_repeated_batches(tmp_path):
+    path = tmp_path / 'stats.csv'
+    task = _tasks()[0]
+    allocator = AdaptiveShotAllocator(max_shots=5000, max_log10_width=0, min_batch_shots=1000)
+    stat = sinter.TaskStats(
+        strong_id=task.strong_id(),
+        decoder=task.decoder,
+        json_metadata=task.json_metadata,
+        shots=1000,
+        errors=3,
+    )
+    with CollectionCoordinator([task], allocator=allocator, save_resume_filepath=path, authkey=b'test') as coordinator:
+        assert coordinator.apply_result('batch1', stat)
+        assert not coordinator.apply_result('batch1', stat)
+        assert coordinator.apply_result('batch2', stat)
+        assert coordinator.stats[task.strong_id()].shots == 2000
+
+    # The ledger survives restarts.
+    with CollectionCoordinator([task], allocator=allocator, save_resume_filepath=path, authkey=b'test') as coordinator:
+        assert coordinator.stats[task.strong_id()].shots == 2000
+        assert not coordinator.apply_result('batch2', stat)
+        assert coordinator.apply_result('batch3', stat)
+    stats = merged_stats_by_strong_id(sinter.stats_from_csv_files(path))
+    assert stats[task.strong_id()].shots == 3000
+    assert stats[task.strong_id()].errors == 9
+
+
+def test_authkey_from_env(monkeypatch):
+    monkeypatch.delenv('CULTIV_COLLECT_AUTHKEY', raising=False)
+    with pytest.raises(ValueError, match='CULTIV_COLLECT_AUTHKEY'):
+        cultiv.authkey_from_env()
+    monkeypatch.setenv('CULTIV_COLLECT_AUTHKEY', 'secret')
+    assert cultiv.authkey_from_env() == b'secret'
@@ -1,6 +1,9 @@
 import argparse
 import collections
+import functools
 import math
+import multiprocessing
+import os
 import pathlib
 
 import numpy as np
@@ -44,9 +47,80 @@ def circuit_to_layers(circuit: stim.Circuit) -> list[stim.Circuit]:
     return prev_layers
 
 
-def sample_times(circuit: stim.Circuit, shots: int) -> tuple[collections.Counter, list[int]]:
-    sim = stim.FlipSimulator(batch_size=1024, num_qubits=circuit.num_qubits)
-    layers = circuit_to_layers(circuit)
+@functools.lru_cache(maxsize=8)
+def _cached_circuit_to_layers(circuit_text: str) -> tuple[stim.Circuit, ...]:
+    return tuple(circuit_to_layers(stim.Circuit(circuit_text)))
+
+
+def _postselected_detector_mask(circuit: stim.Circuit) -> np.ndarray:
+    mask = np.zeros(circuit.num_detectors, dtype=np.bool_)
+    for det, coord in circuit.get_detector_coordinates().items():
+        if len(coord) == 3 or coord[-1] == -9 or coord[4] == 0 or coord[4] == 4:
+            mask[det] = True
+    return mask
+
+
+def _sample_times_chunk(
+        circuit_text: str,
+        shots: int,
+        batch_size: int,
+        seed: int | None,
+) -> collections.Counter:
+    circuit = stim.Circuit(circuit_text)
+    layers = _cached_circuit_to_layers(circuit_text)
+    postselected = _postselected_detector_mask(circuit)
+
+    # For each layer, the postselected detectors that the layer introduces.
+    layer_postselected = []
+    num_dets = 0
+    for layer in layers:
+        new_num_dets = num_dets + layer.num_detectors
+        layer_postselected.append(np.flatnonzero(postselected[num_dets:new_num_dets]) + num_dets)
+        num_dets = new_num_dets
+
+    sim = stim.FlipSimulator(batch_size=batch_size, num_qubits=circuit.num_qubits, seed=seed)
+    counts = collections.Counter()
+    shots_left = shots
+    while shots_left > 0:
+        n = min(shots_left, batch_size)
+        survivors = np.packbits(np.arange(batch_size) < n, bitorder='little')
+        sim.clear()
+        for tick, (layer, dets) in enumerate(zip(layers, layer_postselected), start=1):
+            sim.do(layer)
+            if len(dets):
+                flips = sim.get_detector_flips(bit_packed=True)
+                survivors &= ~np.bitwise_or.reduce(flips[dets], axis=0)
+            counts[tick] += int(np.count_nonzero(np.unpackbits(survivors)))
+        counts[0] += n
+        shots_left -= n
+    return counts
+
+
+def sample_times(
+        circuit: stim.Circuit,
+        shots: int,
+        *,
+        batch_size: int = 1024,
+        num_workers: int = 1,
+        seed: int | None = None,
+) -> tuple[collections.Counter, list[int]]:
+    """Samples how many shots survive postselection up to each layer of the circuit.
+
+    Args:
+        circuit: The noisy circuit to sample.
+        shots: The number of shots to sample.
+        batch_size: The number of shots simulated at once by each stim.FlipSimulator.
+        num_workers: The number of processes to spread the shots over.
+        seed: Seeds the simulation. Each worker gets its own seed derived from this one.
+            Defaults to None (not seeded).
+
+    Returns:
+        A (counts, qubit_counts) tuple. counts[k] is the number of shots that survived
+        the first k layers. qubit_counts[k] is the number of qubits that have been
+        reset by the end of layer k.
+    """
+    circuit_text = str(circuit)
+    layers = _cached_circuit_to_layers(circuit_text)
 
     qubit_counts = []
     used_qubits = set()
@@ -56,33 +130,23 @@ def sample_times(circuit: stim.Circuit, shots: int) -> tuple[collections.Counter
                 for t in inst.targets_copy():
                     used_qubits.add(t.qubit_value)
         qubit_counts.append(len(used_qubits))
-    survivors = np.zeros(1024, dtype=np.bool_)
-    postselected_detectors = set()
-    for det, coord in circuit.get_detector_coordinates().items():
-        if len(coord) == 3 or coord[-1] == -9 or coord[4] == 0 or coord[4] == 4:
-            postselected_detectors.add(det)
-    counts = collections.Counter()
 
-    shots_left = shots
-    while shots_left > 0:
-        sim.clear()
-        cur_det = 0
-        tick = 0
-        survivors[:] = True
-        for layer in layers:
-            tick += 1
-            sim.do(layer)
-            if cur_det < sim.num_detectors:
-                while cur_det < sim.num_detectors:
-                    if cur_det in postselected_detectors:
-                        fired = sim.get_detector_flips(detector_index=cur_det)
-                        survivors &= ~fired
-                    cur_det += 1
-            counts[tick] += np.count_nonzero(survivors)
-
-        counts[0] += 1024
-        shots_left -= 1024
+    num_workers = max(1, min(num_workers, math.ceil(shots / batch_size)))
+    if seed is None:
+        seeds = [None] * num_workers
+    else:
+        seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(num_workers)]
+    worker_shots = [shots // num_workers + (k < shots % num_workers) for k in range(num_workers)]
+    args = [(circuit_text, n, batch_size, s) for n, s in zip(worker_shots, seeds)]
+    if num_workers == 1:
+        results = [_sample_times_chunk(*args[0])]
+    else:
+        with multiprocessing.Pool(num_workers) as pool:
+            results = pool.starmap(_sample_times_chunk, args)
 
+    counts = collections.Counter()
+    for result in results:
+        counts.update(result)
     return counts, qubit_counts
 
 
@@ -99,6 +163,10 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--out', type=str, default=None)
     parser.add_argument('--show', action='store_true')
+    parser.add_argument('--shots', type=int, default=1024*100)
+    parser.add_argument('--batch_size', type=int, default=1024)
+    parser.add_argument('--num_workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=None)
     args = parser.parse_args()
 
     fig, (ax1, ax2) = plt.subplots(1, 2)
@@ -114,8 +182,14 @@ def main():
             inject_style='unitary',
         )
         circuit = gen.NoiseModel.uniform_depolarizing(1e-3).noisy_circuit_skipping_mpp_boundaries(circuit)
-        num_shots = 1024*100
-        ts, qs = sample_times(circuit, num_shots)
+        num_shots = args.shots
+        ts, qs = sample_times(
+            circuit,
+            num_shots,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers,
+            seed=args.seed,
+        )
         if dcolor == 5:
             success_rate = 0.01  # Taken from the rejection-vs-logical-error plot near high end of rejection.
         elif dcolor == 3:
@@ -1,7 +1,8 @@
 import stim
 
+import gen
 import cultiv
-from cultiv.make_lifetime_plot import circuit_to_layers
+from cultiv.make_lifetime_plot import circuit_to_layers, sample_times
 
 
 def test_circuit_to_layers():
@@ -279,3 +280,20 @@ def test_circuit_to_layers():
         DETECTOR(10, 1, 7, 0, 6) rec[-56] rec[-19]
         TICK
     """)
+
+
+def test_sample_times():
+    circuit = cultiv.make_end2end_cultivation_circuit(dcolor=3, dsurface=6, basis='Y', r_growing=3, r_end=3, inject_style='unitary')
+    num_layers = len(circuit_to_layers(circuit))
+
+    counts, qubit_counts = sample_times(circuit, 1000, batch_size=256)
+    assert len(qubit_counts) == num_layers
+    assert qubit_counts == sorted(qubit_counts)
+    assert counts == {k: 1000 for k in range(num_layers + 1)}
+
+    noisy = gen.NoiseModel.uniform_depolarizing(1e-2).noisy_circuit_skipping_mpp_boundaries(circuit)
+    counts, _ = sample_times(noisy, 1000, batch_size=256, num_workers=2, seed=123)
+    assert counts[0] == 1000
+    assert counts[num_layers] < 1000
+    assert all(counts[k] >= counts[k + 1] for k in range(num_layers))
+    assert sample_times(noisy, 1000, batch_size=256, num_workers=2, seed=123)[0] == counts
@@ -1,3 +1,6 @@
+import importlib
+from typing import Any, TYPE_CHECKING
+
 from ._chunk import (
     Builder,
     complex_key,
@@ -5,6 +8,7 @@ from ._chunk import (
     min_max_complex,
     NoiseModel,
     NoiseRule,
+    noisy_circuits_for_noise_sweep,
     occurs_in_classical_control_system,
     Patch,
     PauliMap,
@@ -19,6 +23,13 @@ from ._chunk import (
     compile_chunks_into_circuit,
     ChunkInterface,
     ChunkCompiler,
+    ChunkCompileCache,
+    chunks_content_hash,
+    DemCache,
+    cached_detector_error_model,
+    circuit_content_hash,
+    default_dem_cache,
+    sinter_detector_error_model,
     circuit_with_xz_flipped,
     gates_used_by_circuit,
     gate_counts_for_circuit,
@@ -31,28 +42,62 @@ from ._chunk import (
     find_d1_error,
     find_d2_error,
 )
-from ._layers import (
-    transpile_to_z_basis_interaction_circuit,
-    LayerCircuit,
-    ResetLayer,
-    MeasureLayer,
-    InteractLayer,
-)
 from ._util import (
     xor_sorted,
     write_file,
 )
-from ._viz_circuit_html import (
-    stim_circuit_html_viewer,
-)
-from ._viz_gltf_3d import (
-    ColoredLineData,
-    ColoredTriangleData,
-    gltf_model_from_colored_triangle_data,
-    viz_3d_gltf_model_html,
-)
-from ._viz_patch_svg import (
-    patch_svg_viewer,
-    is_collinear,
-    svg_path_directions_for_tile,
-)
+
+if TYPE_CHECKING:
+    from ._layers import (
+        transpile_to_z_basis_interaction_circuit,
+        LayerCircuit,
+        ResetLayer,
+        MeasureLayer,
+        InteractLayer,
+    )
+    from ._viz_circuit_html import (
+        stim_circuit_html_viewer,
+    )
+    from ._viz_gltf_3d import (
+        ColoredLineData,
+        ColoredTriangleData,
+        gltf_model_from_colored_triangle_data,
+        viz_3d_gltf_model_html,
+    )
+    from ._viz_patch_svg import (
+        patch_svg_viewer,
+        is_collinear,
+        svg_path_directions_for_tile,
+    )
+
+# Attributes whose modules are imported when first accessed, instead of when gen is
+# imported. Making circuits doesn't need them, and the visualization modules pull in
+# slow dependencies such as pygltflib.
+_LAZY_ATTRIBUTES = {
+    "transpile_to_z_basis_interaction_circuit": "._layers",
+    "LayerCircuit": "._layers",
+    "ResetLayer": "._layers",
+    "MeasureLayer": "._layers",
+    "InteractLayer": "._layers",
+    "stim_circuit_html_viewer": "._viz_circuit_html",
+    "ColoredLineData": "._viz_gltf_3d",
+    "ColoredTriangleData": "._viz_gltf_3d",
+    "gltf_model_from_colored_triangle_data": "._viz_gltf_3d",
+    "viz_3d_gltf_model_html": "._viz_gltf_3d",
+    "patch_svg_viewer": "._viz_patch_svg",
+    "is_collinear": "._viz_patch_svg",
+    "svg_path_directions_for_tile": "._viz_patch_svg",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *_LAZY_ATTRIBUTES})
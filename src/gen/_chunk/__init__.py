@@ -20,6 +20,17 @@ from ._chunk_compiler import (
     compile_chunks_into_circuit,
     ChunkCompiler,
 )
+from ._chunk_compile_cache import (
+    ChunkCompileCache,
+    chunks_content_hash,
+)
+from ._dem_cache import (
+    DemCache,
+    cached_detector_error_model,
+    circuit_content_hash,
+    default_dem_cache,
+    sinter_detector_error_model,
+)
 from ._builder import (
     Builder,
 )
@@ -29,6 +40,7 @@ from ._measurement_tracker import (
 from ._noise import (
     NoiseModel,
     NoiseRule,
+    noisy_circuits_for_noise_sweep,
     occurs_in_classical_control_system,
 )
 from ._patch import (
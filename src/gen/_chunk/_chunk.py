@@ -1,7 +1,8 @@
+import collections
+import hashlib
 import pathlib
 from typing import Iterable, Callable, Literal, TYPE_CHECKING, Union
 
-import sinter
 import stim
 
 from gen._chunk._circuit_util import (
@@ -25,6 +26,11 @@ if TYPE_CHECKING:
     from gen._chunk._chunk_reflow import ChunkReflow
     from gen._chunk._chunk_interface import ChunkInterface
 
+# Hashes of the contents (see `Chunk._verify_flows_key`) of chunks whose circuits were
+# checked to implement their flows, with the most recently used last.
+_VERIFIED_CHUNK_FLOWS: collections.OrderedDict[str, None] = collections.OrderedDict()
+_VERIFIED_CHUNK_FLOWS_MAX_ENTRIES = 100_000
+
 
 class Chunk:
     """A circuit chunk with accompanying stabilizer flow assertions."""
@@ -534,6 +540,8 @@ class Chunk:
         )
 
         if not allow_overlapping_flows:
+            import sinter
+
             for key, group in sinter.group_by(
                 self.flows, key=lambda e: e.key_start
             ).items():
@@ -547,46 +555,7 @@ class Chunk:
                 if key and len(group) > 1:
                     raise ValueError(f"Multiple flows with same non-empty end: {group}")
 
-        unsigned_stim_flows: list[stim.Flow] = []
-        unsigned_indices: list[int] = []
-        signed_stim_flows: list[stim.Flow] = []
-        signed_indices: list[int] = []
-        for k, flow in enumerate(self.flows):
-            inp = stim.PauliString(len(self.q2i))
-            out = stim.PauliString(len(self.q2i))
-            for q, p in flow.start.qubits.items():
-                inp[self.q2i[q]] = p
-            for q, p in flow.end.qubits.items():
-                out[self.q2i[q]] = p
-            if flow.sign:
-                out.sign = -1
-            stim_flow = stim.Flow(
-                input=inp,
-                output=out,
-                measurements=flow.measurement_indices,
-            )
-            if flow.sign is None:
-                unsigned_stim_flows.append(stim_flow)
-                unsigned_indices.append(k)
-            else:
-                signed_stim_flows.append(stim_flow)
-                signed_indices.append(k)
-        if not self.circuit.has_all_flows(
-            unsigned_stim_flows, unsigned=True
-        ) or not self.circuit.has_all_flows(signed_stim_flows):
-            msg = ["Circuit lacks the following flows:"]
-            for k in range(len(unsigned_stim_flows)):
-                if not self.circuit.has_flow(unsigned_stim_flows[k], unsigned=True):
-                    msg.append("    (unsigned) " + str(self.flows[unsigned_indices[k]]))
-            for k in range(len(signed_stim_flows)):
-                if not self.circuit.has_flow(signed_stim_flows[k], unsigned=True):
-                    msg.append(
-                        "    (wanted signed, not even unsigned present) "
-                        + str(self.flows[signed_indices[k]])
-                    )
-                elif not self.circuit.has_flow(signed_stim_flows[k]):
-                    msg.append("    (signed) " + str(self.flows[signed_indices[k]]))
-            raise ValueError("\n".join(msg))
+        self._verify_flows()
 
         if expected_in is not None:
             if isinstance(expected_in, StabilizerCode):
@@ -634,6 +603,60 @@ class Chunk:
             # Creating the interface checks for collisions
             self.end_interface()
 
+    def _verify_flows(self):
+        """Checks that the circuit implements the flows, reusing earlier successful checks."""
+        __tracebackhide__ = True
+        key = self._verify_flows_key()
+        if key in _VERIFIED_CHUNK_FLOWS:
+            _VERIFIED_CHUNK_FLOWS.move_to_end(key)
+            return
+
+        unsigned_indices = [k for k, flow in enumerate(self.flows) if flow.sign is None]
+        signed_indices = [k for k, flow in enumerate(self.flows) if flow.sign is not None]
+        unsigned_stim_flows = [self._to_stim_flow(self.flows[k]) for k in unsigned_indices]
+        signed_stim_flows = [self._to_stim_flow(self.flows[k]) for k in signed_indices]
+        if not self.circuit.has_all_flows(
+            unsigned_stim_flows, unsigned=True
+        ) or not self.circuit.has_all_flows(signed_stim_flows):
+            msg = ["Circuit lacks the following flows:"]
+            for k, stim_flow in zip(unsigned_indices, unsigned_stim_flows):
+                if not self.circuit.has_flow(stim_flow, unsigned=True):
+                    msg.append("    (unsigned) " + str(self.flows[k]))
+            for k, stim_flow in zip(signed_indices, signed_stim_flows):
+                if not self.circuit.has_flow(stim_flow, unsigned=True):
+                    msg.append(
+                        "    (wanted signed, not even unsigned present) "
+                        + str(self.flows[k])
+                    )
+                elif not self.circuit.has_flow(stim_flow):
+                    msg.append("    (signed) " + str(self.flows[k]))
+            raise ValueError("\n".join(msg))
+        _VERIFIED_CHUNK_FLOWS[key] = None
+        while len(_VERIFIED_CHUNK_FLOWS) > _VERIFIED_CHUNK_FLOWS_MAX_ENTRIES:
+            _VERIFIED_CHUNK_FLOWS.popitem(last=False)
+
+    def _verify_flows_key(self) -> str:
+        h = hashlib.sha256()
+        for part in [str(self.circuit), repr(tuple(self.q2i.items())), repr(self.flows)]:
+            h.update(part.encode("utf8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _to_stim_flow(self, flow: Flow) -> stim.Flow:
+        inp = stim.PauliString(len(self.q2i))
+        out = stim.PauliString(len(self.q2i))
+        for q, p in flow.start.qubits.items():
+            inp[self.q2i[q]] = p
+        for q, p in flow.end.qubits.items():
+            out[self.q2i[q]] = p
+        if flow.sign:
+            out.sign = -1
+        return stim.Flow(
+            input=inp,
+            output=out,
+            measurements=flow.measurement_indices,
+        )
+
     def time_reversed(self) -> "Chunk":
         """Checks that this chunk's circuit actually implements its flows."""
 
@@ -0,0 +1,158 @@
+import functools
+import hashlib
+import inspect
+import os
+import pathlib
+from typing import Callable, Iterable, Union
+
+import stim
+
+from gen._chunk._chunk import Chunk
+from gen._chunk._chunk_compiler import compile_chunks_into_circuit
+from gen._chunk._chunk_loop import ChunkLoop
+from gen._chunk._chunk_reflow import ChunkReflow
+from gen._chunk._flow import Flow
+
+CHUNK_COMPILE_CACHE_VERSION = 1
+
+
+def _chunk_content_text(chunk: Union[Chunk, ChunkLoop, ChunkReflow]) -> str:
+    if isinstance(chunk, (Chunk, ChunkReflow)):
+        return repr(chunk)
+    if isinstance(chunk, ChunkLoop):
+        body = ",\n".join(_chunk_content_text(c) for c in chunk.chunks)
+        return f"gen.ChunkLoop(repetitions={chunk.repetitions!r}, chunks=[\n{body}\n])"
+    raise NotImplementedError(f"{chunk=}")
+
+
+def chunks_content_hash(chunks: Iterable[Union[Chunk, ChunkLoop, ChunkReflow]]) -> str:
+    """Returns a hash of the circuits, flows, and discards of a sequence of chunks.
+
+    Chunk sequences with the same hash compile into the same circuit, no matter
+    what code built them.
+    """
+    h = hashlib.sha256()
+    for chunk in chunks:
+        h.update(_chunk_content_text(chunk).encode("utf8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _source_file_hash(path: str) -> str:
+    return hashlib.sha256(pathlib.Path(path).read_bytes()).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _gen_source_hash() -> str:
+    """Hashes the gen package source, so that changes to the compiler invalidate the cache."""
+    root = pathlib.Path(__file__).parent.parent
+    h = hashlib.sha256()
+    for path in sorted(root.glob("**/*.py")):
+        if not path.name.endswith("_test.py"):
+            h.update(str(path.relative_to(root)).encode("utf8"))
+            h.update(_source_file_hash(str(path)).encode("utf8"))
+    return h.hexdigest()
+
+
+def _func_identity(func: Callable | None) -> str:
+    if func is None:
+        return "None"
+    source_file = inspect.getsourcefile(func)
+    source_hash = "" if source_file is None else _source_file_hash(source_file)
+    return f"{func.__module__}:{func.__qualname__}:{source_hash}"
+
+
+class ChunkCompileCache:
+    """Stores compiled circuits on disk, keyed by the content of the compiled chunks.
+
+    The key covers the chunk sequence (see `gen.chunks_content_hash`), the compiler
+    options, the functions passed to the compiler (by name and by the source of
+    their module), and the source of the gen package. Circuits are stored as stim
+    text files, so detector and qubit coordinates are rounded to stim's printing
+    precision (both when first compiled and when loaded).
+    """
+
+    def __init__(self, directory: str | pathlib.Path):
+        """
+        Args:
+            directory: Where to store compiled circuits. Created when first written to.
+        """
+        self.directory = pathlib.Path(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def key(
+        self,
+        chunks: list[Union[Chunk, ChunkLoop]],
+        *,
+        add_mpp_boundaries: bool = False,
+        flow_to_extra_coords_func: Callable[[Flow], Iterable[float]] | None = None,
+        post_process_func: Callable[[stim.Circuit], stim.Circuit] | None = None,
+    ) -> str:
+        """Returns the name the compiled circuit is stored under."""
+        h = hashlib.sha256()
+        for part in [
+            f"version={CHUNK_COMPILE_CACHE_VERSION}",
+            f"gen={_gen_source_hash()}",
+            f"add_mpp_boundaries={add_mpp_boundaries}",
+            f"flow_to_extra_coords_func={_func_identity(flow_to_extra_coords_func)}",
+            f"post_process_func={_func_identity(post_process_func)}",
+            f"chunks={chunks_content_hash(chunks)}",
+        ]:
+            h.update(part.encode("utf8"))
+            h.update(b"\0")
+        return h.hexdigest()[:32]
+
+    def compile(
+        self,
+        chunks: list[Union[Chunk, ChunkLoop]],
+        *,
+        add_mpp_boundaries: bool = False,
+        flow_to_extra_coords_func: Callable[[Flow], Iterable[float]] | None = None,
+        post_process_func: Callable[[stim.Circuit], stim.Circuit] | None = None,
+    ) -> stim.Circuit:
+        """Compiles chunks into a circuit, or loads the result of a previous compilation.
+
+        Args:
+            chunks: Passed to `gen.compile_chunks_into_circuit`.
+            add_mpp_boundaries: Passed to `gen.compile_chunks_into_circuit`.
+            flow_to_extra_coords_func: Passed to `gen.compile_chunks_into_circuit`.
+                Must be a deterministic function.
+            post_process_func: Applied to the compiled circuit before it is stored
+                (e.g. a layer optimization pass). Must be a deterministic function.
+
+        Returns:
+            The compiled (and post-processed) noiseless circuit.
+        """
+        key = self.key(
+            chunks,
+            add_mpp_boundaries=add_mpp_boundaries,
+            flow_to_extra_coords_func=flow_to_extra_coords_func,
+            post_process_func=post_process_func,
+        )
+        path = self.directory / f"{key}.stim"
+        if path.exists():
+            self.hits += 1
+            return stim.Circuit.from_file(path)
+
+        self.misses += 1
+        circuit = compile_chunks_into_circuit(
+            chunks,
+            add_mpp_boundaries=add_mpp_boundaries,
+            **(
+                {}
+                if flow_to_extra_coords_func is None
+                else {"flow_to_extra_coords_func": flow_to_extra_coords_func}
+            ),
+        )
+        if post_process_func is not None:
+            circuit = post_process_func(circuit)
+        text = str(circuit)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            print(text, file=f)
+        os.replace(tmp_path, path)
+        return stim.Circuit(text)
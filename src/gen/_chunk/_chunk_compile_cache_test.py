@@ -0,0 +1,64 @@
+import stim
+
+import gen
+
+
+def _make_chunks(rounds: int) -> list[gen.Chunk | gen.ChunkLoop]:
+    code = gen.StabilizerCode(
+        stabilizers=[
+            gen.Tile(bases="Z", data_qubits=[0, 1], measure_qubit=0.5),
+            gen.Tile(bases="Z", data_qubits=[1, 2], measure_qubit=1.5),
+        ],
+        logicals=[gen.PauliMap({0: "Z"})],
+    )
+    init = code.transversal_init_chunk(basis="Z")
+    return [
+        init,
+        _make_round_chunk(code) * rounds,
+        init.time_reversed(),
+    ]
+
+
+def _make_round_chunk(code: gen.StabilizerCode) -> gen.Chunk:
+    builder = gen.Builder.for_qubits(code.used_set)
+    builder.append("R", code.measure_set)
+    builder.append("TICK")
+    builder.append("CX", [(0, 0.5), (1, 1.5)])
+    builder.append("TICK")
+    builder.append("CX", [(1, 0.5), (2, 1.5)])
+    builder.append("TICK")
+    builder.append("M", code.measure_set)
+    flows = []
+    for tile in code.stabilizers.tiles:
+        m = tile.measure_qubit
+        flows.append(gen.Flow(start=tile, measurement_indices=builder.lookup_recs([m]), center=m))
+        flows.append(gen.Flow(end=tile, measurement_indices=builder.lookup_recs([m]), center=m))
+    flows.append(gen.Flow(start=code.logicals[0], end=code.logicals[0], obs_key=0))
+    return gen.Chunk(circuit=builder.circuit, q2i=builder.q2i, flows=flows)
+
+
+def _double(circuit: stim.Circuit) -> stim.Circuit:
+    return circuit + circuit
+
+
+def test_chunks_content_hash():
+    assert gen.chunks_content_hash(_make_chunks(3)) == gen.chunks_content_hash(_make_chunks(3))
+    assert gen.chunks_content_hash(_make_chunks(3)) != gen.chunks_content_hash(_make_chunks(4))
+
+
+def test_chunk_compile_cache(tmp_path):
+    cache = gen.ChunkCompileCache(tmp_path)
+    expected = gen.compile_chunks_into_circuit(_make_chunks(3), add_mpp_boundaries=True)
+
+    assert cache.compile(_make_chunks(3), add_mpp_boundaries=True) == expected
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert cache.compile(_make_chunks(3), add_mpp_boundaries=True) == expected
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    assert cache.compile(_make_chunks(3), add_mpp_boundaries=True, post_process_func=_double) == expected + expected
+    assert cache.compile(_make_chunks(3)) == gen.compile_chunks_into_circuit(_make_chunks(3))
+    assert cache.compile(_make_chunks(4)) == gen.compile_chunks_into_circuit(_make_chunks(4))
+    assert (cache.hits, cache.misses) == (1, 4)
+
+    assert gen.ChunkCompileCache(tmp_path).compile(_make_chunks(4)) == gen.compile_chunks_into_circuit(_make_chunks(4))
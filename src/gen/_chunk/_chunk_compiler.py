@@ -247,6 +247,46 @@ class ChunkCompiler:
             completed_flows=completed_flows,
         )
 
+    def _relative_flow_state(self) -> frozenset:
+        """Returns a hashable summary of the open flows, relative to the current measurement count.
+
+        Two compiler states with equal summaries compile the same chunks into the same
+        circuit (assuming the qubit and observable indexing is already settled).
+        """
+        return frozenset(
+            (
+                k,
+                v
+                if isinstance(v, str)
+                else (
+                    v.start,
+                    v.end,
+                    tuple(m - self.num_measurements for m in v.measurement_indices),
+                    v.obs_key,
+                    v.flags,
+                    v.center,
+                    v.sign,
+                ),
+            )
+            for k, v in self.open_flows.items()
+        )
+
+    def _shifted_open_flows(
+        self,
+        open_flows: dict[PauliMap | KeyedPauliMap, Union[Flow, Literal["discard"]]],
+        shift: int,
+    ) -> dict[PauliMap | KeyedPauliMap, Union[Flow, Literal["discard"]]]:
+        return {
+            k: (
+                v
+                if isinstance(v, str)
+                else v.with_edits(
+                    measurement_indices=[m + shift for m in v.measurement_indices]
+                )
+            )
+            for k, v in open_flows.items()
+        }
+
     def _append_chunk_loop(
         self,
         *,
@@ -254,23 +294,14 @@ class ChunkCompiler:
     ) -> None:
         past_circuit = self.circuit
 
-        def compute_relative_flow_state():
-            return {
-                k: (
-                    v
-                    if isinstance(v, str)
-                    else v.with_edits(
-                        measurement_indices=[
-                            m - self.num_measurements for m in v.measurement_indices
-                        ]
-                    )
-                )
-                for k, v in self.open_flows.items()
-            }
-
-        iteration_circuits = []
+        # Compiler states seen at the start of each iteration, for detecting when the
+        # iterations start cycling. A state is
+        # (open flows, num measurements, relative flow state).
+        iteration_circuits: list[stim.Circuit] = []
+        states = [(self.open_flows, self.num_measurements, self._relative_flow_state())]
+        seen: dict[int, list[int]] = {hash(states[0][2]): [0]}
         measure_offset_start_of_loop = self.num_measurements
-        prev_rel_flow_state = compute_relative_flow_state()
+        period = 0
         while len(iteration_circuits) < chunk_loop.repetitions:
             # Perform an iteration the hard way.
             self.circuit = stim.Circuit()
@@ -279,47 +310,59 @@ class ChunkCompiler:
             self.circuit.append("TICK")
             iteration_circuits.append(self.circuit)
 
-            # Check if we can fold the rest.
-            new_rel_flow_state = compute_relative_flow_state()
+            # Check if the iterations have started cycling.
+            rel_state = self._relative_flow_state()
+            states.append((self.open_flows, self.num_measurements, rel_state))
             has_pre_loop_measurement = any(
                 m < measure_offset_start_of_loop
                 for flow in self.open_flows.values()
                 if isinstance(flow, Flow)
                 for m in flow.measurement_indices
             )
-            have_reached_steady_state = (
-                not has_pre_loop_measurement
-                and new_rel_flow_state == prev_rel_flow_state
-            )
-            if have_reached_steady_state:
-                break
-            prev_rel_flow_state = new_rel_flow_state
-
-        # Found a repeating iteration.
+            fingerprint = hash(rel_state)
+            if not has_pre_loop_measurement:
+                for prev in reversed(seen.get(fingerprint, [])):
+                    if states[prev][2] == rel_state:
+                        period = len(iteration_circuits) - prev
+                        break
+                if period:
+                    break
+            seen.setdefault(fingerprint, []).append(len(iteration_circuits))
+
+        # Found a repeating cycle of iterations.
         leftover_reps = chunk_loop.repetitions - len(iteration_circuits)
         if leftover_reps > 0:
-            measurements_skipped = (
-                iteration_circuits[-1].num_measurements * leftover_reps
-            )
+            cycle = iteration_circuits[-period:]
+            cycle_measurements = sum(c.num_measurements for c in cycle)
+            full_cycles, extra_iterations = divmod(leftover_reps, period)
 
-            # Fold identical repetitions at the end.
+            # Fold identical cycles at the end.
             while (
-                len(iteration_circuits) > 1
-                and iteration_circuits[-1] == iteration_circuits[-2]
+                len(iteration_circuits) >= 2 * period
+                and iteration_circuits[-2 * period : -period] == cycle
             ):
-                leftover_reps += 1
-                iteration_circuits.pop()
-            iteration_circuits[-1] *= leftover_reps + 1
-
+                full_cycles += 1
+                del iteration_circuits[-period:]
+            cycle_circuit = stim.Circuit()
+            for c in cycle:
+                cycle_circuit += c
+            del iteration_circuits[-period:]
+            iteration_circuits.append(cycle_circuit * (full_cycles + 1))
+
+            # The leftover iterations repeat the start of the cycle.
+            iteration_circuits.extend(cycle[:extra_iterations])
+            if extra_iterations:
+                prev_flows, prev_num_measurements, _ = states[-1 - period + extra_iterations]
+            else:
+                prev_flows, prev_num_measurements, _ = states[-1]
+            measurements_skipped = (
+                cycle_measurements * full_cycles
+                + sum(c.num_measurements for c in cycle[:extra_iterations])
+            )
             self.num_measurements += measurements_skipped
-            self.open_flows = {
-                k: v.with_edits(
-                    measurement_indices=[
-                        m + measurements_skipped for m in v.measurement_indices
-                    ]
-                )
-                for k, v in self.open_flows.items()
-            }
+            self.open_flows = self._shifted_open_flows(
+                prev_flows, self.num_measurements - prev_num_measurements
+            )
 
         # Fuse iterations that happened to be equal.
         self.circuit = past_circuit
@@ -485,6 +528,39 @@ class ChunkCompiler:
         return result, outgoing_discards
 
 
+class _TargetRemap(dict):
+    """Maps gate targets on old qubit indices to the same targets on new qubit indices.
+
+    Entries are created the first time a target is seen, so translating an
+    instruction is one dict lookup per target. Measurement record targets, sweep bit
+    targets, and combiners map to themselves.
+    """
+
+    def __init__(self, i2i: dict[int, int]):
+        super().__init__()
+        self.i2i = i2i
+
+    def __missing__(self, target: stim.GateTarget) -> stim.GateTarget:
+        q = target.qubit_value
+        if q is None:
+            result = target
+        else:
+            q = self.i2i[q]
+            inv = target.is_inverted_result_target
+            if target.is_x_target:
+                result = stim.target_x(q, inv)
+            elif target.is_y_target:
+                result = stim.target_y(q, inv)
+            elif target.is_z_target:
+                result = stim.target_z(q, inv)
+            elif inv:
+                result = stim.target_inv(q)
+            else:
+                result = stim.GateTarget(q)
+        self[target] = result
+        return result
+
+
 def _append_to_circuit_with_reindexing(
     *,
     circuit: stim.Circuit,
@@ -494,26 +570,53 @@ def _append_to_circuit_with_reindexing(
     out: stim.Circuit,
     control_time_shift: bool,
 ) -> None:
-    i2i = {i: new_q2i[q] for q, i in old_q2i.items()}
+    _append_reindexed(
+        circuit=circuit,
+        out=out,
+        remap=_TargetRemap({i: new_q2i[q] for q, i in old_q2i.items()}),
+        repeat_cache={},
+        obs2i=obs2i,
+        control_time_shift=control_time_shift,
+    )
+
 
+def _append_reindexed(
+    *,
+    circuit: stim.Circuit,
+    out: stim.Circuit,
+    remap: _TargetRemap,
+    repeat_cache: dict[str, list[tuple[stim.Circuit, stim.Circuit]]],
+    obs2i: dict[int, int | Literal["discard"]],
+    control_time_shift: bool,
+) -> None:
     det_offset_needed = 0
     for inst in circuit:
-        if inst.name == "REPEAT":
-            block = stim.Circuit()
-            _append_to_circuit_with_reindexing(
-                circuit=inst.body_copy(),
-                old_q2i=old_q2i,
-                new_q2i=new_q2i,
-                out=block,
-                control_time_shift=control_time_shift,
-                obs2i=obs2i,
-            )
+        name = inst.name
+        if name == "REPEAT":
+            # Identical loop bodies (e.g. from repeated chunk loops) are only remapped once.
+            # The text is only a bucket key, since it rounds coordinates.
+            body = inst.body_copy()
+            bucket = repeat_cache.setdefault(str(body), [])
+            for cached_body, block in bucket:
+                if cached_body == body:
+                    break
+            else:
+                block = stim.Circuit()
+                _append_reindexed(
+                    circuit=body,
+                    out=block,
+                    remap=remap,
+                    repeat_cache=repeat_cache,
+                    obs2i=obs2i,
+                    control_time_shift=control_time_shift,
+                )
+                bucket.append((body, block))
             out.append(
                 stim.CircuitRepeatBlock(repeat_count=inst.repeat_count, body=block)
             )
-        elif inst.name == "QUBIT_COORDS":
+        elif name == "QUBIT_COORDS":
             continue
-        elif inst.name == "SHIFT_COORDS":
+        elif name == "SHIFT_COORDS":
             if control_time_shift:
                 args = inst.gate_args_copy()
                 if len(args) > 2:
@@ -521,37 +624,20 @@ def _append_to_circuit_with_reindexing(
                     out.append("SHIFT_COORDS", [], [0, 0, args[2]])
             else:
                 out.append(inst)
-        elif inst.name == "OBSERVABLE_INCLUDE":
+        elif name == "OBSERVABLE_INCLUDE":
             (obs_index,) = inst.gate_args_copy()
             obs_index = int(round(obs_index))
             obs_index = obs2i.get(obs_index, obs_index)
             if obs_index != "discard":
                 out.append("OBSERVABLE_INCLUDE", inst.targets_copy(), obs_index)
-        elif inst.name == "DETECTOR":
+        elif name == "DETECTOR":
             args = inst.gate_args_copy()
             t = args[2] if len(args) > 2 else 0
             det_offset_needed = max(det_offset_needed, t + 1)
             out.append(inst)
         else:
-            targets = []
-            for t in inst.targets_copy():
-                if t.is_qubit_target:
-                    targets.append(i2i[t.value])
-                elif t.is_x_target:
-                    targets.append(stim.target_x(i2i[t.value]))
-                elif t.is_y_target:
-                    targets.append(stim.target_y(i2i[t.value]))
-                elif t.is_z_target:
-                    targets.append(stim.target_z(i2i[t.value]))
-                elif t.is_combiner:
-                    targets.append(t)
-                elif t.is_measurement_record_target:
-                    targets.append(t)
-                elif t.is_sweep_bit_target:
-                    targets.append(t)
-                else:
-                    raise NotImplementedError(f"{inst=}")
-            out.append(inst.name, targets, inst.gate_args_copy())
+            targets = inst.targets_copy()
+            out.append(name, list(map(remap.__getitem__, targets)), inst.gate_args_copy())
 
     if control_time_shift and det_offset_needed > 0:
         out.append("SHIFT_COORDS", [], (0, 0, det_offset_needed))
@@ -1,6 +1,7 @@
 import stim
 
 import gen
+from gen._chunk._chunk_compiler import _append_to_circuit_with_reindexing
 
 
 def test_chunk_compiler_q2i():
@@ -647,3 +648,112 @@ def test_drop_observable_later():
         OBSERVABLE_INCLUDE(0) rec[-1]
     """
     )
+
+
+def test_append_to_circuit_with_reindexing():
+    out = stim.Circuit()
+    _append_to_circuit_with_reindexing(
+        circuit=stim.Circuit(
+            """
+            QUBIT_COORDS(0, 0) 0
+            QUBIT_COORDS(1, 0) 1
+            QUBIT_COORDS(2, 0) 2
+            H 0 1 2
+            M 0 !1
+            CX rec[-1] 2 sweep[0] 0
+            MPP X0*!Y1*Z2
+            REPEAT 2 {
+                REPEAT 3 {
+                    CZ 0 1
+                }
+                REPEAT 3 {
+                    CZ 0 1
+                }
+                MR !2
+                DETECTOR(2, 0, 0) rec[-1]
+            }
+            OBSERVABLE_INCLUDE(0) rec[-1]
+            """
+        ),
+        old_q2i={0: 0, 1: 1, 2: 2},
+        new_q2i={0: 5, 1: 3, 2: 4},
+        obs2i={},
+        out=out,
+        control_time_shift=False,
+    )
+    assert out == stim.Circuit(
+        """
+        H 5 3 4
+        M 5 !3
+        CX rec[-1] 4 sweep[0] 5
+        MPP X5*!Y3*Z4
+        REPEAT 2 {
+            REPEAT 3 {
+                CZ 5 3
+            }
+            REPEAT 3 {
+                CZ 5 3
+            }
+            MR !4
+            DETECTOR(2, 0, 0) rec[-1]
+        }
+        OBSERVABLE_INCLUDE(0) rec[-1]
+        """
+    )
+
+
+def test_chunk_loop_with_period_2_steady_state():
+    # The sign of the flow through qubit 0 alternates, so the flow state only repeats every
+    # second iteration.
+    init = gen.Chunk(
+        circuit=stim.Circuit(
+            """
+            QUBIT_COORDS(0, 0) 0
+            QUBIT_COORDS(1, 0) 1
+            R 0
+        """
+        ),
+        flows=[gen.Flow(end=gen.PauliMap(zs=[0]), center=0, sign=False)],
+    )
+    step = gen.Chunk(
+        circuit=stim.Circuit(
+            """
+            QUBIT_COORDS(0, 0) 0
+            QUBIT_COORDS(1, 0) 1
+            X 0
+            R 1
+            M 1
+        """
+        ),
+        flows=[
+            gen.Flow(start=gen.PauliMap(zs=[0]), end=gen.PauliMap(zs=[0]), center=0, sign=True),
+            gen.Flow(measurement_indices=[0], center=1, sign=False),
+        ],
+    )
+    end = gen.Chunk(
+        circuit=stim.Circuit(
+            """
+            QUBIT_COORDS(0, 0) 0
+            QUBIT_COORDS(1, 0) 1
+            M 0
+        """
+        ),
+        flows=[gen.Flow(start=gen.PauliMap(zs=[0]), measurement_indices=[0], center=0, sign=False)],
+    )
+
+    for repetitions in [1, 2, 3, 10, 11, 1000, 1001]:
+        compiler = gen.ChunkCompiler()
+        compiler.append(init)
+        appended = []
+        append_chunk = compiler._append_chunk
+        compiler._append_chunk = lambda *, chunk: appended.append(chunk) or append_chunk(chunk=chunk)
+        compiler.append(gen.ChunkLoop([step], repetitions=repetitions))
+        assert len(appended) == min(repetitions, 2)
+        (flow,) = compiler.open_flows.values()
+        assert flow.sign == (repetitions % 2 == 1)
+        compiler.append(end)
+        circuit = compiler.finish_circuit()
+
+        unrolled = gen.compile_chunks_into_circuit([init, *[step] * repetitions, end])
+        assert circuit.flattened() == unrolled.flattened()
+        assert len(str(circuit)) < 1000
@@ -1,6 +1,8 @@
+import pytest
 import stim
 
 import gen
+from gen._chunk._chunk import _VERIFIED_CHUNK_FLOWS
 
 
 def test_inverse_flows():
@@ -496,3 +498,41 @@ def test_chunk_mpp_init_chunk():
     )
     c2 = chunk.mpp_init_chunk()
     c2.verify()
+
+
+def test_verify_caches_successes_only(monkeypatch):
+    def make_chunk(sign: bool) -> gen.Chunk:
+        return gen.Chunk(
+            circuit=stim.Circuit(
+                """
+                QUBIT_COORDS(0, 0) 0
+                X 0
+                M 0
+            """
+            ),
+            flows=[
+                gen.Flow(start=gen.PauliMap(zs=[0]), measurement_indices=[0], center=0, sign=sign),
+            ],
+        )
+
+    good = make_chunk(sign=True)
+    _VERIFIED_CHUNK_FLOWS.pop(good._verify_flows_key(), None)
+    good.verify()
+    assert make_chunk(sign=True)._verify_flows_key() in _VERIFIED_CHUNK_FLOWS
+    make_chunk(sign=True).verify()
+
+    bad = make_chunk(sign=False)
+    for _ in range(2):
+        with pytest.raises(ValueError, match="(signed)"):
+            bad.verify()
+    assert bad._verify_flows_key() not in _VERIFIED_CHUNK_FLOWS
+
+    # The cache keeps hashes instead of circuits, and forgets the least recently used ones.
+    assert isinstance(good._verify_flows_key(), str)
+    monkeypatch.setattr(gen._chunk._chunk, "_VERIFIED_CHUNK_FLOWS_MAX_ENTRIES", 1)
+    other = gen.Chunk(
+        circuit=stim.Circuit("QUBIT_COORDS(0, 0) 0\nM 0"),
+        flows=[gen.Flow(start=gen.PauliMap(zs=[0]), measurement_indices=[0], center=0)],
+    )
+    other.verify()
+    assert list(_VERIFIED_CHUNK_FLOWS) == [other._verify_flows_key()]
@@ -0,0 +1,197 @@
+import collections
+import hashlib
+import os
+import pathlib
+
+import stim
+
+DEM_CACHE_VERSION = 1
+DEM_CACHE_ENV_VAR = "GEN_DEM_CACHE_DIR"
+
+
+def _append_exact_args(circuit: stim.Circuit, out: list[str]) -> None:
+    for inst in circuit:
+        if isinstance(inst, stim.CircuitRepeatBlock):
+            _append_exact_args(inst.body_copy(), out)
+        else:
+            args = inst.gate_args_copy()
+            if args:
+                out.append(repr(args))
+
+
+def circuit_content_hash(circuit: stim.Circuit) -> str:
+    """Returns a hash of a circuit's text and (unrounded) gate arguments.
+
+    The text of a circuit rounds gate arguments such as noise probabilities, so the
+    exact arguments are hashed as well.
+    """
+    h = hashlib.sha256()
+    h.update(str(circuit).encode("utf8"))
+    exact_args: list[str] = []
+    _append_exact_args(circuit, exact_args)
+    for args in exact_args:
+        h.update(b"\0")
+        h.update(args.encode("utf8"))
+    return h.hexdigest()
+
+
+class DemCache:
+    """Caches the detector error models of circuits, in memory and optionally on disk.
+
+    Entries are keyed by the content of the circuit (see `gen.circuit_content_hash`) and
+    the options passed to `stim.Circuit.detector_error_model`. The most recently used
+    models are kept in memory. When a directory is given, models are also stored there
+    as `.dem` files (which store probabilities exactly), so that other processes and
+    tools can load them instead of recomputing them.
+    """
+
+    def __init__(
+        self,
+        directory: str | pathlib.Path | None = None,
+        *,
+        max_entries: int = 8,
+    ):
+        """
+        Args:
+            directory: Where to store detector error models. Created when first written
+                to. When not set, models are only cached in memory.
+            max_entries: The number of detector error models to keep in memory.
+        """
+        self.directory = None if directory is None else pathlib.Path(directory)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: collections.OrderedDict[str, stim.DetectorErrorModel] = (
+            collections.OrderedDict()
+        )
+
+    def key(
+        self,
+        circuit: stim.Circuit,
+        *,
+        decompose_errors: bool = False,
+        flatten_loops: bool = False,
+        allow_gauge_detectors: bool = False,
+        approximate_disjoint_errors: bool = False,
+        ignore_decomposition_failures: bool = False,
+        block_decomposition_from_introducing_remnant_edges: bool = False,
+    ) -> str:
+        """Returns the name the detector error model of a circuit is stored under."""
+        h = hashlib.sha256()
+        for part in [
+            f"version={DEM_CACHE_VERSION}",
+            f"decompose_errors={decompose_errors}",
+            f"flatten_loops={flatten_loops}",
+            f"allow_gauge_detectors={allow_gauge_detectors}",
+            f"approximate_disjoint_errors={approximate_disjoint_errors}",
+            f"ignore_decomposition_failures={ignore_decomposition_failures}",
+            f"block_decomposition_from_introducing_remnant_edges={block_decomposition_from_introducing_remnant_edges}",
+            f"circuit={circuit_content_hash(circuit)}",
+        ]:
+            h.update(part.encode("utf8"))
+            h.update(b"\0")
+        return h.hexdigest()[:32]
+
+    def detector_error_model(
+        self,
+        circuit: stim.Circuit,
+        *,
+        decompose_errors: bool = False,
+        flatten_loops: bool = False,
+        allow_gauge_detectors: bool = False,
+        approximate_disjoint_errors: bool = False,
+        ignore_decomposition_failures: bool = False,
+        block_decomposition_from_introducing_remnant_edges: bool = False,
+    ) -> stim.DetectorErrorModel:
+        """Returns `circuit.detector_error_model(...)`, loading it from the cache if possible.
+
+        The returned model is a copy, so it can be modified without affecting the cache.
+        """
+        options = dict(
+            decompose_errors=decompose_errors,
+            flatten_loops=flatten_loops,
+            allow_gauge_detectors=allow_gauge_detectors,
+            approximate_disjoint_errors=approximate_disjoint_errors,
+            ignore_decomposition_failures=ignore_decomposition_failures,
+            block_decomposition_from_introducing_remnant_edges=block_decomposition_from_introducing_remnant_edges,
+        )
+        key = self.key(circuit, **options)
+        dem = self._entries.get(key)
+        if dem is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return dem.copy()
+
+        path = None if self.directory is None else self.directory / f"{key}.dem"
+        if path is not None and path.exists():
+            self.disk_hits += 1
+            dem = stim.DetectorErrorModel.from_file(path)
+        else:
+            self.misses += 1
+            dem = circuit.detector_error_model(**options)
+            if path is not None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                dem.to_file(tmp_path)
+                os.replace(tmp_path, path)
+        self._entries[key] = dem
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return dem.copy()
+
+
+_default_dem_cache: DemCache | None = None
+
+
+def default_dem_cache() -> DemCache:
+    """Returns the process-wide DEM cache.
+
+    The cache is stored on disk in the directory given by the GEN_DEM_CACHE_DIR
+    environment variable, if it is set, and otherwise only in memory.
+    """
+    global _default_dem_cache
+    if _default_dem_cache is None:
+        _default_dem_cache = DemCache(os.environ.get(DEM_CACHE_ENV_VAR) or None)
+    return _default_dem_cache
+
+
+def cached_detector_error_model(
+    circuit: stim.Circuit,
+    *,
+    decompose_errors: bool = False,
+    flatten_loops: bool = False,
+    allow_gauge_detectors: bool = False,
+    approximate_disjoint_errors: bool = False,
+    ignore_decomposition_failures: bool = False,
+    block_decomposition_from_introducing_remnant_edges: bool = False,
+) -> stim.DetectorErrorModel:
+    """Returns `circuit.detector_error_model(...)`, using the process-wide DEM cache."""
+    return default_dem_cache().detector_error_model(
+        circuit,
+        decompose_errors=decompose_errors,
+        flatten_loops=flatten_loops,
+        allow_gauge_detectors=allow_gauge_detectors,
+        approximate_disjoint_errors=approximate_disjoint_errors,
+        ignore_decomposition_failures=ignore_decomposition_failures,
+        block_decomposition_from_introducing_remnant_edges=block_decomposition_from_introducing_remnant_edges,
+    )
+
+
+def sinter_detector_error_model(circuit: stim.Circuit) -> stim.DetectorErrorModel:
+    """Returns the detector error model that sinter makes for a circuit, using the process-wide DEM cache.
+
+    Like sinter, falls back to not decomposing errors when decomposition fails, and then
+    to flattening loops.
+    """
+    try:
+        return cached_detector_error_model(
+            circuit, decompose_errors=True, approximate_disjoint_errors=True
+        )
+    except ValueError:
+        try:
+            return cached_detector_error_model(circuit, approximate_disjoint_errors=True)
+        except ValueError:
+            return cached_detector_error_model(
+                circuit, approximate_disjoint_errors=True, flatten_loops=True
+            )
@@ -0,0 +1,66 @@
+import stim
+
+import gen
+
+
+def _circuit(p: float) -> stim.Circuit:
+    return stim.Circuit.generated("repetition_code:memory", distance=3, rounds=3, before_round_data_depolarization=p)
+
+
+def test_circuit_content_hash():
+    assert gen.circuit_content_hash(_circuit(0.01)) == gen.circuit_content_hash(_circuit(0.01))
+    assert gen.circuit_content_hash(_circuit(0.01)) != gen.circuit_content_hash(_circuit(0.02))
+    # Differences hidden by the rounding of the circuit's text still matter.
+    assert str(_circuit(0.01)) == str(_circuit(0.0100000001))
+    assert gen.circuit_content_hash(_circuit(0.01)) != gen.circuit_content_hash(_circuit(0.0100000001))
+
+
+def test_dem_cache(tmp_path):
+    cache = gen.DemCache(tmp_path, max_entries=2)
+    expected = _circuit(0.01).detector_error_model()
+    dem = cache.detector_error_model(_circuit(0.01))
+    assert dem == expected
+    dem.append("error", [0.25], [stim.target_relative_detector_id(0)])
+    assert cache.detector_error_model(_circuit(0.01)) == expected
+    assert (cache.hits, cache.disk_hits, cache.misses) == (1, 0, 1)
+
+    assert cache.detector_error_model(_circuit(0.01), flatten_loops=True) == _circuit(0.01).detector_error_model(flatten_loops=True)
+    assert cache.detector_error_model(_circuit(0.02)) == _circuit(0.02).detector_error_model()
+    assert (cache.hits, cache.disk_hits, cache.misses) == (1, 0, 3)
+    assert len(list(tmp_path.iterdir())) == 3
+
+    # Evicted from memory, but still on disk.
+    assert cache.detector_error_model(_circuit(0.01)) == expected
+    assert (cache.hits, cache.disk_hits, cache.misses) == (1, 1, 3)
+
+    # Other processes load the stored models.
+    other = gen.DemCache(tmp_path)
+    assert other.detector_error_model(_circuit(0.02)) == _circuit(0.02).detector_error_model()
+    assert (other.hits, other.disk_hits, other.misses) == (0, 1, 0)
+
+
+def test_cached_detector_error_model():
+    assert gen.cached_detector_error_model(_circuit(0.03)) == _circuit(0.03).detector_error_model()
+    assert gen.cached_detector_error_model(_circuit(0.03)) == _circuit(0.03).detector_error_model()
+    assert gen.default_dem_cache() is gen.default_dem_cache()
+
+
+def test_sinter_detector_error_model():
+    circuit = _circuit(0.03)
+    assert gen.sinter_detector_error_model(circuit) == circuit.detector_error_model(
+        decompose_errors=True, approximate_disjoint_errors=True
+    )
+
+    # Errors flipping three detectors can't be decomposed, so sinter doesn't decompose.
+    circuit = stim.Circuit(
+        """
+        X_ERROR(0.125) 0
+        M 0
+        DETECTOR rec[-1]
+        DETECTOR rec[-1]
+        DETECTOR rec[-1]
+    """
+    )
+    assert gen.sinter_detector_error_model(circuit) == circuit.detector_error_model(
+        approximate_disjoint_errors=True
+    )
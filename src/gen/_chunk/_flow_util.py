@@ -1,17 +1,24 @@
-import dataclasses
-from typing import Iterable, Callable
+from typing import Iterable
 
+import numpy as np
 import stim
 
 from ._flow import Flow
 
+_PAULI_TO_XZ = {"X": (1, 0), "Y": (1, 1), "Z": (0, 1)}
 
-@dataclasses.dataclass
-class _FlowRow:
-    inp: stim.PauliString
-    meas: set[int]
-    out: stim.PauliString
-    key: int | None
+
+def _pivot_columns(xs: np.ndarray, zs: np.ndarray) -> np.ndarray:
+    """Returns the bits that the elimination pivots on, two per qubit.
+
+    For each qubit, the first bit is set by X or Z terms and the second bit is set by
+    Y or Z terms. Both bits are linear in the (x, z) bits, so multiplying rows is
+    still xoring them.
+    """
+    result = np.empty(shape=(xs.shape[0], xs.shape[1] * 2), dtype=np.bool_)
+    result[:, 0::2] = xs ^ zs
+    result[:, 1::2] = zs
+    return result
 
 
 def solve_flow_auto_measurements(
@@ -22,70 +29,69 @@ def solve_flow_auto_measurements(
         # Skip solving for the generators, when it's not needed.
         return tuple(flows)
 
-    # Create a table of the circuit's stabilizer flow generators.
-    table: list[_FlowRow] = []
+    # Create a table of the circuit's stabilizer flow generators, followed by the
+    # flows-to-be-solved.
     num_qubits = circuit.num_qubits
-    for flow in circuit.flow_generators():
+    num_measurements = circuit.num_measurements
+    generators = circuit.flow_generators()
+    keys: list[int | None] = [None] * len(generators)
+    keys += [k for k in range(len(flows)) if flows[k].measurement_indices == "auto"]
+    num_rows = len(keys)
+    inp_xs = np.zeros(shape=(num_rows, num_qubits), dtype=np.bool_)
+    inp_zs = np.zeros(shape=(num_rows, num_qubits), dtype=np.bool_)
+    out_xs = np.zeros(shape=(num_rows, num_qubits), dtype=np.bool_)
+    out_zs = np.zeros(shape=(num_rows, num_qubits), dtype=np.bool_)
+    meas = np.zeros(shape=(num_rows, num_measurements), dtype=np.bool_)
+    for row, flow in enumerate(generators):
         inp = flow.input_copy()
         out = flow.output_copy()
-        if len(inp) == 0:
-            inp = stim.PauliString(num_qubits)
-        if len(out) == 0:
-            out = stim.PauliString(num_qubits)
-        table.append(
-            _FlowRow(
-                inp=inp,
-                meas=set(flow.measurements_copy()),
-                out=out,
-                key=None,
-            )
-        )
-
-    # Append flows-to-be-solved to the end of the table.
-    for k in range(len(flows)):
-        if flows[k].measurement_indices == "auto":
-            inp = stim.PauliString(num_qubits)
-            for q, p in flows[k].start.qubits.items():
-                inp[q2i[q]] = p
-            out = stim.PauliString(num_qubits)
-            for q, p in flows[k].end.qubits.items():
-                out[q2i[q]] = p
-            table.append(_FlowRow(inp=inp, meas=set(), out=out, key=k))
+        if len(inp):
+            inp_xs[row, : len(inp)], inp_zs[row, : len(inp)] = inp.to_numpy()
+        if len(out):
+            out_xs[row, : len(out)], out_zs[row, : len(out)] = out.to_numpy()
+        meas[row, flow.measurements_copy()] = True
+    for row in range(len(generators), num_rows):
+        flow = flows[keys[row]]
+        for q, p in flow.start.qubits.items():
+            inp_xs[row, q2i[q]], inp_zs[row, q2i[q]] = _PAULI_TO_XZ[p]
+        for q, p in flow.end.qubits.items():
+            out_xs[row, q2i[q]], out_zs[row, q2i[q]] = _PAULI_TO_XZ[p]
 
-    def partial_elim(predicate: Callable[[_FlowRow], bool]):
-        nonlocal num_solved
-        for k2 in range(num_solved, len(table)):
-            if predicate(table[k2]):
-                pivot = k2
-                break
-        else:
-            return
-
-        for k2 in range(len(table)):
-            if k2 != pivot and predicate(table[k2]):
-                table[k2].inp *= table[pivot].inp
-                table[k2].meas ^= table[pivot].meas
-                table[k2].out *= table[pivot].out
-        t0 = table[pivot]
-        t1 = table[num_solved]
-        table[pivot] = t1
-        table[num_solved] = t0
-        num_solved += 1
+    # Pack each row of [input pivot bits, output pivot bits, measurements] into
+    # 64 bit words (little endian, so column c is bit c%64 of word c//64).
+    bits = np.concatenate(
+        [_pivot_columns(inp_xs, inp_zs), _pivot_columns(out_xs, out_zs), meas],
+        axis=1,
+    )
+    num_pauli_cols = num_qubits * 4
+    num_words = (bits.shape[1] + 63) // 64
+    padded = np.zeros(shape=(num_rows, num_words * 64), dtype=np.bool_)
+    padded[:, : bits.shape[1]] = bits
+    table = np.packbits(padded, axis=1, bitorder="little").view("<u8")
 
     # Perform Gaussian elimination on the table.
     num_solved = 0
-    for q in range(num_qubits):
-        partial_elim(lambda f: f.inp[q] & 1)
-        partial_elim(lambda f: f.inp[q] & 2)
-    for q in range(num_qubits):
-        partial_elim(lambda f: f.out[q] & 1)
-        partial_elim(lambda f: f.out[q] & 2)
+    for col in range(num_pauli_cols):
+        word = col // 64
+        mask = np.uint64(1 << (col % 64))
+        hits = np.flatnonzero(table[:, word] & mask)
+        candidates = hits[hits >= num_solved]
+        if len(candidates) == 0:
+            continue
+        pivot = candidates[0]
+        table[hits[hits != pivot]] ^= table[pivot]
+        if pivot != num_solved:
+            table[[pivot, num_solved]] = table[[num_solved, pivot]]
+            keys[pivot], keys[num_solved] = keys[num_solved], keys[pivot]
+        num_solved += 1
 
     # Find the flow-to-be-solved rows in the table; now solved.
-    for t in table:
-        if t.key is not None:
-            if t.inp.weight > 0 or t.out.weight > 0:
-                raise ValueError(f"Failed to solve {flows[t.key]}")
-            flows[t.key] = flows[t.key].with_edits(measurement_indices=t.meas)
+    solved = np.unpackbits(table.view(np.uint8), axis=1, bitorder="little")
+    for row, key in enumerate(keys):
+        if key is not None:
+            if np.any(solved[row, :num_pauli_cols]):
+                raise ValueError(f"Failed to solve {flows[key]}")
+            measurements = np.flatnonzero(solved[row, num_pauli_cols : bits.shape[1]])
+            flows[key] = flows[key].with_edits(measurement_indices=measurements.tolist())
 
     return tuple(flows)
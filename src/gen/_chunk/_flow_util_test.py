@@ -1,3 +1,4 @@
+import pytest
 import stim
 
 import gen
@@ -33,3 +34,55 @@ def test_solve_flow_auto_measurements():
             ),
         )
     )
+
+
+def test_solve_flow_auto_measurements_mixed_bases():
+    circuit = stim.Circuit(
+        """
+        MY 0
+        RY 0
+        MX 1
+        MZ 2
+    """
+    )
+    q2i = {0: 0, 1: 1, 2: 2}
+    solved = solve_flow_auto_measurements(
+        flows=[
+            gen.Flow(
+                start=gen.PauliMap({"Y": [0]}),
+                measurement_indices="auto",
+                center=0,
+            ),
+            gen.Flow(
+                end=gen.PauliMap({"Y": [0]}),
+                measurement_indices="auto",
+                center=0,
+            ),
+            gen.Flow(
+                start=gen.PauliMap({"X": [1], "Z": [2]}),
+                measurement_indices="auto",
+                center=1,
+            ),
+            gen.Flow(
+                start=gen.PauliMap({"Z": [2]}),
+                measurement_indices=[2],
+                center=2,
+            ),
+        ],
+        circuit=circuit,
+        q2i=q2i,
+    )
+    assert [flow.measurement_indices for flow in solved] == [(0,), (), (1, 2), (2,)]
+
+    with pytest.raises(ValueError, match="Failed to solve"):
+        solve_flow_auto_measurements(
+            flows=[
+                gen.Flow(
+                    start=gen.PauliMap({"X": [2]}),
+                    measurement_indices="auto",
+                    center=2,
+                ),
+            ],
+            circuit=circuit,
+            q2i=q2i,
+        )
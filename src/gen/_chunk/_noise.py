@@ -1,5 +1,5 @@
 import collections
-from typing import Iterator, AbstractSet, DefaultDict, Any
+from typing import Iterator, AbstractSet, DefaultDict, Any, Iterable, Sequence
 
 import stim
 
@@ -27,6 +27,7 @@ OP_TO_MEASURE_BASES = {
     "MZZ": "ZZ",
     "MPP": "*",
 }
+NOISY_MOMENT_CACHE_MAX_ENTRIES = 10_000
 
 
 class NoiseRule:
@@ -99,7 +100,7 @@ class NoiseRule:
             args = [self.flip_result]
 
         out_during_moment.append(split_op.name, targets, args)
-        raw_targets = [t.value for t in targets if not t.is_combiner]
+        raw_targets = _qubit_targets(t.value for t in targets if not t.is_combiner)
         for op_name, arg in self.before.items():
             before_moments[(op_name, arg)].append(op_name, raw_targets, arg)
         for op_name, arg in self.after.items():
@@ -107,6 +108,16 @@ class NoiseRule:
 
 
 class NoiseModel:
+    """Describes how to add noise to a circuit.
+
+    A noise model remembers the noisy versions of the (up to 10000) moments it most
+    recently added noise to, so
+    that repeated moments (e.g. the rounds of a memory experiment, or the same
+    moments in other circuits) are only made noisy once. The cache lives as long as
+    the model, so don't modify a noise model's attributes after using it; make a
+    new noise model instead.
+    """
+
     def __init__(
         self,
         idle_depolarization: float = 0,
@@ -141,6 +152,12 @@ class NoiseModel:
             allow_multiple_uses_of_a_qubit_in_one_tick
         )
         assert self.tick_noise is None or not self.tick_noise.flip_result
+        # Noisy versions of recently seen moments, keyed by the moment's operations
+        # and its system and immune qubits, with the most recently used last.
+        self._noisy_moment_cache: collections.OrderedDict[
+            tuple,
+            tuple[stim.Circuit, tuple[stim.Circuit, ...], stim.Circuit],
+        ] = collections.OrderedDict()
 
     @staticmethod
     def si1000(p: float) -> "NoiseModel":
@@ -314,7 +331,7 @@ class NoiseModel:
             - immune_qubit_indices
         )
         if idle and self.idle_depolarization:
-            out.append("DEPOLARIZE1", idle, self.idle_depolarization)
+            out.append("DEPOLARIZE1", _qubit_targets(idle), self.idle_depolarization)
 
         waiting_for_mr = sorted(
             system_qubit_indices - collapse_qubits_set - immune_qubit_indices
@@ -325,86 +342,156 @@ class NoiseModel:
             and self.additional_depolarization_waiting_for_m_or_r
         ):
             out.append(
-                "DEPOLARIZE1", idle, self.additional_depolarization_waiting_for_m_or_r
+                "DEPOLARIZE1",
+                _qubit_targets(idle),
+                self.additional_depolarization_waiting_for_m_or_r,
             )
 
         if self.tick_noise is not None:
+            tick_targets = _qubit_targets(system_qubit_indices - immune_qubit_indices)
             for k, p in self.tick_noise.before.items():
-                out.append(k, system_qubit_indices - immune_qubit_indices, p)
+                out.append(k, tick_targets, p)
             for k, p in self.tick_noise.after.items():
-                out.append(k, system_qubit_indices - immune_qubit_indices, p)
+                out.append(k, tick_targets, p)
 
     def _append_noisy_moment(
         self,
         *,
-        moment_split_ops: list[stim.CircuitInstruction],
+        circuit: stim.Circuit,
+        start: int,
+        moment_ops: tuple[stim.CircuitInstruction, ...],
         out: stim.Circuit,
+        system_qubits_indices: frozenset[int],
+        immune_qubit_indices: frozenset[int],
+    ) -> None:
+        # Annotations don't affect the noise, so moments that only differ in their
+        # annotations (e.g. the detectors of different rounds) share a cache entry.
+        gate_ops = tuple(op for op in moment_ops if op.name not in ANNOTATION_OPS)
+        key = (gate_ops, system_qubits_indices, immune_qubit_indices)
+        noisy_moment = self._noisy_moment_cache.get(key)
+        if noisy_moment is None:
+            noisy_moment = self._make_noisy_moment(
+                moment_ops=moment_ops,
+                system_qubits_indices=system_qubits_indices,
+                immune_qubit_indices=immune_qubit_indices,
+            )
+            self._noisy_moment_cache[key] = noisy_moment
+            if len(self._noisy_moment_cache) > NOISY_MOMENT_CACHE_MAX_ENTRIES:
+                self._noisy_moment_cache.popitem(last=False)
+        else:
+            self._noisy_moment_cache.move_to_end(key)
+
+        # Annotations are copied over in runs, by slicing the circuit, because
+        # appending them one by one is slow.
+        before, during, after = noisy_moment
+        out += before
+        k = 0
+        annotations_start = start
+        for index, op in enumerate(moment_ops, start=start):
+            if op.name not in ANNOTATION_OPS:
+                if annotations_start < index:
+                    out += circuit[annotations_start:index]
+                out += during[k]
+                k += 1
+                annotations_start = index + 1
+        if annotations_start < start + len(moment_ops):
+            out += circuit[annotations_start : start + len(moment_ops)]
+        out += after
+
+    def _make_noisy_moment(
+        self,
+        *,
+        moment_ops: tuple[stim.CircuitInstruction, ...],
         system_qubits_indices: AbstractSet[int],
         immune_qubit_indices: AbstractSet[int],
-    ) -> None:
+    ) -> tuple[stim.Circuit, tuple[stim.Circuit, ...], stim.Circuit]:
+        """Determines the noisy version of a moment.
+
+        Returns:
+            A (before, during, after) tuple. `before` and `after` are the noise
+            placed before and after the moment's operations. `during` has the
+            noisy version of each non-annotation operation of the moment.
+        """
+        gate_split_ops = [
+            list(_split_targets_if_needed(op, immune_qubit_indices))
+            for op in moment_ops
+            if op.name not in ANNOTATION_OPS
+        ]
         skip_pauli_targets = set()
-        for split_op in moment_split_ops:
-            gate_data = stim.gate_data(split_op.name)
-            if (
-                gate_data.is_unitary
-                and gate_data.is_single_qubit_gate
-                and not split_op.name in "IXYZ"
-            ):
-                for t in split_op.targets_copy():
-                    skip_pauli_targets.add(t.qubit_value)
+        for split_ops in gate_split_ops:
+            for split_op in split_ops:
+                gate_data = stim.gate_data(split_op.name)
+                if (
+                    gate_data.is_unitary
+                    and gate_data.is_single_qubit_gate
+                    and not split_op.name in "IXYZ"
+                ):
+                    for t in split_op.targets_copy():
+                        skip_pauli_targets.add(t.qubit_value)
 
         before = collections.defaultdict(stim.Circuit)
         after = collections.defaultdict(stim.Circuit)
-        grow = stim.Circuit()
-        for split_op in moment_split_ops:
-            rule = self._noise_rule_for_split_operation(split_op=split_op)
-            if rule is None:
-                grow.append(split_op)
-            elif split_op.name in "IXYZ":
-                new_targets = []
-                skipped_targets = []
-                for t in split_op.targets_copy():
-                    if t.qubit_value in skip_pauli_targets:
-                        skipped_targets.append(t)
-                    else:
-                        new_targets.append(t)
-                        skip_pauli_targets.add(t.qubit_value)
-                if skipped_targets:
-                    grow.append(
-                        stim.CircuitInstruction(
-                            split_op.name, skipped_targets, split_op.gate_args_copy()
+        during = []
+        for split_ops in gate_split_ops:
+            grow = stim.Circuit()
+            for split_op in split_ops:
+                rule = self._noise_rule_for_split_operation(split_op=split_op)
+                if rule is None:
+                    grow.append(split_op)
+                elif split_op.name in "IXYZ":
+                    new_targets = []
+                    skipped_targets = []
+                    for t in split_op.targets_copy():
+                        if t.qubit_value in skip_pauli_targets:
+                            skipped_targets.append(t)
+                        else:
+                            new_targets.append(t)
+                            skip_pauli_targets.add(t.qubit_value)
+                    if skipped_targets:
+                        grow.append(
+                            stim.CircuitInstruction(
+                                split_op.name,
+                                skipped_targets,
+                                split_op.gate_args_copy(),
+                            )
                         )
-                    )
-                if new_targets:
+                    if new_targets:
+                        rule.append_noisy_version_of(
+                            split_op=stim.CircuitInstruction(
+                                split_op.name, new_targets, split_op.gate_args_copy()
+                            ),
+                            out_during_moment=grow,
+                            before_moments=before,
+                            after_moments=after,
+                            immune_qubit_indices=immune_qubit_indices,
+                        )
+                else:
                     rule.append_noisy_version_of(
-                        split_op=stim.CircuitInstruction(
-                            split_op.name, new_targets, split_op.gate_args_copy()
-                        ),
+                        split_op=split_op,
                         out_during_moment=grow,
                         before_moments=before,
                         after_moments=after,
                         immune_qubit_indices=immune_qubit_indices,
                     )
-            else:
-                rule.append_noisy_version_of(
-                    split_op=split_op,
-                    out_during_moment=grow,
-                    before_moments=before,
-                    after_moments=after,
-                    immune_qubit_indices=immune_qubit_indices,
-                )
+            during.append(grow)
+
+        before_out = stim.Circuit()
         for k in sorted(before.keys()):
-            out += before[k]
-        out += grow
+            before_out += before[k]
+        after_out = stim.Circuit()
         for k in sorted(after.keys()):
-            out += after[k]
-
+            after_out += after[k]
         self._append_idle_error(
-            moment_split_ops=moment_split_ops,
-            out=out,
+            moment_split_ops=[
+                split_op
+                for op in moment_ops
+                for split_op in _split_targets_if_needed(op, immune_qubit_indices)
+            ],
+            out=after_out,
             system_qubit_indices=system_qubits_indices,
             immune_qubit_indices=immune_qubit_indices,
         )
+        return before_out, tuple(during), after_out
 
     def noisy_circuit_skipping_mpp_boundaries(
         self,
@@ -463,37 +550,40 @@ class NoiseModel:
             The noisy version of the circuit.
         """
         if system_qubit_indices is None:
-            system_qubit_indices = set(range(circuit.num_qubits))
+            system_qubit_indices = range(circuit.num_qubits)
         if immune_qubit_indices is None:
-            immune_qubit_indices = set()
+            immune_qubit_indices = ()
+        system_qubit_indices = frozenset(system_qubit_indices)
+        immune_qubit_indices = frozenset(immune_qubit_indices)
 
         result = stim.Circuit()
 
         first = True
-        for moment_split_ops in _iter_split_op_moments(
-            circuit, immune_qubit_indices=immune_qubit_indices
-        ):
+        for moment in _iter_moments(circuit):
             if first:
                 first = False
             elif result and isinstance(result[-1], stim.CircuitRepeatBlock):
                 pass
             else:
                 result.append("TICK")
-            if isinstance(moment_split_ops, stim.CircuitRepeatBlock):
+            if isinstance(moment, stim.CircuitRepeatBlock):
                 noisy_body = self.noisy_circuit(
-                    moment_split_ops.body_copy(),
+                    moment.body_copy(),
                     system_qubit_indices=system_qubit_indices,
                     immune_qubit_indices=immune_qubit_indices,
                 )
                 noisy_body.append("TICK")
                 result.append(
                     stim.CircuitRepeatBlock(
-                        repeat_count=moment_split_ops.repeat_count, body=noisy_body
+                        repeat_count=moment.repeat_count, body=noisy_body
                     )
                 )
             else:
+                start, moment_ops = moment
                 self._append_noisy_moment(
-                    moment_split_ops=moment_split_ops,
+                    circuit=circuit,
+                    start=start,
+                    moment_ops=moment_ops,
                     out=result,
                     system_qubits_indices=system_qubit_indices,
                     immune_qubit_indices=immune_qubit_indices,
@@ -502,6 +592,156 @@ class NoiseModel:
         return result
 
 
+def noisy_circuits_for_noise_sweep(
+    circuit: stim.Circuit,
+    noise_models: Sequence[NoiseModel],
+    *,
+    skip_mpp_boundaries: bool = False,
+    immune_qubit_indices: AbstractSet[int] | None = None,
+) -> list[stim.Circuit]:
+    """Returns the noisy version of a circuit under each of several noise models.
+
+    Intended for sweeping the noise strength of a noise model family (e.g.
+    `NoiseModel.si1000(p)` for several `p`). The noisy version of each distinct
+    moment of the circuit is only worked out once, using the first noise model.
+    The other noise models get those noisy moments with the probabilities of the
+    first model swapped for their corresponding probabilities, leaving only the
+    reassembly of the circuit to be done for each model. When that substitution
+    would be ambiguous (e.g. the models have different rules, or two parameters
+    that are distinct in one model are equal in the other) the noise is worked
+    out from scratch instead.
+
+    Args:
+        circuit: The circuit to layer noise over.
+        noise_models: The noise models to apply.
+        skip_mpp_boundaries: Use `NoiseModel.noisy_circuit_skipping_mpp_boundaries`
+            instead of `NoiseModel.noisy_circuit`.
+        immune_qubit_indices: Qubits to not apply noise to, even if they are operated on.
+
+    Returns:
+        A list with the noisy circuit for each noise model, in the same order.
+    """
+    results = []
+    for k, noise_model in enumerate(noise_models):
+        if k > 0:
+            _transfer_noisy_moments(src=noise_models[0], dst=noise_model)
+        if skip_mpp_boundaries:
+            noisy = noise_model.noisy_circuit_skipping_mpp_boundaries(
+                circuit, immune_qubit_indices=immune_qubit_indices
+            )
+        else:
+            noisy = noise_model.noisy_circuit(
+                circuit, immune_qubit_indices=immune_qubit_indices
+            )
+        results.append(noisy)
+    return results
+
+
+def _transfer_noisy_moments(*, src: NoiseModel, dst: NoiseModel) -> None:
+    """Seeds a noise model's moment cache from an equivalently structured model's cache."""
+    parameter_map = _noise_parameter_map(src, dst)
+    if parameter_map is None:
+        return
+    for key, noisy_moment in src._noisy_moment_cache.items():
+        if key in dst._noisy_moment_cache:
+            continue
+        gate_ops = key[0]
+        if any(_has_noise_args(op) for op in gate_ops):
+            # Noise already in the circuit must not be substituted.
+            continue
+        before, during, after = noisy_moment
+        before = _with_substituted_noise_args(before, parameter_map)
+        during = [_with_substituted_noise_args(c, parameter_map) for c in during]
+        after = _with_substituted_noise_args(after, parameter_map)
+        if before is None or after is None or None in during:
+            continue
+        dst._noisy_moment_cache[key] = before, tuple(during), after
+
+
+def _noise_parameters(noise_model: NoiseModel) -> tuple[tuple, list[float]]:
+    """Splits a noise model into its structure and the probabilities it uses."""
+    structure = [
+        noise_model.allow_multiple_uses_of_a_qubit_in_one_tick,
+        noise_model.measure_rules is None,
+    ]
+    values = [
+        noise_model.idle_depolarization,
+        noise_model.additional_depolarization_waiting_for_m_or_r,
+    ]
+
+    def add_rule(name: Any, rule: NoiseRule | None):
+        if rule is None:
+            structure.append((name, None))
+            return
+        parts = []
+        for section, channels in [("before", rule.before), ("after", rule.after)]:
+            for gate, p in channels.items():
+                ps = (p,) if isinstance(p, (int, float)) else tuple(p)
+                parts.append((section, gate, len(ps)))
+                values.extend(ps)
+        structure.append((name, tuple(parts)))
+        values.append(rule.flip_result)
+
+    add_rule("tick", noise_model.tick_noise)
+    for gate, rule in noise_model.gate_rules.items():
+        add_rule(("gate", gate), rule)
+    for basis, rule in (noise_model.measure_rules or {}).items():
+        add_rule(("measure", basis), rule)
+    add_rule("any_measurement", noise_model.any_measurement_rule)
+    add_rule("any_clifford_1q", noise_model.any_clifford_1q_rule)
+    add_rule("any_clifford_2q", noise_model.any_clifford_2q_rule)
+    return tuple(structure), values
+
+
+def _noise_parameter_map(
+    old_model: NoiseModel, new_model: NoiseModel
+) -> dict[float, float] | None:
+    """Maps each probability used by one noise model to the matching one of another.
+
+    Returns:
+        None if the models don't correspond one-to-one (including when a zero
+        probability, which omits noise instead of adding it, becomes non-zero or
+        vice versa). Otherwise the map.
+    """
+    old_structure, old_values = _noise_parameters(old_model)
+    new_structure, new_values = _noise_parameters(new_model)
+    if old_structure != new_structure:
+        return None
+    result = {}
+    inverse = {}
+    for a, b in zip(old_values, new_values):
+        if (a == 0) != (b == 0):
+            return None
+        if result.setdefault(a, b) != b or inverse.setdefault(b, a) != a:
+            return None
+    return result
+
+
+def _has_noise_args(op: stim.CircuitInstruction) -> bool:
+    return bool(op.gate_args_copy()) and stim.gate_data(op.name).is_noisy_gate
+
+
+def _with_substituted_noise_args(
+    circuit: stim.Circuit,
+    parameter_map: dict[float, float],
+) -> stim.Circuit | None:
+    """Replaces the arguments of the noisy operations in a circuit using the given map.
+
+    Returns:
+        None if an argument isn't in the map. Otherwise the updated circuit.
+    """
+    result = stim.Circuit()
+    for op in circuit:
+        if _has_noise_args(op):
+            new_args = [parameter_map.get(a) for a in op.gate_args_copy()]
+            if None in new_args:
+                return None
+            result.append(op.name, op.targets_copy(), new_args)
+        else:
+            result.append(op)
+    return result
+
+
 def occurs_in_classical_control_system(op: stim.CircuitInstruction) -> bool:
     """Determines if an operation is an annotation or a classical control system update."""
     if op.name in ANNOTATION_OPS:
@@ -608,43 +848,52 @@ def _split_targets_if_needed_m_basis(
     assert k == len(targets)
 
 
-def _iter_split_op_moments(
+def _iter_moments(
     circuit: stim.Circuit,
-    *,
-    immune_qubit_indices: AbstractSet[int],
-) -> Iterator[stim.CircuitRepeatBlock | list[stim.CircuitInstruction]]:
-    """Splits a circuit into moments and some operations into pieces.
-
-    Classical control system operations like CX rec[-1] 0 are split from quantum operations like CX 1 0.
-
-    MPP operations are split into one operation per Pauli product.
+) -> Iterator[
+    stim.CircuitRepeatBlock | tuple[int, tuple[stim.CircuitInstruction, ...]]
+]:
+    """Splits a circuit into moments (the operations between two TICKs).
 
     Yields:
-        Lists of operations corresponding to one moment in the circuit, with any problematic operations
-        like MPPs split into pieces.
-
-        (A moment is the time between two TICKs.)
+        Repeat blocks, and (start, ops) tuples where ops are the operations of a
+        moment and start is the index of the first one in the circuit.
     """
     cur_moment = []
+    start = 0
 
-    for op in circuit:
+    for k, op in enumerate(circuit):
         if isinstance(op, stim.CircuitRepeatBlock):
             if cur_moment:
-                yield cur_moment
+                yield start, tuple(cur_moment)
                 cur_moment = []
             yield op
-        elif isinstance(op, stim.CircuitInstruction):
-            if op.name == "TICK":
-                yield cur_moment
-                cur_moment = []
-            else:
-                cur_moment.extend(
-                    _split_targets_if_needed(
-                        op, immune_qubit_indices=immune_qubit_indices
-                    )
-                )
+            start = k + 1
+        elif op.name == "TICK":
+            yield start, tuple(cur_moment)
+            cur_moment = []
+            start = k + 1
+        else:
+            cur_moment.append(op)
     if cur_moment:
-        yield cur_moment
+        yield start, tuple(cur_moment)
+
+
+_QUBIT_TARGETS: list[stim.GateTarget] = []
+
+
+def _qubit_targets(qubits: Iterable[int]) -> list[stim.GateTarget]:
+    """Converts qubit indices into gate targets.
+
+    Stim converts ints (and constructs gate targets) slowly, so the targets are
+    made once and reused. Appending reused targets is ~50x faster than appending ints.
+    """
+    qubits = list(qubits)
+    if qubits and max(qubits) >= len(_QUBIT_TARGETS):
+        _QUBIT_TARGETS.extend(
+            stim.GateTarget(q) for q in range(len(_QUBIT_TARGETS), max(qubits) + 1)
+        )
+    return [_QUBIT_TARGETS[q] for q in qubits]
 
 
 def _measure_basis(*, split_op: stim.CircuitInstruction) -> str | None:
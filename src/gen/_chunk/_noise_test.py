@@ -3,7 +3,7 @@ import stim
 import gen
 from gen._chunk._noise import (
     _measure_basis,
-    _iter_split_op_moments,
+    _split_targets_if_needed,
     occurs_in_classical_control_system,
     NoiseModel,
 )
@@ -28,131 +28,45 @@ def test_measure_basis():
     assert f("MPP Y0*Z2*X3") == "YZX"
 
 
-def test_iter_split_op_moments():
-    assert (
-        list(
-            _iter_split_op_moments(
-                stim.Circuit(
-                    """
-    """
-                ),
-                immune_qubit_indices=set(),
-            )
-        )
-        == []
-    )
-
-    assert (
-        list(
-            _iter_split_op_moments(
-                stim.Circuit(
-                    """
-        H 0
-    """
-                ),
-                immune_qubit_indices=set(),
-            )
-        )
-        == [[stim.CircuitInstruction("H", [0])]]
-    )
+def test_split_targets_if_needed():
+    def split(op: stim.CircuitInstruction, immune_qubit_indices=frozenset()):
+        return list(_split_targets_if_needed(op, immune_qubit_indices))
 
-    assert (
-        list(
-            _iter_split_op_moments(
-                stim.Circuit(
-                    """
-        H 0
-        TICK
-    """
-                ),
-                immune_qubit_indices=set(),
-            )
-        )
-        == [[stim.CircuitInstruction("H", [0])]]
-    )
-
-    assert (
-        list(
-            _iter_split_op_moments(
-                stim.Circuit(
-                    """
-        H 0 1
-        TICK
-    """
-                ),
-                immune_qubit_indices=set(),
-            )
-        )
-        == [[stim.CircuitInstruction("H", [0, 1])]]
-    )
-
-    assert (
-        list(
-            _iter_split_op_moments(
-                stim.Circuit(
-                    """
-        H 0 1
-        TICK
-    """
-                ),
-                immune_qubit_indices={3},
-            )
-        )
-        == [
-            [stim.CircuitInstruction("H", [0]), stim.CircuitInstruction("H", [1])],
-        ]
-    )
-
-    assert (
-        list(
-            _iter_split_op_moments(
-                stim.Circuit(
-                    """
-        H 0
-        TICK
-        H 1
-    """
-                ),
-                immune_qubit_indices=set(),
-            )
-        )
-        == [
-            [stim.CircuitInstruction("H", [0])],
-            [stim.CircuitInstruction("H", [1])],
-        ]
-    )
-
-    assert (
-        list(
-            _iter_split_op_moments(
-                stim.Circuit(
-                    """
-        CX rec[-1] 0 1 2 3 4
-        MPP X5*X6 Y5
-        CX 8 9 10 11
-        TICK
-        H 0
-    """
-                ),
-                immune_qubit_indices=set(),
-            )
-        )
-        == [
-            [
-                stim.CircuitInstruction("CX", [stim.target_rec(-1), 0]),
-                stim.CircuitInstruction("CX", [1, 2]),
-                stim.CircuitInstruction("CX", [3, 4]),
-                stim.CircuitInstruction(
-                    "MPP", [stim.target_x(5), stim.target_combiner(), stim.target_x(6)]
-                ),
-                stim.CircuitInstruction("MPP", [stim.target_y(5)]),
-                stim.CircuitInstruction("CX", [8, 9, 10, 11]),
-            ],
+    assert split(stim.CircuitInstruction("H", [0])) == [
+        stim.CircuitInstruction("H", [0])
+    ]
+    assert split(stim.CircuitInstruction("H", [0, 1])) == [
+        stim.CircuitInstruction("H", [0, 1])
+    ]
+    assert split(stim.CircuitInstruction("H", [0, 1]), {3}) == [
+        stim.CircuitInstruction("H", [0]),
+        stim.CircuitInstruction("H", [1]),
+    ]
+    cx = stim.CircuitInstruction("CX", [stim.target_rec(-1), 0, 1, 2, 3, 4])
+    assert split(cx) == [
+        stim.CircuitInstruction("CX", [stim.target_rec(-1), 0]),
+        stim.CircuitInstruction("CX", [1, 2]),
+        stim.CircuitInstruction("CX", [3, 4]),
+    ]
+    assert split(
+        stim.CircuitInstruction(
+            "MPP",
             [
-                stim.CircuitInstruction("H", [0]),
+                stim.target_x(5),
+                stim.target_combiner(),
+                stim.target_x(6),
+                stim.target_y(5),
             ],
-        ]
-    )
+        )
+    ) == [
+        stim.CircuitInstruction(
+            "MPP", [stim.target_x(5), stim.target_combiner(), stim.target_x(6)]
+        ),
+        stim.CircuitInstruction("MPP", [stim.target_y(5)]),
+    ]
+    assert split(stim.CircuitInstruction("CX", [8, 9, 10, 11])) == [
+        stim.CircuitInstruction("CX", [8, 9, 10, 11])
+    ]
 
 
 def test_occurs_in_classical_control_system():
@@ -390,3 +304,107 @@ def test_decomposed_gate_noise():
     """
         )
     )
+
+
+def test_noisy_moments_are_reused():
+    circuit = stim.Circuit(
+        """
+        R 0 1 2
+        TICK
+        REPEAT 3 {
+            CX 0 1
+            TICK
+            M 1
+            DETECTOR(1, 0) rec[-1]
+            TICK
+        }
+        CX 0 1
+        TICK
+        M 1
+        DETECTOR(2, 0) rec[-1]
+        OBSERVABLE_INCLUDE(0) rec[-1]
+    """
+    )
+    model = gen.NoiseModel.uniform_depolarizing(1e-3)
+    noisy = model.noisy_circuit(circuit)
+    assert noisy == gen.NoiseModel.uniform_depolarizing(1e-3).noisy_circuit(circuit)
+    assert "DETECTOR(2, 0) rec[-1]" in str(noisy)
+    # The moments after the repeat block only differ from the ones inside it by annotations.
+    assert len(model._noisy_moment_cache) == 3
+
+    assert model.noisy_circuit(circuit) == noisy
+    fresh_model = gen.NoiseModel.uniform_depolarizing(1e-3)
+    assert model.noisy_circuit(
+        circuit, immune_qubit_indices={2}
+    ) == fresh_model.noisy_circuit(circuit, immune_qubit_indices={2})
+    assert len(model._noisy_moment_cache) == 6
+
+
+def test_noisy_moment_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(gen._chunk._noise, "NOISY_MOMENT_CACHE_MAX_ENTRIES", 2)
+    circuit = stim.Circuit(
+        """
+        R 0 1
+        TICK
+        H 0
+        TICK
+        CX 0 1
+        TICK
+        M 0 1
+    """
+    )
+    model = gen.NoiseModel.uniform_depolarizing(1e-3)
+    noisy = model.noisy_circuit(circuit)
+    assert len(model._noisy_moment_cache) == 2
+    assert model.noisy_circuit(circuit) == noisy
+    assert noisy == gen.NoiseModel.uniform_depolarizing(1e-3).noisy_circuit(circuit)
+
+
+def test_noisy_circuits_for_noise_sweep():
+    circuit = stim.Circuit(
+        """
+        MPP Z0*Z1
+        TICK
+        R 0 1
+        TICK
+        H 0
+        TICK
+        CX 0 1
+        TICK
+        MR 1
+        TICK
+        M 0
+        DETECTOR rec[-1]
+        TICK
+        MPP Z0*Z1
+    """
+    )
+    for make_model in [gen.NoiseModel.si1000, gen.NoiseModel.uniform_depolarizing]:
+        strengths = [1e-3, 2e-3, 5e-4, 0.05]
+        models = [make_model(p) for p in strengths]
+        expected = [
+            make_model(p).noisy_circuit_skipping_mpp_boundaries(circuit)
+            for p in strengths
+        ]
+        assert (
+            gen.noisy_circuits_for_noise_sweep(
+                circuit, models, skip_mpp_boundaries=True
+            )
+            == expected
+        )
+        # The later models were seeded from the first model's noisy moments.
+        assert (
+            models[1]._noisy_moment_cache.keys()
+            == models[0]._noisy_moment_cache.keys()
+        )
+
+    # Substitution isn't possible when the models aren't structured the same way.
+    make_models = lambda: [
+        gen.NoiseModel.uniform_depolarizing(1e-3),
+        gen.NoiseModel.si1000(1e-3),
+        gen.NoiseModel.uniform_depolarizing(0),
+    ]
+    assert gen.noisy_circuits_for_noise_sweep(circuit, make_models()) == [
+        m.noisy_circuit(circuit) for m in make_models()
+    ]
+
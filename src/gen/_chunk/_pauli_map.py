@@ -12,26 +12,60 @@ from typing import (
 
 import stim
 
-from gen._chunk._complex_util import sorted_complex
+from gen._chunk._complex_util import complex_key, sorted_complex
 
 if TYPE_CHECKING:
     from gen._chunk._keyed_pauli_map import KeyedPauliMap
     from gen._chunk._tile import Tile
 
 
-_multiplication_table: dict[
-    Literal["X", "Y", "Z"] | None,
-    dict[Literal["X", "Y", "Z"] | None, Literal["X", "Y", "Z"] | None],
-] = {
-    None: {None: None, "X": "X", "Y": "Y", "Z": "Z"},
-    "X": {None: "X", "X": None, "Y": "Z", "Z": "Y"},
-    "Y": {None: "Y", "X": "Z", "Y": None, "Z": "X"},
-    "Z": {None: "Z", "X": "Y", "Y": "X", "Z": None},
+# Interned qubit coordinates. PauliMaps store their terms as bitmasks over the
+# index each qubit coordinate is given when it is first seen.
+_QUBIT_INDICES: dict[complex, int] = {}
+_QUBIT_COORDS: list[complex] = []
+_QUBIT_SORT_KEYS: list[Any] = []
+
+# The (x bit, z bit) of each pauli.
+_PAULI_XZ: dict[str, tuple[int, int]] = {
+    "X": (1, 0),
+    "Y": (1, 1),
+    "Z": (0, 1),
 }
 
 
+def _qubit_index(q: complex) -> int:
+    """Returns the interned index of a qubit coordinate, adding it if needed."""
+    index = _QUBIT_INDICES.get(q)
+    if index is None:
+        q = complex(q)
+        index = len(_QUBIT_COORDS)
+        _QUBIT_COORDS.append(q)
+        _QUBIT_SORT_KEYS.append(complex_key(q))
+        _QUBIT_INDICES[q] = index
+    return index
+
+
+def _mask_indices(mask: int) -> list[int]:
+    """Returns the positions of the set bits of a non-negative integer."""
+    result = []
+    while mask:
+        low = mask & -mask
+        result.append(low.bit_length() - 1)
+        mask ^= low
+    return result
+
+
 class PauliMap:
-    """A qubit-to-pauli mapping."""
+    """A qubit-to-pauli mapping.
+
+    Internally, the qubits are interned into a process-wide registry and the map
+    is stored as a pair of bitmasks (the qubits with an X component and the
+    qubits with a Z component). This makes products, commutation checks,
+    equality and hashing into bitwise operations on integers. The `qubits`
+    dictionary is a view computed from the bitmasks when first needed.
+    """
+
+    __slots__ = ("_xs", "_zs", "_hash", "_qubits")
 
     def __init__(
         self,
@@ -50,60 +84,103 @@ class PauliMap:
     ):
         """Initializes a PauliMap using maps of Paulis to/from qubits."""
 
-        self.qubits: dict[complex, Literal["X", "Y", "Z"]] = {}
-
         from gen._chunk._keyed_pauli_map import KeyedPauliMap
 
-        if (
-            isinstance(mapping, (PauliMap, KeyedPauliMap))
-            and not xs
-            and not ys
-            and not zs
-        ):
-            self.qubits = dict(mapping.qubits)
-            self._hash = (
-                getattr(mapping, "_hash")
-                if isinstance(mapping, PauliMap)
-                else getattr(mapping.pauli_string, "_hash")
+        if isinstance(mapping, KeyedPauliMap):
+            mapping = mapping.pauli_string
+        if isinstance(mapping, PauliMap) and not xs and not ys and not zs:
+            self._xs: int = mapping._xs
+            self._zs: int = mapping._zs
+            self._hash: int | None = mapping._hash
+            self._qubits: dict[complex, Literal["X", "Y", "Z"]] | None = (
+                mapping._qubits
             )
             return
 
+        mask_x = 0
+        mask_z = 0
         for q in xs:
-            self._mul_term(q, "X")
+            mask_x ^= 1 << _qubit_index(q)
         for q in ys:
-            self._mul_term(q, "Y")
+            bit = 1 << _qubit_index(q)
+            mask_x ^= bit
+            mask_z ^= bit
         for q in zs:
-            self._mul_term(q, "Z")
+            mask_z ^= 1 << _qubit_index(q)
         if isinstance(mapping, stim.PauliString):
             for q in mapping.pauli_indices():
-                self._mul_term(q, cast(Any, "_XYZ"[mapping[q]]))
-            mapping = None
-        if mapping is not None:
-            if isinstance(mapping, (PauliMap, KeyedPauliMap)):
-                mapping = mapping.qubits
+                bit = 1 << _qubit_index(q)
+                p = mapping[q]
+                if p != 3:
+                    mask_x ^= bit
+                if p != 1:
+                    mask_z ^= bit
+        elif isinstance(mapping, PauliMap):
+            mask_x ^= mapping._xs
+            mask_z ^= mapping._zs
+        elif mapping is not None:
             for k, v in mapping.items():
                 if isinstance(k, str):
                     assert k == "X" or k == "Y" or k == "Z"
-                    b = cast(Literal["X", "Y", "Z"], k)
+                    px, pz = _PAULI_XZ[k]
                     if isinstance(v, (int, float, complex)):
-                        self._mul_term(v, b)
-                    else:
-                        for q in v:
-                            assert isinstance(q, (int, float, complex))
-                            self._mul_term(q, b)
+                        v = [v]
+                    for q in v:
+                        assert isinstance(q, (int, float, complex))
+                        bit = 1 << _qubit_index(q)
+                        if px:
+                            mask_x ^= bit
+                        if pz:
+                            mask_z ^= bit
                 elif isinstance(v, str):
                     assert v == "X" or v == "Y" or v == "Z"
                     assert isinstance(k, (int, float, complex))
-                    b = cast(Literal["X", "Y", "Z"], v)
-                    self._mul_term(k, b)
+                    px, pz = _PAULI_XZ[v]
+                    bit = 1 << _qubit_index(k)
+                    if px:
+                        mask_x ^= bit
+                    if pz:
+                        mask_z ^= bit
+
+        self._xs = mask_x
+        self._zs = mask_z
+        self._hash = None
+        self._qubits = None
 
-        self.qubits = {
-            complex(q): self.qubits[q] for q in sorted_complex(self.qubits.keys())
-        }
-        self._hash: int = hash(tuple(self.qubits.items()))
+    @staticmethod
+    def _from_masks(xs: int, zs: int) -> "PauliMap":
+        result = PauliMap.__new__(PauliMap)
+        result._xs = xs
+        result._zs = zs
+        result._hash = None
+        result._qubits = None
+        return result
+
+    def __reduce__(self) -> Any:
+        # The bitmasks refer to the registry of this process, so they can't be
+        # sent to other processes as-is.
+        return PauliMap, (self.qubits,)
+
+    @property
+    def qubits(self) -> dict[complex, Literal["X", "Y", "Z"]]:
+        """The paulis of the map, keyed by qubit, in sorted qubit order.
+
+        This dictionary is cached and shared, and must not be modified.
+        """
+        if self._qubits is None:
+            xs = self._xs
+            zs = self._zs
+            indices = _mask_indices(xs | zs)
+            indices.sort(key=_QUBIT_SORT_KEYS.__getitem__)
+            self._qubits = {
+                _QUBIT_COORDS[k]: "IXZY"[(xs >> k & 1) | (zs >> k & 1) << 1]
+                for k in indices
+            }
+        return self._qubits
 
     def __contains__(self, item) -> bool:
-        return self.qubits.__contains__(item)
+        index = _QUBIT_INDICES.get(item)
+        return index is not None and bool((self._xs | self._zs) >> index & 1)
 
     def items(self) -> Iterable[tuple[complex, Literal["X", "Y", "Z"]]]:
         return self.qubits.items()
@@ -115,10 +192,13 @@ class PauliMap:
         return self.qubits.keys()
 
     def __getitem__(self, item) -> Literal["I", "X", "Y", "Z"]:
-        return self.qubits.get(item, "I")
+        index = _QUBIT_INDICES.get(item)
+        if index is None:
+            return "I"
+        return cast(Any, "IXZY"[(self._xs >> index & 1) | (self._zs >> index & 1) << 1])
 
     def __len__(self) -> int:
-        return len(self.qubits)
+        return (self._xs | self._zs).bit_count()
 
     def __iter__(self) -> Iterator[complex]:
         return self.qubits.__iter__()
@@ -133,11 +213,6 @@ class PauliMap:
 
         return KeyedPauliMap(key=key, pauli_string=self)
 
-    def _mul_term(self, q: complex, b: Literal["X", "Y", "Z"]):
-        new_b = _multiplication_table[self.qubits.pop(q, None)][b]
-        if new_b is not None:
-            self.qubits[q] = new_b
-
     @staticmethod
     def from_tile_data(tile: "Tile") -> "PauliMap":
         return PauliMap(
@@ -145,31 +220,16 @@ class PauliMap:
         )
 
     def with_basis(self, basis: Literal["X", "Y", "Z"]) -> "PauliMap":
-        return PauliMap({q: basis for q in self.qubits.keys()})
+        support = self._xs | self._zs
+        px, pz = _PAULI_XZ[basis]
+        return PauliMap._from_masks(support * px, support * pz)
 
     def __bool__(self) -> bool:
-        return bool(self.qubits)
+        return bool(self._xs | self._zs)
 
     def __mul__(self, other: Union["PauliMap", "KeyedPauliMap", "Tile"]) -> "PauliMap":
-        from gen._chunk._tile import Tile
-
-        if isinstance(other, Tile):
-            other = other.to_data_pauli_string()
-
-        result: dict[complex, Literal["X", "Y", "Z"]] = {}
-        for q in self.qubits.keys() | other.qubits.keys():
-            a = self.qubits.get(q, "I")
-            b = other.qubits.get(q, "I")
-            ax = a in "XY"
-            az = a in "YZ"
-            bx = b in "XY"
-            bz = b in "YZ"
-            cx = ax ^ bx
-            cz = az ^ bz
-            c = "IXZY"[cx + cz * 2]
-            if c != "I":
-                result[q] = cast(Literal["X", "Y", "Z"], c)
-        return PauliMap(result)
+        other = _as_pauli_map(other)
+        return PauliMap._from_masks(self._xs ^ other._xs, self._zs ^ other._zs)
 
     def __repr__(self) -> str:
         s = {q: self.qubits[q] for q in sorted_complex(self.qubits)}
@@ -188,21 +248,18 @@ class PauliMap:
         )
 
     def with_xz_flipped(self) -> "PauliMap":
-        remap = {"X": "Z", "Y": "Y", "Z": "X"}
-        return PauliMap({q: remap[p] for q, p in self.qubits.items()})
+        return PauliMap._from_masks(self._zs, self._xs)
 
     def with_xy_flipped(self) -> "PauliMap":
-        remap = {"X": "Y", "Y": "X", "Z": "Z"}
-        return PauliMap({q: remap[p] for q, p in self.qubits.items()})
+        return PauliMap._from_masks(self._xs, self._zs ^ self._xs)
 
     def commutes(self, other: "PauliMap") -> bool:
         return not self.anticommutes(other)
 
     def anticommutes(self, other: "PauliMap") -> bool:
-        t = 0
-        for q in self.qubits.keys() & other.qubits.keys():
-            t += self.qubits[q] != other.qubits[q]
-        return t % 2 == 1
+        other = _as_pauli_map(other)
+        overlap = (self._xs & other._zs) ^ (self._zs & other._xs)
+        return overlap.bit_count() % 2 == 1
 
     def with_transformed_coords(
         self, transform: Callable[[complex], complex]
@@ -219,12 +276,14 @@ class PauliMap:
         )
 
     def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash((self._xs, self._zs))
         return self._hash
 
     def __eq__(self, other) -> bool:
         if not isinstance(other, PauliMap):
             return NotImplemented
-        return self.qubits == other.qubits
+        return self._xs == other._xs and self._zs == other._zs
 
     def _sort_key(self) -> Any:
         return tuple((q.real, q.imag, p) for q, p in self.qubits.items())
@@ -233,3 +292,16 @@ class PauliMap:
         if not isinstance(other, PauliMap):
             return NotImplemented
         return self._sort_key() < other._sort_key()
+
+
+def _as_pauli_map(value: Union[PauliMap, "KeyedPauliMap", "Tile"]) -> PauliMap:
+    if isinstance(value, PauliMap):
+        return value
+    from gen._chunk._keyed_pauli_map import KeyedPauliMap
+    from gen._chunk._tile import Tile
+
+    if isinstance(value, KeyedPauliMap):
+        return value.pauli_string
+    if isinstance(value, Tile):
+        return value.to_data_pauli_string()
+    return PauliMap(value)
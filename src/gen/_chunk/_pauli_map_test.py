@@ -1,3 +1,5 @@
+import pickle
+
 import stim
 
 import gen
@@ -21,3 +23,44 @@ def test_init():
             "Z": [3],
         }
     )
+
+
+def test_dict_view():
+    p = gen.PauliMap({2j: "X", 1: "Z", 0.5: "Y", 0: "X"})
+    assert p.qubits == {0: "X", 1: "Z", 2j: "X", 0.5: "Y"}
+    assert list(p.keys()) == [0, 2j, 1, 0.5]
+    assert p[1] == "Z"
+    assert p[3] == "I"
+    assert p[1234.5 + 6j] == "I"
+    assert 2j in p
+    assert 3 not in p
+    assert len(p) == 4
+    assert bool(p)
+    assert not gen.PauliMap()
+    assert gen.PauliMap(xs=[1, 2], zs=[2, 3], ys=[3]) == gen.PauliMap({1: "X", 2: "Y", 3: "X"})
+
+
+def test_commutes():
+    a = gen.PauliMap({0: "X", 1: "X"})
+    assert a.commutes(gen.PauliMap({0: "Z", 1: "Z"}))
+    assert a.anticommutes(gen.PauliMap({0: "Z", 1: "X"}))
+    assert a.anticommutes(gen.PauliMap({1: "Y", 2: "Z"}))
+    assert a.commutes(gen.PauliMap({2: "Y"}))
+    assert a.anticommutes(gen.PauliMap({0: "Y"}).keyed("k"))
+
+
+def test_flips_and_hash():
+    p = gen.PauliMap({0: "X", 1: "Y", 2: "Z"})
+    assert p.with_xz_flipped() == gen.PauliMap({0: "Z", 1: "Y", 2: "X"})
+    assert p.with_xy_flipped() == gen.PauliMap({0: "Y", 1: "X", 2: "Z"})
+    assert p.with_basis("Y") == gen.PauliMap({0: "Y", 1: "Y", 2: "Y"})
+    assert hash(p) == hash(gen.PauliMap({2: "Z", 1: "Y", 0: "X"}))
+    assert hash(p) == hash(gen.PauliMap(p.keyed(5)))
+    assert p * p == gen.PauliMap()
+    assert p != gen.PauliMap({0: "X", 1: "Y"})
+
+
+def test_pickle():
+    p = gen.PauliMap({0: "X", 1 + 2j: "Y"})
+    assert pickle.loads(pickle.dumps(p)) == p
+    assert pickle.loads(pickle.dumps(p)).qubits == p.qubits
@@ -1,4 +1,3 @@
-import collections
 import functools
 import pathlib
 from typing import (
@@ -605,39 +604,29 @@ class StabilizerCode:
         """
         __tracebackhide__ = True
 
-        q2tiles = collections.defaultdict(list)
-        for tile in self.stabilizers.tiles:
-            for q in tile.data_set:
-                q2tiles[q].append(tile)
-        for tile1 in self.stabilizers.tiles:
-            overlapping = {tile2 for q in tile1.data_set for tile2 in q2tiles[q]}
-            for tile2 in overlapping:
-                t1 = tile1.to_data_pauli_string()
-                t2 = tile2.to_data_pauli_string()
-                if not t1.commutes(t2):
-                    raise ValueError(
-                        f"Tile stabilizer {t1=} anticommutes with tile stabilizer {t2=}."
-                    )
-
-        flat_obs = []
-        packed_obs = []
-        for entry in self.logicals:
-            if isinstance(entry, PauliMap):
-                flat_obs.append(entry)
-                packed_obs.append([entry])
-            else:
-                a, b = entry
-                flat_obs.append(a)
-                flat_obs.append(b)
-                packed_obs.append(entry)
-
-        for tile in self.stabilizers.tiles:
-            ps = tile.to_data_pauli_string()
-            for obs in flat_obs:
-                if not ps.commutes(obs):
-                    raise ValueError(
-                        f"Tile stabilizer {tile=} anticommutes with {obs=}."
-                    )
+        tiles = self.stabilizers.tiles
+        flat_obs: list[PauliMap] = []
+        obs_entries: list[int] = []
+        for k, entry in enumerate(self.logicals):
+            for obs in [entry] if isinstance(entry, PauliMap) else entry:
+                flat_obs.append(obs)
+                obs_entries.append(k)
+        paulis = [tile.to_data_pauli_string() for tile in tiles] + flat_obs
+        anticommuting = _anticommuting_pairs(paulis)
+        num_tiles = len(tiles)
+
+        for i, j in anticommuting:
+            if j < num_tiles:
+                t1 = paulis[i]
+                t2 = paulis[j]
+                raise ValueError(
+                    f"Tile stabilizer {t1=} anticommutes with tile stabilizer {t2=}."
+                )
+        for i, j in anticommuting:
+            if i < num_tiles:
+                tile = tiles[i]
+                obs = paulis[j]
+                raise ValueError(f"Tile stabilizer {tile=} anticommutes with {obs=}.")
 
         for entry in self.logicals:
             if not isinstance(entry, PauliMap):
@@ -647,14 +636,15 @@ class StabilizerCode:
                         f"The observable pair {a} vs {b} didn't anticommute."
                     )
 
-        for k1 in range(len(self.logicals)):
-            for k2 in range(k1 + 1, len(self.logicals)):
-                for obs1 in packed_obs[k1]:
-                    for obs2 in packed_obs[k2]:
-                        if not obs1.commutes(obs2):
-                            raise ValueError(
-                                f"Unpaired observables didn't commute: {obs1=}, {obs2=}."
-                            )
+        for i, j in anticommuting:
+            k1 = obs_entries[i - num_tiles]
+            k2 = obs_entries[j - num_tiles]
+            if k1 != k2:
+                obs1 = paulis[i]
+                obs2 = paulis[j]
+                raise ValueError(
+                    f"Unpaired observables didn't commute: {obs1=}, {obs2=}."
+                )
 
     def with_xz_flipped(self) -> "StabilizerCode":
         new_observables = []
@@ -855,3 +845,36 @@ class StabilizerCode:
         self, *, basis: Literal["X", "Y", "Z"]
     ) -> "gen.Chunk":
         return self.transversal_init_chunk(basis=basis).time_reversed()
+
+
+def _anticommuting_pairs(paulis: Sequence[PauliMap]) -> list[tuple[int, int]]:
+    """Returns the sorted index pairs (i, j) with i < j of anticommuting paulis.
+
+    Uses sparse X/Z incidence matrices, so that all of the commutators are
+    computed by one symplectic product instead of one check per pair.
+    """
+    import numpy as np
+    import scipy.sparse
+
+    q2i: dict[complex, int] = {}
+    rows = ([], [])
+    cols = ([], [])
+    for row, pauli in enumerate(paulis):
+        for q, p in pauli.qubits.items():
+            col = q2i.setdefault(q, len(q2i))
+            if p != "Z":
+                rows[0].append(row)
+                cols[0].append(col)
+            if p != "X":
+                rows[1].append(row)
+                cols[1].append(col)
+    shape = (len(paulis), len(q2i))
+    xs, zs = [
+        scipy.sparse.csr_matrix(
+            (np.ones(len(r), dtype=np.int32), (r, c)), shape=shape
+        )
+        for r, c in zip(rows, cols)
+    ]
+    commutators = scipy.sparse.triu(xs @ zs.T + zs @ xs.T, k=1).tocoo()
+    odd = commutators.data % 2 == 1
+    return sorted(zip(commutators.row[odd].tolist(), commutators.col[odd].tolist()))
@@ -283,3 +283,30 @@ def test_concat_over():
         code.stabilizers
     ) * len(code.data_set)
     assert len(code2.data_set) == len(code.data_set) * len(code.data_set)
+
+
+def test_verify_reports_anticommuting_pairs():
+    stabilizers = [
+        gen.Tile(bases="Z", data_qubits=[0, 1], measure_qubit=0.5),
+        gen.Tile(bases="Z", data_qubits=[1, 2], measure_qubit=1.5),
+    ]
+    obs_x = gen.PauliMap({0: "X", 1: "X", 2: "X"})
+    obs_z = gen.PauliMap({0: "Z"})
+    gen.StabilizerCode(stabilizers=stabilizers, logicals=[(obs_x, obs_z)]).verify()
+
+    with pytest.raises(ValueError, match="anticommutes with tile stabilizer"):
+        gen.StabilizerCode(
+            stabilizers=stabilizers
+            + [gen.Tile(bases="X", data_qubits=[1, 2], measure_qubit=2.5)],
+            logicals=[],
+        ).verify()
+    with pytest.raises(ValueError, match="anticommutes with obs"):
+        gen.StabilizerCode(
+            stabilizers=stabilizers, logicals=[gen.PauliMap({0: "X"})]
+        ).verify()
+    with pytest.raises(ValueError, match="didn't anticommute"):
+        gen.StabilizerCode(stabilizers=stabilizers, logicals=[(obs_z, obs_z)]).verify()
+    with pytest.raises(ValueError, match="Unpaired observables"):
+        gen.StabilizerCode(
+            stabilizers=stabilizers, logicals=[(obs_x, obs_z), obs_z]
+        ).verify()
@@ -0,0 +1,38 @@
+import pytest
+
+from gen._import_time_util import (
+    IMPORT_TIME_ENV_VAR,
+    import_seconds_and_modules,
+    import_time_checks_enabled,
+)
+
+# Generous compared to the ~0.15 seconds it takes, to avoid flakiness on slow machines,
+# but much less than the ~0.45 seconds it took when everything was imported eagerly.
+IMPORT_SECONDS_BUDGET = 0.35
+
+# Modules that `import gen` shouldn't import, because they're slow to import and only
+# needed by visualization or sampling.
+LAZY_MODULES = ["pygltflib", "sinter", "gen._viz_gltf_3d", "gen._viz_circuit_html", "gen._layers"]
+
+
+def test_import_gen_is_lazy():
+    _, modules = import_seconds_and_modules("gen")
+    for lazy in LAZY_MODULES:
+        assert lazy not in modules, f"`import gen` imported {lazy}"
+
+
+@pytest.mark.skipif(not import_time_checks_enabled(), reason=f"set {IMPORT_TIME_ENV_VAR}=1 to check")
+def test_import_gen_is_fast():
+    seconds, _ = import_seconds_and_modules("gen", repetitions=3)
+    assert seconds < IMPORT_SECONDS_BUDGET, f"`import gen` took {seconds:.3f}s"
+
+
+def test_lazy_attributes():
+    import gen
+
+    assert gen.LayerCircuit.__name__ == "LayerCircuit"
+    assert callable(gen.viz_3d_gltf_model_html)
+    assert "patch_svg_viewer" in dir(gen)
+    assert gen.patch_svg_viewer is gen.patch_svg_viewer
+    with pytest.raises(AttributeError, match="not_an_attribute"):
+        _ = gen.not_an_attribute
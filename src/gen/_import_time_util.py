@@ -0,0 +1,48 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+# Set to 1 to check import times against their budgets when running the tests. Off by
+# default, because wall clock budgets fail at random on loaded or slow machines.
+IMPORT_TIME_ENV_VAR = "CHECK_IMPORT_TIME"
+
+
+def import_time_checks_enabled() -> bool:
+    return os.environ.get(IMPORT_TIME_ENV_VAR) == "1"
+
+
+def import_seconds_and_modules(
+    module: str, *, repetitions: int = 1
+) -> tuple[float, set[str]]:
+    """Imports a module in fresh interpreters.
+
+    Args:
+        module: The name of the module to import.
+        repetitions: The number of interpreters to import the module in.
+
+    Returns:
+        The best import time, and the names of the modules that the import imported.
+    """
+    src = pathlib.Path(__file__).parent.parent
+    env = {**os.environ, "PYTHONPATH": str(src)}
+    best = float("inf")
+    modules = set()
+    for _ in range(repetitions):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            env=env,
+            check=True,
+        )
+        lines = [
+            line
+            for line in result.stderr.splitlines()
+            if line.startswith("import time:")
+        ]
+        _, cumulative, name = lines[-1][len("import time:") :].split("|")
+        assert name.strip() == module
+        best = min(best, int(cumulative) / 1e6)
+        modules = {line.split("|")[-1].strip() for line in lines}
+    return best, modules
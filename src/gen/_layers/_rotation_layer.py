@@ -1,6 +1,5 @@
 import dataclasses
 
-import sinter
 import stim
 
 from gen._layers._data import (
@@ -25,6 +24,8 @@ class RotationLayer(Layer):
         return RotationLayer({q: t[r] for q, r in self.named_rotations.items()})
 
     def append_into_stim_circuit(self, out: stim.Circuit) -> None:
+        import sinter
+
         v = sinter.group_by(self.named_rotations.items(), key=lambda e: e[1])
         for gate, items in sorted(v.items()):
             qs = sorted(q for q, _ in items)
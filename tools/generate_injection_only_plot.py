@@ -12,22 +12,24 @@ src_path = pathlib.Path(__file__).parent.parent / 'src'
 assert src_path.exists()
 sys.path.append(str(src_path))
 
-import gen
 import cultiv
 
 
-def report_on_circuit(arg):
-    print(f"Enumerating d={arg['d']} c={arg['style']} p={arg['p']}...", file=sys.stderr)
-    p = arg['p']
-    cache = arg['cache']
-    report = cultiv.ErrorEnumerationReport.from_circuit(arg['circuit'], noise=p, max_weight=5, cache=cache)
+def sweep_circuit(arg):
+    print(f"Enumerating d={arg['d']} c={arg['style']} p={arg['ps']}...", file=sys.stderr)
+    sweep = cultiv.ErrorEnumerationSweep.from_circuit(
+        arg['circuit'],
+        noise_strengths=arg['ps'],
+        max_weight=5,
+        cache=arg['cache'],
+    )
     return {
         **{
             k: v
             for k, v in arg.items()
             if k != 'cache'
         },
-        'report': report,
+        'sweep': sweep,
     }
 
 
@@ -50,28 +52,26 @@ def main():
             if d == 5 and style != 'unitary':
                 continue
             circuit = cultiv.make_inject_and_cultivate_circuit(dcolor=d, inject_style=style, basis='Y')
-            for p in ps:
-                inputs.append({
-                    'p': p,
-                    'circuit': circuit,
-                    'd': d,
-                    'style': style,
-                    'cache': cache,
-                })
-    all_results = []
-    for k, r in enumerate(multiprocessing.Pool().imap_unordered(report_on_circuit, inputs)):
-        report: cultiv.ErrorEnumerationReport = r['report']
-        all_results.append({**r, 'r': gen.count_measurement_layers(r['circuit']), 'q': r['circuit'].num_qubits})
-        print(sinter.TaskStats(
-            strong_id=f'refref{k}',
-            decoder='enumeration',
-            json_metadata={
-                k: v for k, v in r.items() if k != 'circuit' and k != 'cache' and k != 'report'
-            },
-            shots=10**20,
-            errors=round(10**20 * (1 - report.discard_rate) * report.heralded_error_rate),
-            discards=round(10**20 * report.discard_rate),
-        ), flush=True)
+            inputs.append({
+                'ps': ps,
+                'circuit': circuit,
+                'd': d,
+                'style': style,
+                'cache': cache,
+            })
+    k = 0
+    for r in multiprocessing.Pool().imap_unordered(sweep_circuit, inputs):
+        sweep: cultiv.ErrorEnumerationSweep = r['sweep']
+        for p, discard_rate, heralded_error_rate in zip(r['ps'], sweep.discard_rates, sweep.heralded_error_rates):
+            print(sinter.TaskStats(
+                strong_id=f'refref{k}',
+                decoder='enumeration',
+                json_metadata={'p': p, 'd': r['d'], 'style': r['style']},
+                shots=10**20,
+                errors=round(10**20 * (1 - discard_rate) * heralded_error_rate),
+                discards=round(10**20 * discard_rate),
+            ), flush=True)
+            k += 1
 
 
 if __name__ == '__main__':
@@ -8,12 +8,86 @@ assert src_path.exists()
 sys.path.append(str(src_path))
 
 
+def pop_flag_value(args: list[str], flag: str) -> tuple[str | None, list[str]]:
+    if flag not in args:
+        return None, args
+    k = args.index(flag)
+    return args[k + 1], args[:k] + args[k + 2:]
+
+
+def plot_with_stats_cache(args: list[str], cache_dir: str):
+    """Runs `sinter plot`, but reads and preprocesses stats through `cultiv.read_stats_with_cache`."""
+    import cultiv
+    from sinter._command._main_plot import parse_args, _plot_helper, ExistingData
+    from matplotlib import pyplot as plt
+
+    preprocess_text, _ = pop_flag_value(args, '--preprocess_stats_func')
+    parsed = parse_args(args)
+    if parsed.custom_error_count_keys:
+        raise NotImplementedError("--stats_cache_dir doesn't support --custom_error_count_keys")
+
+    caches = [
+        cultiv.read_stats_with_cache(path, cache_dir=cache_dir, preprocess_stats_func=preprocess_text)
+        for path in getattr(parsed, 'in')
+    ]
+    total = ExistingData()
+    if len(caches) == 1:
+        for stat in caches[0].preprocessed_stats(parsed.filter_func):
+            total.add_sample(stat)
+    else:
+        # Stats spread over several files must be merged before they're preprocessed.
+        merged = ExistingData()
+        for cache in caches:
+            for stat in cache.stats.values():
+                merged.add_sample(stat)
+        stats = [stat for stat in merged.data.values() if parsed.filter_func(stat)]
+        if parsed.preprocess_stats_func is not None:
+            stats = parsed.preprocess_stats_func(stats=stats)
+        for stat in stats:
+            total.add_sample(stat)
+
+    fig, _ = _plot_helper(
+        samples=total,
+        group_func=parsed.group_func,
+        x_func=parsed.x_func,
+        point_label_func=parsed.point_label_func,
+        y_func=parsed.y_func,
+        filter_func=lambda _: True,
+        failure_units_per_shot_func=parsed.failure_units_per_shot_func,
+        failure_values_func=parsed.failure_values_func,
+        plot_args_func=parsed.plot_args_func,
+        failure_unit=parsed.failure_unit_name,
+        plot_types=parsed.type,
+        xaxis=parsed.xaxis,
+        yaxis=parsed.yaxis,
+        fig_size=parsed.fig_size,
+        min_y=parsed.ymin,
+        max_y=parsed.ymax,
+        max_x=parsed.xmax,
+        min_x=parsed.xmin,
+        highlight_max_likelihood_factor=parsed.highlight_max_likelihood_factor,
+        title=parsed.title,
+        subtitle=parsed.subtitle,
+        line_fits=parsed.line_fits,
+        preprocess_stats_func=None,
+        dpi=parsed.dpi,
+    )
+    if parsed.out is not None:
+        fig.savefig(parsed.out, dpi=parsed.dpi)
+    if parsed.show or parsed.out is None:
+        plt.show()
+
+
 def main():
-    from sinter._command._main import main
-    main(command_line_args=['plot', *sys.argv[1:]])
-    for k in range(len(sys.argv) - 1):
-        if sys.argv[k] == '--out':
-            print(f'wrote file://{pathlib.Path(sys.argv[k + 1]).absolute()}')
+    cache_dir, args = pop_flag_value(sys.argv[1:], '--stats_cache_dir')
+    if cache_dir is None:
+        from sinter._command._main import main
+        main(command_line_args=['plot', *args])
+    else:
+        plot_with_stats_cache(args, cache_dir)
+    for k in range(len(args) - 1):
+        if args[k] == '--out':
+            print(f'wrote file://{pathlib.Path(args[k + 1]).absolute()}')
             return
 
 